@@ -0,0 +1,240 @@
+"""
+Pre-encode analysis.
+Decides per file whether an AV1 encode is worthwhile, using the probe data
+(codec, bits per pixel, resolution versus the target) and optionally a
+quick sample encode that predicts the output size at the chosen CQ.
+
+Decisions:
+    encode  re-encode the video as usual
+    remux   copy the video, still mux subtitles / convert audio
+    skip    nothing to gain; leave the file alone
+"""
+
+import os
+import subprocess
+import tempfile
+import threading
+
+from conversion_engine import AUDIO_CODEC_MAP, RESOLUTION_MAP, video_encode_args
+from ffmpeg_progress import PROGRESS_ARGS
+from ffmpeg_utils import CREATE_NO_WINDOW, find_ffmpeg
+from job_ledger import settings_key
+from media_probe import probe_media
+from scheduler import CancelledError
+from stream_selection import select_streams
+
+
+ENCODE = "encode"
+REMUX = "remux"
+SKIP = "skip"
+
+# Below these bits per pixel per frame a source is already so lean that an
+# AV1 re-encode rarely ends up meaningfully smaller
+LOW_BPP = {
+    "hevc": 0.05,
+    "vp9": 0.05,
+    "h264": 0.025,
+}
+DEFAULT_LOW_BPP = 0.02
+
+# A sample encode must predict at least this much saving to be worth it
+MIN_SAVINGS = 0.10
+
+SAMPLE_COUNT = 3
+SAMPLE_SECONDS = 4
+
+
+class Analysis:
+    """The decision for one input and the numbers behind it"""
+
+    def __init__(self, path, action, reason, source_size=None, predicted_size=None):
+        self.path = path
+        self.action = action
+        self.reason = reason
+        self.source_size = source_size
+        self.predicted_size = predicted_size
+
+    @property
+    def predicted_savings(self):
+        """Fraction of the source size saved, or None without a prediction"""
+        if not self.source_size or self.predicted_size is None:
+            return None
+        return 1 - self.predicted_size / self.source_size
+
+    def to_dict(self):
+        return {
+            "path": self.path,
+            "action": self.action,
+            "reason": self.reason,
+            "source_size": self.source_size,
+            "predicted_size": self.predicted_size,
+            "predicted_savings": self.predicted_savings,
+        }
+
+    def summary(self):
+        line = f"{self.action.upper():6} {os.path.basename(self.path)}: {self.reason}"
+        if self.predicted_savings is not None:
+            line += f" (predicted {self.predicted_savings:+.0%} saving)"
+        return line
+
+
+def video_bit_rate(info):
+    """Video bitrate in bit/s, estimated from the container when the stream has none"""
+    video = info.video
+    if video and video.bit_rate:
+        return video.bit_rate
+    if info.bit_rate:
+        audio = sum(stream.bit_rate or 0 for stream in info.audio_streams)
+        return max(info.bit_rate - audio, 0) or None
+    if info.size and info.duration:
+        return info.size * 8 / info.duration
+    return None
+
+
+def bits_per_pixel(info):
+    rate = video_bit_rate(info)
+    if not rate or not info.resolution or not info.frame_rate:
+        return None
+    width, height = info.resolution
+    return rate / (width * height * info.frame_rate)
+
+
+def needs_downscale(info, settings):
+    scale = RESOLUTION_MAP[settings.resolution]
+    if not scale or not info.resolution:
+        return False
+    target_width, target_height = (int(v) for v in scale.split(":"))
+    width, height = info.resolution
+    return width > target_width or height > target_height
+
+
+class Analyzer:
+    """
+    Makes (and remembers) encode/remux/skip decisions. settings is the batch
+    default; a job queued with its own settings is decided against those.
+    """
+
+    def __init__(self, settings, ffmpeg_path=None, sample=False, log=None):
+        self.settings = settings
+        self.ffmpeg_path = ffmpeg_path or find_ffmpeg()
+        self.sample = sample
+        self.log = log or (lambda message: None)
+        self._decisions = {}
+        self._lock = threading.Lock()
+
+    def decide(self, path, subtitles=(), settings=None, job=None, scheduler=None):
+        """
+        Decision for path under settings (default: the batch's), made once
+        per path and settings. Pass the job and its scheduler when deciding
+        inside a running job, so sample encodes run as part of it.
+        """
+        path = str(path)
+        settings = settings or self.settings
+        key = (path, settings_key(settings, subtitles))
+        with self._lock:
+            if key in self._decisions:
+                return self._decisions[key]
+        analysis = self._analyze(path, subtitles, settings, job, scheduler)
+        with self._lock:
+            self._decisions[key] = analysis
+        return analysis
+
+    def _keep_video(self, path, reason, size, subtitles, info, settings):
+        """Video stays as-is: remux if there is still something to add or drop, else skip"""
+        audio_changes = AUDIO_CODEC_MAP[settings.audio]["codec"] != "copy"
+        if subtitles or audio_changes or select_streams(info, settings).dropped:
+            return Analysis(path, REMUX, f"{reason}; copying video", size)
+        return Analysis(path, SKIP, reason, size)
+
+    def _analyze(self, path, subtitles, settings, job=None, scheduler=None):
+        try:
+            info = probe_media(path)
+        except Exception as e:
+            return Analysis(path, ENCODE, f"could not probe ({e})")
+        size = info.size or os.path.getsize(path)
+        codec = info.video_codec
+
+        if codec is None:
+            return Analysis(path, SKIP, "no video stream", size)
+        downscale = needs_downscale(info, settings)
+        if downscale:
+            analysis = Analysis(path, ENCODE, f"{codec}, downscaling to {settings.resolution}", size)
+        elif codec == "av1":
+            return self._keep_video(path, "already AV1", size, subtitles, info, settings)
+        else:
+            bpp = bits_per_pixel(info)
+            threshold = LOW_BPP.get(codec, DEFAULT_LOW_BPP)
+            if bpp is not None and bpp < threshold:
+                return self._keep_video(
+                    path, f"{codec} at {bpp:.3f} bits/pixel is already lean", size, subtitles, info, settings
+                )
+            detail = f"{bpp:.3f} bits/pixel" if bpp is not None else "bitrate unknown"
+            analysis = Analysis(path, ENCODE, f"{codec}, {detail}", size)
+
+        if self.sample and info.duration:
+            try:
+                analysis.predicted_size = self.predict_size(info, settings, job=job, scheduler=scheduler)
+            except CancelledError:
+                raise
+            except Exception as e:
+                self.log(f"[{os.path.basename(path)}] Sample encode failed: {e}")
+            else:
+                savings = analysis.predicted_savings
+                # An explicit downscale is what the user asked for, whatever the saving
+                if savings is not None and savings < MIN_SAVINGS and not downscale:
+                    kept = self._keep_video(
+                        path, f"sample encode predicts only {savings:+.0%}", size, subtitles, info, settings
+                    )
+                    kept.predicted_size = analysis.predicted_size
+                    return kept
+        return analysis
+
+    def predict_size(self, info, settings=None, samples=SAMPLE_COUNT, seconds=SAMPLE_SECONDS,
+                     job=None, scheduler=None):
+        """
+        Encode a few short slices spread over the file and extrapolate the
+        video size; audio is estimated from its bitrate. With a scheduler the
+        slices run through scheduler.run_process() for job, so Cancel and
+        Pause reach them; cancelling raises CancelledError.
+        """
+        settings = settings or self.settings
+        duration = info.duration
+        seconds = min(seconds, duration / samples)
+        encoded_bytes = 0
+        with tempfile.TemporaryDirectory(prefix="av1sample_") as workdir:
+            for i in range(samples):
+                start = duration * (i + 1) / (samples + 1) - seconds / 2
+                output = os.path.join(workdir, f"sample_{i}.mkv")
+                cmd = [
+                    self.ffmpeg_path, '-hide_banner', '-loglevel', 'error', *PROGRESS_ARGS,
+                    '-ss', f'{max(start, 0):.3f}', '-i', info.path,
+                    '-t', f'{seconds:.3f}', '-map', '0:v:0', '-an', '-sn', '-dn',
+                ]
+                cmd.extend(video_encode_args(settings, frame_rate=info.frame_rate))
+                cmd.extend(['-y', output])
+                if scheduler is not None:
+                    if scheduler.is_cancelled(job):
+                        raise CancelledError()
+                    result = scheduler.run_process(job, cmd, seconds)
+                    error = result.last_error()
+                else:
+                    result = subprocess.run(
+                        cmd,
+                        stdout=subprocess.DEVNULL,
+                        stderr=subprocess.PIPE,
+                        universal_newlines=True,
+                        creationflags=CREATE_NO_WINDOW,
+                    )
+                    lines = result.stderr.strip().splitlines()
+                    error = lines[-1] if lines else None
+                if result.returncode != 0:
+                    raise Exception(error or f"ffmpeg exited with {result.returncode}")
+                encoded_bytes += os.path.getsize(output)
+
+        video_bytes = encoded_bytes / (samples * seconds) * duration
+        audio = AUDIO_CODEC_MAP[settings.audio]
+        if audio["bitrate"]:
+            audio_rate = int(audio["bitrate"].rstrip("k")) * 1000 * len(info.audio_streams)
+        else:
+            audio_rate = sum(stream.bit_rate or 0 for stream in info.audio_streams)
+        return int(video_bytes + audio_rate / 8 * duration)
@@ -0,0 +1,23 @@
+"""
+Per-user storage locations for caches and databases
+"""
+
+import os
+from pathlib import Path
+
+
+APP_NAME = "AV1MediaConverter"
+
+
+def app_data_dir():
+    """Return (and create) the directory used for caches and job databases"""
+    override = os.environ.get("AV1CONVERTER_HOME")
+    if override:
+        base = Path(override)
+    elif os.name == "nt":
+        base = Path(os.environ.get("LOCALAPPDATA", Path.home() / "AppData" / "Local")) / APP_NAME
+    else:
+        xdg = os.environ.get("XDG_DATA_HOME", Path.home() / ".local" / "share")
+        base = Path(xdg) / APP_NAME.lower()
+    base.mkdir(parents=True, exist_ok=True)
+    return base
@@ -0,0 +1,664 @@
+"""
+Headless command-line front end for the conversion engine.
+
+Usage:
+    python -m av1convert [options] FILE|FOLDER|GLOB [...]
+
+Does not import Tk, so it runs on display-less transcode nodes.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+from analysis import Analyzer
+from chunked_encode import ChunkedEncoder
+from distributed import (
+    DEFAULT_LEASE_SECONDS,
+    Coordinator,
+    CoordinatorClient,
+    CoordinatorServer,
+    Worker,
+    parse_address,
+    parse_path_map,
+)
+from conversion_engine import (
+    DEFAULT_QUALITY,
+    RESOLUTION_MAP,
+    ConversionEngine,
+    ConversionSettings,
+    OutputPlanner,
+)
+from encode_profiles import DEFAULT_PROFILE, PROFILES
+from encoders import BACKENDS, DEFAULT_ENCODER, DEFAULT_PRESET, PRESETS, select_backend
+from ffmpeg_utils import find_ffmpeg
+from hwaccel import DECODE_MODES, DEFAULT_DECODE, select_decode
+from job_ledger import JobLedger
+from job_queue import JobStore, job_settings
+from library_scan import DEFAULT_SCAN_WORKERS, LibraryScanner, ScanFilter, expand_inputs
+from load_control import DEFAULT_NICE, ProcessLimits, auto_concurrency, threads_per_job
+from metrics import DEFAULT_METRICS_HOST, MetricsServer, RunReport, job_metrics
+from process_runner import DEFAULT_STALL_SECONDS
+from quality_search import QualitySearch, QualitySearchCache
+from scheduler import DEFAULT_MAX_ATTEMPTS, EncodeScheduler, QUEUED, DONE, ENCODING, SKIPPED, FAILED, CANCELLED
+from staging import DEFAULT_PREFETCH, StagingArea
+from stream_selection import parse_languages
+
+
+# Short CLI names for the audio options shown in the GUI
+AUDIO_CHOICES = {
+    "copy": "Copy Original (Recommended)",
+    "aac128": "AAC 128k",
+    "aac192": "AAC 192k",
+    "opus128": "Opus 128k",
+}
+
+
+class Reporter:
+    """Writes engine events either as text or as one JSON object per line"""
+
+    def __init__(self, json_output=False, stream=None, report=None):
+        self.json_output = json_output
+        self.stream = stream or sys.stdout
+        self.report = report
+        self._lock = threading.Lock()
+        self._last_percent = {}
+
+    def emit(self, event, **fields):
+        if not self.json_output:
+            return
+        record = {"event": event, "time": round(time.time(), 3)}
+        record.update(fields)
+        self._write(json.dumps(record, ensure_ascii=False))
+
+    def log(self, message):
+        if self.json_output:
+            self.emit("log", message=message)
+        else:
+            self._write(message)
+
+    def job_update(self, job, scheduler):
+        if self.report is not None:
+            self.report.add(job)
+        percent = int(job.progress * 100)
+        if job.is_finished or self._last_percent.get(job.index) != (job.state, percent):
+            self._last_percent[job.index] = (job.state, percent)
+            self.emit(
+                "job",
+                index=job.index,
+                input=job.input_path,
+                output=job.output_path,
+                state=job.state,
+                paused=job.paused,
+                progress=round(job.progress, 4),
+                overall=round(scheduler.overall_progress(), 4),
+                stats=job.stats.to_dict() if job.stats else None,
+                error=job.error,
+                attempts=job.attempts,
+                retry_at=job.retry_at,
+                metrics=job_metrics(job) if job.is_finished else None,
+            )
+            if self.json_output:
+                return
+            if job.state == FAILED:
+                self._write(f"ERROR ({job.input_path}): {job.error}")
+            elif job.state == QUEUED and job.retry_at is not None:
+                delay = max(job.retry_at - time.time(), 0)
+                self._write(f"RETRY ({job.input_path}) in {delay:.0f}s after attempt {job.attempts}: {job.error}")
+            elif job.state == ENCODING and job.stats is not None:
+                self._write(f"[{os.path.basename(job.input_path)}] {job.stats.summary()}")
+
+    def item_update(self, item):
+        """Coordinator side: a distributed.WorkItem was leased, progressed or finished"""
+        self.emit("job", **item.to_dict())
+        if self.report is not None and item.is_finished:
+            self.report.add_record(item.id, item.report_record())
+        if self.json_output:
+            return
+        name = os.path.basename(item.input_path)
+        if item.state == FAILED:
+            self._write(f"ERROR ({item.input_path}): {item.error}")
+        elif item.state == DONE:
+            self._write(f"✓ {name} ({item.worker})")
+        elif item.state == ENCODING and item.stats:
+            self._write(f"[{name}] {int(item.progress * 100)}% on {item.worker}")
+
+    def _write(self, line):
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+
+def languages_arg(value):
+    try:
+        return parse_languages(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def path_map_arg(value):
+    try:
+        return parse_path_map(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def jobs_arg(value):
+    """-j value: 'auto' or a positive number"""
+    if value == "auto":
+        return value
+    try:
+        jobs = int(value)
+    except ValueError:
+        jobs = 0
+    if jobs < 1:
+        raise argparse.ArgumentTypeError(f"expected 'auto' or a positive number, got {value!r}")
+    return jobs
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="av1convert",
+        description="Convert videos to AV1/MKV without the GUI."
+    )
+    parser.add_argument("inputs", nargs="*", help="Video files, folders or glob patterns")
+    parser.add_argument("--resolution", choices=list(RESOLUTION_MAP), default="Original",
+                        help="Output resolution (default: Original)")
+    parser.add_argument("--audio", choices=list(AUDIO_CHOICES), default="copy",
+                        help="Audio handling (default: copy)")
+    parser.add_argument("--cq", type=int, default=DEFAULT_QUALITY,
+                        help=f"CQ value, higher = smaller file (default: {DEFAULT_QUALITY})")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--target-vmaf", type=float, metavar="SCORE",
+                        help="Search a CQ per file that reaches this VMAF (e.g. 93); overrides --cq")
+    target.add_argument("--target-ssim", type=float, metavar="SCORE",
+                        help="Like --target-vmaf but with SSIM (e.g. 0.97)")
+    parser.add_argument("--search-workers", type=int, default=2,
+                        help="Concurrent sample encodes during a CQ search (default: 2)")
+    parser.add_argument("--encoder", choices=["auto"] + [b.key for b in BACKENDS], default="auto",
+                        help="AV1 encoder; falls back automatically if unavailable (default: auto)")
+    parser.add_argument("--preset", choices=PRESETS, default=DEFAULT_PRESET,
+                        help=f"Encoder speed preset (default: {DEFAULT_PRESET})")
+    parser.add_argument("--profile", choices=list(PROFILES), default=DEFAULT_PROFILE,
+                        help="Encode profile: keyframe interval, lookahead, adaptive quantization, "
+                             "film grain and two-pass (python -m encode_profiles lists them; "
+                             f"default: {DEFAULT_PROFILE})")
+    parser.add_argument("--decode", choices=DECODE_MODES, default=DEFAULT_DECODE,
+                        help="Decode and scale on the GPU (cuda) with NVENC, or on the CPU (software); "
+                             f"auto uses the GPU when this machine supports it (default: {DEFAULT_DECODE})")
+    parser.add_argument("--output-name", default="",
+                        help="Custom output filename (default: <name>_AV1.mkv)")
+    parser.add_argument("--remux-only", action="store_true",
+                        help="Don't re-encode: copy video and audio into <name>.mkv, adding subtitle "
+                             "sidecars and applying the stream options below (files with nothing to "
+                             "change are skipped)")
+    parser.add_argument("--audio-lang", type=languages_arg, default=(), metavar="LANGS",
+                        help="Keep only audio tracks in these languages, e.g. eng,jpn "
+                             "(untagged tracks are kept; default: all)")
+    parser.add_argument("--drop-commentary", action="store_true",
+                        help="Leave out commentary audio tracks")
+    parser.add_argument("--no-embedded-subs", action="store_true",
+                        help="Leave out subtitle tracks already inside the source")
+    parser.add_argument("--no-attachments", action="store_true",
+                        help="Leave out attachments such as fonts for styled subtitles")
+    parser.add_argument("-j", "--jobs", type=jobs_arg, default="auto",
+                        help="Number of concurrent encodes, or 'auto' to start more while CPU, memory, "
+                             "disk and NVENC have headroom (default: auto)")
+    parser.add_argument("--threads", type=int, default=0,
+                        help="Threads per encode (default: 0, shared out by the number of parallel jobs)")
+    parser.add_argument("--nice", type=int, default=DEFAULT_NICE,
+                        help=f"Run ffmpeg at this niceness and low I/O priority; 0 disables "
+                             f"(default: {DEFAULT_NICE})")
+    parser.add_argument("--chunked", action="store_true",
+                        help="Split long inputs at keyframes and encode segments in parallel (resumable)")
+    parser.add_argument("--chunk-seconds", type=int, default=120,
+                        help="Target segment length for --chunked (default: 120)")
+    parser.add_argument("--chunk-workers", type=int, default=2,
+                        help="Concurrent segment encodes per file for --chunked (default: 2)")
+    parser.add_argument("-r", "--recursive", action="store_true",
+                        help="Scan folders recursively (Converted/ and hidden folders are skipped)")
+    parser.add_argument("--include", action="append", default=[], metavar="GLOB",
+                        help="Only take folder files matching GLOB (name, or path relative to the "
+                             "folder if it contains '/'); repeatable")
+    parser.add_argument("--exclude", action="append", default=[], metavar="GLOB",
+                        help="Skip folder files matching GLOB; repeatable")
+    parser.add_argument("--min-size", type=float, default=0, metavar="MB",
+                        help="Skip folder files smaller than this many MB")
+    parser.add_argument("--skip-av1", action="store_true",
+                        help="Skip folder files whose video is already AV1 (probes each file)")
+    parser.add_argument("--scan-workers", type=int, default=DEFAULT_SCAN_WORKERS,
+                        help=f"Concurrent directory readers (default: {DEFAULT_SCAN_WORKERS})")
+    parser.add_argument("--analyze", action="store_true",
+                        help="Decide encode/remux/skip per file before the batch runs and report it")
+    parser.add_argument("--sample", action="store_true",
+                        help="With --analyze, sample-encode a few short slices to predict output size")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Only report the --analyze decisions; encode nothing")
+    parser.add_argument("--scratch", metavar="DIR",
+                        help="Stage network-share inputs and outputs through this local folder")
+    parser.add_argument("--scratch-gb", type=float, default=50,
+                        help="Disk budget for prefetched inputs in --scratch (default: 50)")
+    parser.add_argument("--prefetch", type=int, default=DEFAULT_PREFETCH,
+                        help=f"Queued inputs to copy ahead with --scratch (default: {DEFAULT_PREFETCH})")
+    parser.add_argument("--stage-always", action="store_true",
+                        help="Stage local inputs too, not only files on network shares")
+    parser.add_argument("--resume", action="store_true",
+                        help="Also run jobs left unfinished in the persistent queue (shared with the "
+                             "app), and keep this run's jobs there until they finish")
+    parser.add_argument("--priority", type=int, default=0,
+                        help="Queue priority of this run's files with --resume; higher runs first")
+    parser.add_argument("--retries", type=int, default=DEFAULT_MAX_ATTEMPTS - 1,
+                        help="Extra attempts for transient failures such as share I/O errors or a "
+                             f"busy GPU (default: {DEFAULT_MAX_ATTEMPTS - 1})")
+    parser.add_argument("--stall-timeout", type=float, default=DEFAULT_STALL_SECONDS, metavar="SECONDS",
+                        help="Stop (and retry) an ffmpeg run whose progress hasn't moved for this long; "
+                             f"0 waits forever (default: {DEFAULT_STALL_SECONDS})")
+    parser.add_argument("--force", action="store_true",
+                        help="Re-encode files even if the ledger says they are already converted")
+    parser.add_argument("--no-ledger", action="store_true",
+                        help="Neither consult nor update the completed-jobs ledger")
+    parser.add_argument("--json", action="store_true",
+                        help="Emit machine-readable JSON lines instead of text")
+    parser.add_argument("--serve", metavar="[HOST:]PORT",
+                        help="Coordinate a distributed batch: queue the inputs and hand them out to "
+                             "--worker processes connecting to this address, e.g. 0.0.0.0:9470")
+    parser.add_argument("--worker", metavar="URL",
+                        help="Convert files leased from the --serve coordinator at URL (e.g. "
+                             "http://nas:9470) instead of local inputs")
+    parser.add_argument("--worker-name",
+                        help="Name reported to the coordinator (default: HOST-PID)")
+    parser.add_argument("--path-map", type=path_map_arg, action="append", default=[],
+                        metavar="REMOTE=LOCAL",
+                        help="With --worker, translate coordinator paths under REMOTE to LOCAL; "
+                             "repeatable")
+    parser.add_argument("--lease-seconds", type=int, default=DEFAULT_LEASE_SECONDS,
+                        help="With --serve, requeue a job when its worker hasn't checked in for "
+                             f"this long (default: {DEFAULT_LEASE_SECONDS})")
+    parser.add_argument("--report", metavar="FILE",
+                        help="Append per-job metrics (timings, fps, sizes, exit code) to FILE as "
+                             "JSON lines, or CSV if FILE ends in .csv")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="Serve live Prometheus-style metrics on http://HOST:PORT/metrics")
+    parser.add_argument("--metrics-host", default=DEFAULT_METRICS_HOST,
+                        help=f"Address for --metrics-port (default: {DEFAULT_METRICS_HOST})")
+    return parser
+
+
+def report_scan_errors(reporter, scanner):
+    for path, error in scanner.errors:
+        reporter.log(f"WARNING: could not scan {path}: {error}")
+
+
+def report_analysis(reporter, analyses):
+    """Per-file decisions plus the predicted total saving"""
+    source_total = 0
+    predicted_total = 0
+    for analysis in analyses:
+        reporter.emit("analysis", **analysis.to_dict())
+        if not reporter.json_output:
+            reporter.log(analysis.summary())
+        if analysis.predicted_size is not None and analysis.source_size:
+            source_total += analysis.source_size
+            predicted_total += analysis.predicted_size
+    actions = [analysis.action for analysis in analyses]
+    summary = ", ".join(f"{actions.count(action)} {action}" for action in ("encode", "remux", "skip"))
+    if source_total:
+        saved = source_total - predicted_total
+        summary += f"; predicted saving {saved / 1024 ** 3:.2f} GiB ({saved / source_total:.0%})"
+    reporter.log(f"Analysis: {summary}")
+
+
+def report_summary(reporter, counts):
+    """Emit the batch summary; returns the exit status"""
+    reporter.emit(
+        "summary",
+        done=counts.get(DONE, 0),
+        skipped=counts.get(SKIPPED, 0),
+        failed=counts.get(FAILED, 0),
+        cancelled=counts.get(CANCELLED, 0),
+        queued=counts.get(QUEUED, 0),
+    )
+    if not reporter.json_output:
+        reporter.log(
+            f"Finished: {counts.get(DONE, 0)} done, {counts.get(SKIPPED, 0)} skipped, "
+            f"{counts.get(FAILED, 0)} failed, {counts.get(CANCELLED, 0)} cancelled"
+            + (f", {counts[QUEUED]} left queued" if counts.get(QUEUED) else "")
+        )
+    return 0 if not any(counts.get(state) for state in (FAILED, CANCELLED, QUEUED)) else 1
+
+
+class Submitter:
+    """
+    Plans and queues each input once. enqueue(path, priority, spec, job_id)
+    hands a job to the scheduler or coordinator; with a JobStore (--resume)
+    jobs are persisted first and unfinished ones are reloaded as restored.
+    """
+
+    def __init__(self, enqueue, settings, store=None, priority=0, log=None):
+        self.enqueue = enqueue
+        self.settings = settings
+        self.store = store
+        self.priority = priority
+        self.planner = OutputPlanner()
+        self.log = log
+        self.submitted = set()
+        self.restored = []
+        if store is not None:
+            self.restored = store.load_pending()
+            if self.restored and log:
+                log(f"Resuming {len(self.restored)} unfinished job(s) from the queue")
+
+    def submit(self, path):
+        if path in self.submitted:
+            return
+        self.submitted.add(path)
+        spec = self.planner.plan(path, self.settings)
+        if self.store is None:
+            self.enqueue(path, 0, spec, None)
+            return
+        queued = self.store.add([path], priority=self.priority, settings=self.settings.to_dict())[0]
+        self.enqueue(path, queued.priority, spec, queued.id)
+
+    def submit_restored(self):
+        # Before new files, so an input that is also on the command line keeps its row
+        for queued in self.restored:
+            if queued.input_path not in self.submitted:
+                self.submitted.add(queued.input_path)
+                spec = self.planner.plan(queued.input_path, job_settings(queued, self.settings, self.log))
+                self.enqueue(queued.input_path, queued.priority, spec, queued.id)
+
+
+def settings_from_args(args, encoder):
+    """Batch ConversionSettings for the parsed options"""
+    return ConversionSettings(
+        resolution=args.resolution,
+        audio=AUDIO_CHOICES[args.audio],
+        quality=args.cq,
+        output_name=args.output_name,
+        encoder=encoder,
+        preset=args.preset,
+        target_metric="vmaf" if args.target_vmaf else "ssim" if args.target_ssim else None,
+        target_score=args.target_vmaf or args.target_ssim,
+        audio_languages=args.audio_lang,
+        drop_commentary=args.drop_commentary,
+        keep_embedded_subtitles=not args.no_embedded_subs,
+        keep_attachments=not args.no_attachments,
+        remux_only=args.remux_only,
+        profile=args.profile,
+    )
+
+
+def build_scanner(args):
+    return LibraryScanner(
+        ScanFilter(
+            include=args.include,
+            exclude=args.exclude,
+            min_size=int(args.min_size * 1024 * 1024),
+            skip_av1=args.skip_av1,
+        ),
+        workers=args.scan_workers,
+        recursive=args.recursive,
+    )
+
+
+def run_coordinator(args, reporter):
+    """--serve: queue the inputs and hand them out to workers until every job has finished"""
+    try:
+        host, port = parse_address(args.serve)
+    except ValueError as e:
+        reporter.log(f"ERROR: {e}")
+        return 2
+    files, folders = expand_inputs(args.inputs)
+    if not files and not folders and not args.resume:
+        reporter.log("ERROR: no such files or folders")
+        return 2
+
+    # Workers always encode with their own encoder; this one only fills the snapshot
+    settings = settings_from_args(args, DEFAULT_ENCODER if args.encoder == "auto" else args.encoder)
+    store = JobStore() if args.resume else None
+    coordinator = Coordinator(
+        lease_seconds=args.lease_seconds,
+        store=store,
+        on_update=reporter.item_update,
+        log=reporter.log,
+    )
+    try:
+        server = CoordinatorServer(coordinator, port, host).start()
+    except OSError as e:
+        reporter.log(f"ERROR: cannot listen on {args.serve}: {e}")
+        return 2
+    reporter.log(f"Coordinator: workers connect with --worker {server.address}")
+    if args.report:
+        reporter.report = RunReport(args.report)
+
+    scanner = build_scanner(args)
+    submitter = Submitter(
+        lambda path, priority, spec, job_id: coordinator.submit(spec, priority, job_id),
+        settings, store, args.priority, reporter.log,
+    )
+    try:
+        coordinator.start()
+        submitter.submit_restored()
+        for path in files:
+            submitter.submit(path)
+        scanner.scan_into(folders, submitter.submit)
+        coordinator.close()
+        report_scan_errors(reporter, scanner)
+        reporter.emit("scanned", files=len(submitter.submitted))
+        if not submitter.submitted:
+            reporter.log("ERROR: no video files found")
+            return 2
+        reporter.log(f"Queued {len(submitter.submitted)} file(s), waiting for workers")
+        coordinator.wait()
+        coordinator.release_workers()
+    except KeyboardInterrupt:
+        reporter.log("Interrupted, cancelling the remaining jobs...")
+        scanner.stop()
+        coordinator.cancel_all()
+        coordinator.release_workers()
+    finally:
+        server.stop()
+        if store is not None:
+            store.close()
+        if reporter.report is not None:
+            reporter.report.close()
+
+    return report_summary(reporter, coordinator.counts())
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    reporter = Reporter(json_output=args.json)
+    if args.serve and args.worker:
+        reporter.log("ERROR: --serve and --worker can't be combined")
+        return 2
+    if args.serve:
+        return run_coordinator(args, reporter)
+    if args.worker and (args.inputs or args.resume or args.dry_run):
+        reporter.log("ERROR: a --worker gets its files from the coordinator; "
+                     "drop the inputs, --resume and --dry-run")
+        return 2
+
+    ffmpeg_path = find_ffmpeg()
+    if not ffmpeg_path:
+        reporter.log("ERROR: ffmpeg not found next to the app or on PATH")
+        return 2
+
+    files, folders = expand_inputs(args.inputs)
+    if not files and not folders and not args.resume and not args.worker:
+        reporter.log("ERROR: no such files or folders")
+        return 2
+
+    analyze = args.analyze or args.sample or args.dry_run
+
+    try:
+        backend = select_backend(args.encoder, ffmpeg_path, log=reporter.log)
+    except RuntimeError as e:
+        reporter.log(f"ERROR: {e}")
+        return 2
+    reporter.log(f"Encoder: {backend.name} ({args.preset})")
+    hw_decode = select_decode(args.decode, backend, ffmpeg_path, log=reporter.log)
+    if args.jobs == "auto":
+        admission, limits = auto_concurrency(backend, log=reporter.log, nice=args.nice,
+                                             threads=args.threads)
+    else:
+        admission = None
+        limits = ProcessLimits(nice=args.nice, low_io=args.nice > 0,
+                               threads=args.threads or threads_per_job(args.jobs))
+    if admission is not None:
+        reporter.log(f"Parallel jobs: up to {admission.max_jobs}, started as load allows")
+
+    settings = settings_from_args(args, backend.key)
+    staging = StagingArea(
+        args.scratch,
+        budget_bytes=int(args.scratch_gb * 1024 ** 3),
+        prefetch=args.prefetch,
+        always=args.stage_always,
+        log=reporter.log,
+    ) if args.scratch else None
+    engine = ConversionEngine(
+        settings,
+        ffmpeg_path=ffmpeg_path,
+        log=reporter.log,
+        ledger=None if args.no_ledger else JobLedger(),
+        skip_completed=not args.force,
+        chunked_encoder=ChunkedEncoder(
+            ffmpeg_path,
+            settings,
+            reporter.log,
+            segment_seconds=args.chunk_seconds,
+            workers=args.chunk_workers,
+        ) if args.chunked else None,
+        analyzer=Analyzer(
+            settings, ffmpeg_path, sample=args.sample, log=reporter.log
+        ) if analyze else None,
+        quality_search=QualitySearch(
+            ffmpeg_path,
+            settings,
+            log=reporter.log,
+            cache=QualitySearchCache(),
+            workers=args.search_workers,
+        ) if settings.target_metric else None,
+        staging=staging,
+        hw_decode=hw_decode,
+        limits=limits,
+    )
+
+    scanner = build_scanner(args)
+    store = JobStore() if args.resume else None
+    scheduler = EncodeScheduler(
+        engine.run_job,
+        slots=None if admission is not None else args.jobs,
+        store=store,
+        max_attempts=args.retries + 1,
+        admission=admission,
+        limits=limits,
+        stall_seconds=args.stall_timeout,
+    )
+    worker = None
+    if args.worker:
+        worker = Worker(CoordinatorClient(args.worker), scheduler, settings, name=args.worker_name,
+                        path_maps=args.path_map, log=reporter.log)
+
+    def job_update(job):
+        reporter.job_update(job, scheduler)
+        if worker is not None:
+            worker.job_update(job)
+
+    scheduler.on_update = job_update
+    metrics_server = None
+    if args.metrics_port is not None:
+        try:
+            metrics_server = MetricsServer(scheduler, args.metrics_port, args.metrics_host).start()
+        except OSError as e:
+            reporter.log(f"ERROR: cannot serve metrics on {args.metrics_host}:{args.metrics_port}: {e}")
+            return 2
+        reporter.log(f"Metrics: {metrics_server.address}")
+    if args.report:
+        reporter.report = RunReport(args.report)
+
+    submitter = Submitter(
+        scheduler.submit, settings, store, args.priority, reporter.log,
+    )
+
+    try:
+        if worker is not None:
+            reporter.log(f"Worker {worker.name}: taking jobs from {worker.client.url}")
+            reporter.emit("start", slots=scheduler.slots, adaptive=scheduler.admission is not None)
+            scheduler.start()
+            worker.run()
+        elif analyze:
+            # Decisions are reported for the whole batch before anything encodes
+            paths = list(dict.fromkeys(
+                files + list(scanner.scan(folders)) + [queued.input_path for queued in submitter.restored]
+            ))
+            report_scan_errors(reporter, scanner)
+            reporter.emit("scanned", files=len(paths))
+            if not paths:
+                reporter.log("ERROR: no video files found")
+                return 2
+            settings_by_path = {
+                queued.input_path: job_settings(queued, settings) for queued in submitter.restored
+            }
+            report_analysis(reporter, engine.analyze_batch(
+                paths, workers=scheduler.slots, settings_by_path=settings_by_path
+            ))
+            if args.dry_run:
+                return 0
+            reporter.emit("start", slots=scheduler.slots, adaptive=scheduler.admission is not None)
+            scheduler.start()
+            submitter.submit_restored()
+            for path in paths:
+                submitter.submit(path)
+            scheduler.close()
+        else:
+            # Encoding starts right away; folder results are queued as they are found
+            reporter.emit("start", slots=scheduler.slots, adaptive=scheduler.admission is not None)
+            scheduler.start()
+            submitter.submit_restored()
+            for path in files:
+                submitter.submit(path)
+            scanner.scan_into(folders, submitter.submit)
+            scheduler.close()
+            report_scan_errors(reporter, scanner)
+            reporter.emit("scanned", files=len(submitter.submitted))
+            if not submitter.submitted:
+                reporter.log("ERROR: no video files found")
+                scheduler.wait()
+                return 2
+        scheduler.wait()
+    except KeyboardInterrupt:
+        scanner.stop()
+        if worker is not None:
+            worker.stop()
+        try:
+            if scheduler.running:
+                reporter.log("Interrupted, finishing the running file(s); press Ctrl+C again to stop them now")
+            # Files not started yet stay queued (with --resume, for the next run)
+            scheduler.drain()
+            scheduler.wait()
+        except KeyboardInterrupt:
+            reporter.log("Stopping ffmpeg...")
+            scheduler.cancel_all()
+            scheduler.wait()
+    finally:
+        if worker is not None:
+            worker.close()
+        if staging is not None:
+            # Outputs still being moved count towards the summary
+            staging.close()
+        if store is not None:
+            store.close()
+        if metrics_server is not None:
+            metrics_server.stop()
+        if reporter.report is not None:
+            reporter.report.close()
+
+    return report_summary(reporter, scheduler.counts())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
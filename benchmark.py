@@ -0,0 +1,599 @@
+"""
+Benchmarks for the conversion engine.
+
+Usage:
+    python -m benchmark languages [--count N]
+    python -m benchmark subtitles [--dirs N] [--videos N]
+    python -m benchmark probe [--files N]
+    python -m benchmark encode [--resolutions 480p,720p] [--durations 5,20] [--output FILE]
+    python -m benchmark profiles [--encoders svtav1] [--preset fast]
+    python -m benchmark compare BASELINE.json CURRENT.json
+
+Every command prints its results as JSON (or writes them with --output) so
+runs can be kept and compared against later ones.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from conversion_engine import ConversionEngine, ConversionSettings, JobSpec
+from encode_profiles import DEFAULT_PROFILE, PROFILES
+from encoders import DEFAULT_PRESET, PRESETS, detect_backends, list_ffmpeg_encoders
+from ffmpeg_utils import CREATE_NO_WINDOW, find_ffmpeg
+from library_scan import LibraryScanner
+from media_probe import ProbeCache, probe_media
+from scheduler import EncodeScheduler
+from subtitles import SubtitleIndex, detect_subtitle_language, find_matching_subtitles
+
+
+def legacy_detect_subtitle_language(filename):
+    """The original regex-per-language detector, kept as a baseline"""
+    filename_lower = filename.lower()
+    language_patterns = [
+        (r'\beng\b', 'eng', 'English'), (r'\ben\b', 'eng', 'English'),
+        (r'\benglish\b', 'eng', 'English'),
+        (r'\bspa\b', 'spa', 'Spanish'), (r'\bes\b', 'spa', 'Spanish'),
+        (r'\bspanish\b', 'spa', 'Spanish'), (r'\bespañol\b', 'spa', 'Spanish'),
+        (r'\bfre\b', 'fre', 'French'), (r'\bfra\b', 'fre', 'French'),
+        (r'\bfr\b', 'fre', 'French'), (r'\bfrench\b', 'fre', 'French'),
+        (r'\bger\b', 'ger', 'German'), (r'\bdeu\b', 'ger', 'German'),
+        (r'\bde\b', 'ger', 'German'), (r'\bgerman\b', 'ger', 'German'),
+        (r'\bita\b', 'ita', 'Italian'), (r'\bit\b', 'ita', 'Italian'),
+        (r'\bitalian\b', 'ita', 'Italian'),
+        (r'\bpor\b', 'por', 'Portuguese'), (r'\bpt\b', 'por', 'Portuguese'),
+        (r'\bportuguese\b', 'por', 'Portuguese'),
+        (r'\bjpn\b', 'jpn', 'Japanese'), (r'\bja\b', 'jpn', 'Japanese'),
+        (r'\bjapanese\b', 'jpn', 'Japanese'),
+        (r'\bchi\b', 'chi', 'Chinese'), (r'\bzh\b', 'chi', 'Chinese'),
+        (r'\bchinese\b', 'chi', 'Chinese'),
+        (r'\bkor\b', 'kor', 'Korean'), (r'\bko\b', 'kor', 'Korean'),
+        (r'\bkorean\b', 'kor', 'Korean'),
+        (r'\brus\b', 'rus', 'Russian'), (r'\bru\b', 'rus', 'Russian'),
+        (r'\brussian\b', 'rus', 'Russian'),
+        (r'\bara\b', 'ara', 'Arabic'), (r'\bar\b', 'ara', 'Arabic'),
+        (r'\barabic\b', 'ara', 'Arabic'),
+    ]
+    for pattern, code, title in language_patterns:
+        if re.search(pattern, filename_lower):
+            return (code, title)
+    return ('eng', 'English')
+
+
+_TITLE_WORDS = [
+    "the", "last", "city", "night", "shadow", "river", "king", "dragon", "blue",
+    "house", "star", "garden", "winter", "empire", "ghost", "signal", "harbor",
+]
+_LANGUAGE_TAGS = [
+    "en", "eng", "english", "es", "spa", "spanish", "fr", "fre", "french", "de",
+    "ger", "german", "it", "ita", "pt-br", "por", "ja", "jpn", "zh", "chi", "ko",
+    "kor", "ru", "rus", "ar", "ara", "nl", "dut", "sv", "swe", "pl", "pol", "tr",
+    "hin", "vie", "tha", "heb", "",
+]
+_FLAG_TAGS = ["", "", "", "forced", "sdh", "cc", "default"]
+
+
+def synthetic_subtitle_names(count, seed=1):
+    """Generate realistic-looking subtitle filenames"""
+    rng = random.Random(seed)
+    names = []
+    for i in range(count):
+        title = ".".join(rng.choice(_TITLE_WORDS).title() for _ in range(rng.randint(1, 4)))
+        episode = f"S{rng.randint(1, 12):02d}E{rng.randint(1, 24):02d}"
+        parts = [title, str(rng.randint(1970, 2025)) if i % 2 else episode, "1080p.WEB-DL"]
+        for tag in (rng.choice(_LANGUAGE_TAGS), rng.choice(_FLAG_TAGS)):
+            if tag:
+                parts.append(tag)
+        names.append(".".join(parts) + rng.choice([".srt", ".srt", ".ass", ".vtt"]))
+    return names
+
+
+def _time_calls(func, items, repeat):
+    """Best-of-repeat wall time for calling func on every item"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            func(item)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_language_detection(count=100000, repeat=3):
+    """Compare the compiled detector against the legacy regex loop"""
+    names = synthetic_subtitle_names(count)
+    legacy = _time_calls(legacy_detect_subtitle_language, names, repeat)
+    current = _time_calls(detect_subtitle_language, names, repeat)
+    return {
+        "benchmark": "detect_subtitle_language",
+        "filenames": count,
+        "legacy_seconds": round(legacy, 4),
+        "current_seconds": round(current, 4),
+        "legacy_per_call_us": round(legacy / count * 1e6, 3),
+        "current_per_call_us": round(current / count * 1e6, 3),
+        "speedup": round(legacy / current, 2) if current else None,
+    }
+
+
+def build_synthetic_library(root, dirs, videos_per_dir, seed=1):
+    """
+    Create an empty-file library under root: `dirs` folders, each holding
+    `videos_per_dir` episodes with two to four subtitle sidecars apiece.
+    Returns the video paths.
+    """
+    rng = random.Random(seed)
+    videos = []
+    for d in range(dirs):
+        show = ".".join(rng.choice(_TITLE_WORDS).title() for _ in range(rng.randint(1, 3)))
+        directory = os.path.join(root, f"{show} ({d})", f"Season {d % 10 + 1:02d}")
+        os.makedirs(directory, exist_ok=True)
+        for e in range(videos_per_dir):
+            stem = f"{show}.S{d % 10 + 1:02d}E{e + 1:02d}.1080p.WEB-DL"
+            names = [stem + rng.choice([".mkv", ".mp4"])]
+            for _ in range(rng.randint(2, 4)):
+                tags = [tag for tag in (rng.choice(_LANGUAGE_TAGS), rng.choice(_FLAG_TAGS)) if tag]
+                names.append(".".join([stem] + tags) + rng.choice([".srt", ".ass"]))
+            for name in names:
+                open(os.path.join(directory, name), "w").close()
+            videos.append(os.path.join(directory, names[0]))
+    return videos
+
+
+def bench_subtitle_scan(dirs=200, videos_per_dir=24, repeat=3):
+    """Library scan plus subtitle matching with and without the shared index"""
+    with tempfile.TemporaryDirectory(prefix="av1bench_") as root:
+        videos = build_synthetic_library(root, dirs, videos_per_dir)
+
+        def scan(_):
+            return sum(1 for _ in LibraryScanner().scan([root]))
+
+        scan_seconds = _time_calls(scan, [None], repeat)
+        # A fresh index per call: every video rescans its folder
+        uncached = _time_calls(find_matching_subtitles, videos, repeat)
+        # One index for the batch: each folder is scanned once
+        index = SubtitleIndex()
+        first_start = time.perf_counter()
+        matched = sum(len(find_matching_subtitles(video, index)) for video in videos)
+        first = time.perf_counter() - first_start
+        cached = _time_calls(lambda video: find_matching_subtitles(video, index), videos, repeat)
+    return {
+        "benchmark": "find_matching_subtitles",
+        "directories": dirs,
+        "videos": len(videos),
+        "subtitles_matched": matched,
+        "library_scan_seconds": round(scan_seconds, 4),
+        "uncached_seconds": round(uncached, 4),
+        "shared_index_first_pass_seconds": round(first, 4),
+        "shared_index_cached_seconds": round(cached, 4),
+        "uncached_per_video_us": round(uncached / len(videos) * 1e6, 3),
+        "cached_per_video_us": round(cached / len(videos) * 1e6, 3),
+    }
+
+
+def _clip_encoder(ffmpeg_path):
+    """Source video codec for synthetic clips: H.264 if available (as real inputs are)"""
+    return "libx264" if "libx264" in list_ffmpeg_encoders(ffmpeg_path) else "mpeg4"
+
+
+def generate_clip(ffmpeg_path, path, size, duration, rate=24):
+    """Write a testsrc2 + sine clip of the given size (WxH) and length in seconds"""
+    cmd = [
+        ffmpeg_path, '-hide_banner', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', f'testsrc2=size={size}:rate={rate}:duration={duration}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:duration={duration}',
+        '-c:v', _clip_encoder(ffmpeg_path), '-q:v', '2', '-pix_fmt', 'yuv420p',
+        '-c:a', 'aac', '-b:a', '128k', '-shortest', '-y', str(path),
+    ]
+    subprocess.run(cmd, check=True, creationflags=CREATE_NO_WINDOW)
+    return path
+
+
+def bench_probe(files=500, repeat=3, ffmpeg_path=None):
+    """Duration probing: ffprobe on every file versus probe cache hits"""
+    ffmpeg_path = ffmpeg_path or find_ffmpeg()
+    if not ffmpeg_path:
+        raise RuntimeError("ffmpeg could not be found")
+    with tempfile.TemporaryDirectory(prefix="av1bench_") as root:
+        source = generate_clip(ffmpeg_path, os.path.join(root, "source.mkv"), "320x180", 2)
+        paths = []
+        for i in range(files):
+            path = os.path.join(root, f"dir{i % 50:02d}", f"clip{i:05d}.mkv")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                os.link(source, path)
+            except OSError:
+                shutil.copyfile(source, path)
+            paths.append(path)
+
+        # Cold probes can be slow, so they run once rather than best-of-repeat
+        cold = _time_calls(lambda path: probe_media(path, use_cache=False), paths, 1)
+        cache = ProbeCache(os.path.join(root, "probe_cache.sqlite3"))
+        try:
+            info = probe_media(source, use_cache=False)
+            for path in paths:
+                cache.put(path, info)
+            cached = _time_calls(cache.get, paths, repeat)
+        finally:
+            cache.close()
+    return {
+        "benchmark": "probe_duration",
+        "files": files,
+        "duration": info.duration,
+        "probe_seconds": round(cold, 4),
+        "cached_seconds": round(cached, 4),
+        "probe_per_file_ms": round(cold / files * 1e3, 3),
+        "cached_per_file_ms": round(cached / files * 1e3, 3),
+    }
+
+
+# Clip sizes for the encode benchmark
+CLIP_SIZES = {"480p": "854x480", "720p": "1280x720", "1080p": "1920x1080"}
+CLIP_RATE = 24
+
+
+def _children_cpu_seconds():
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _process_peak_rss(pid):
+    """Peak resident set size of a running process in bytes (Linux only)"""
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+class _PeakRssSampler:
+    """Polls the peak RSS of a scheduler's ffmpeg children while they run"""
+
+    def __init__(self, scheduler, interval=0.1):
+        self.scheduler = scheduler
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            for job in self.scheduler.active_jobs():
+                for process in list(job.processes):
+                    rss = _process_peak_rss(process.pid)
+                    if rss is not None and (self.peak is None or rss > self.peak):
+                        self.peak = rss
+
+
+def run_encode(ffmpeg_path, clip, frames, duration, settings, output_path):
+    """Convert clip once through the engine and scheduler; returns one result row"""
+    engine = ConversionEngine(settings, ffmpeg_path=ffmpeg_path, skip_completed=False)
+    scheduler = EncodeScheduler(engine.run_job, slots=1, max_attempts=1)
+    job = scheduler.submit(str(clip), spec=JobSpec(str(clip), settings, output_path))
+    maxrss_before = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss if resource else None
+    cpu_before = _children_cpu_seconds()
+    start = time.perf_counter()
+    with _PeakRssSampler(scheduler) as sampler:
+        scheduler.start()
+        scheduler.close()
+        scheduler.wait()
+    wall = time.perf_counter() - start
+
+    cpu = None
+    if cpu_before is not None:
+        cpu = _children_cpu_seconds() - cpu_before
+    peak_rss = sampler.peak
+    if peak_rss is None and maxrss_before is not None:
+        # ru_maxrss is a high-water mark over all children (KiB on Linux,
+        # bytes on macOS); it only tells us about this run if it grew
+        maxrss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        if maxrss > maxrss_before:
+            peak_rss = maxrss if sys.platform == "darwin" else maxrss * 1024
+
+    size = os.path.getsize(output_path) if job.state == "done" and os.path.exists(output_path) else None
+    return {
+        "clip": os.path.basename(str(clip)),
+        "encoder": settings.encoder,
+        "preset": settings.preset,
+        "profile": settings.profile,
+        "state": job.state,
+        "error": job.error,
+        "wall_seconds": round(wall, 3),
+        "fps": round(frames / wall, 2) if wall else None,
+        "speed": round(duration / wall, 3) if wall else None,
+        "cpu_seconds": round(cpu, 3) if cpu is not None else None,
+        # 100 = one core busy for the whole run
+        "cpu_percent": round(cpu / wall * 100, 1) if cpu is not None and wall else None,
+        "peak_rss_bytes": peak_rss,
+        "output_bytes": size,
+        "output_kbps": round(size * 8 / duration / 1000, 1) if size else None,
+    }
+
+
+def bench_encode(resolutions=("480p", "720p", "1080p"), durations=(10,), encoders=None, presets=None,
+                 quality=40, ffmpeg_path=None, log=None, profiles=(DEFAULT_PROFILE,)):
+    """
+    Encode every synthetic clip with every usable backend, preset and profile.
+    encoders/presets restrict the matrix (backend keys / preset names).
+    """
+    log = log or (lambda message: None)
+    ffmpeg_path = ffmpeg_path or find_ffmpeg()
+    if not ffmpeg_path:
+        raise RuntimeError("ffmpeg could not be found")
+    backends = [backend for backend in detect_backends(ffmpeg_path)
+                if not encoders or backend.key in encoders]
+    if not backends:
+        raise RuntimeError("No usable AV1 encoder matches the requested backends")
+    presets = [preset for preset in PRESETS if not presets or preset in presets]
+
+    runs = []
+    with tempfile.TemporaryDirectory(prefix="av1bench_") as workdir:
+        for resolution in resolutions:
+            for duration in durations:
+                clip = os.path.join(workdir, f"testsrc2_{resolution}_{duration}s.mkv")
+                log(f"Generating {os.path.basename(clip)}")
+                generate_clip(ffmpeg_path, clip, CLIP_SIZES[resolution], duration, CLIP_RATE)
+                for backend in backends:
+                    for preset in presets:
+                        for profile in profiles:
+                            settings = ConversionSettings(quality=quality, encoder=backend.key, preset=preset,
+                                                          profile=profile)
+                            output = os.path.join(workdir, f"out_{backend.key}_{preset}_{profile}.mkv")
+                            log(f"Encoding {os.path.basename(clip)} with {backend.key} ({preset}, {profile})")
+                            row = run_encode(ffmpeg_path, clip, duration * CLIP_RATE, duration, settings, output)
+                            row.update({"resolution": resolution, "duration": duration})
+                            runs.append(row)
+                            if os.path.exists(output):
+                                os.remove(output)
+    return {
+        "benchmark": "encode",
+        "quality": quality,
+        "runs": runs,
+    }
+
+
+def profile_tradeoffs(runs):
+    """Each profile's output size and encode time relative to the standard profile's"""
+    baselines = {
+        (run["clip"], run["encoder"], run["preset"]): run
+        for run in runs if run.get("profile") == DEFAULT_PROFILE and run["state"] == "done"
+    }
+    tradeoffs = []
+    for run in runs:
+        base = baselines.get((run["clip"], run["encoder"], run["preset"]))
+        if base is None or run["state"] != "done" or run is base:
+            continue
+        tradeoffs.append({
+            "clip": run["clip"],
+            "encoder": run["encoder"],
+            "preset": run["preset"],
+            "profile": run["profile"],
+            "size_percent": round(run["output_bytes"] / base["output_bytes"] * 100, 1)
+            if run["output_bytes"] and base["output_bytes"] else None,
+            "time_percent": round(run["wall_seconds"] / base["wall_seconds"] * 100, 1)
+            if base["wall_seconds"] else None,
+        })
+    return tradeoffs
+
+
+def bench_profiles(resolutions=("720p",), durations=(10,), encoders=None, preset=DEFAULT_PRESET,
+                   quality=40, ffmpeg_path=None, log=None):
+    """Encode synthetic clips with every encode profile, relating size and time to the standard one"""
+    result = bench_encode(resolutions, durations, encoders, [preset], quality, ffmpeg_path, log,
+                          profiles=list(PROFILES))
+    result["benchmark"] = "profiles"
+    result["tradeoffs"] = profile_tradeoffs(result["runs"])
+    return result
+
+
+def environment():
+    """Where a result came from, so runs on different machines aren't compared blindly"""
+    ffmpeg_path = find_ffmpeg()
+    version = None
+    if ffmpeg_path:
+        try:
+            result = subprocess.run(
+                [ffmpeg_path, '-hide_banner', '-version'],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                universal_newlines=True,
+                creationflags=CREATE_NO_WINDOW,
+            )
+            version = (result.stdout.splitlines() or [None])[0]
+        except OSError:
+            pass
+    return {
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "ffmpeg": version,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+# Result fields compared by `compare`: name -> True if lower is better
+COMPARED_FIELDS = {
+    "wall_seconds": True, "fps": False, "cpu_seconds": True, "peak_rss_bytes": True,
+    "output_bytes": True, "legacy_seconds": True, "current_seconds": True,
+    "uncached_seconds": True, "shared_index_cached_seconds": True, "library_scan_seconds": True,
+    "probe_seconds": True, "cached_seconds": True,
+}
+
+
+def _result_rows(result):
+    """Flatten a result file into {key: row} for comparison"""
+    if "runs" in result:
+        return {
+            (result["benchmark"], run["clip"], run["encoder"], run["preset"],
+             run.get("profile", DEFAULT_PROFILE)): run
+            for run in result["runs"]
+        }
+    return {(result["benchmark"],): result}
+
+
+def compare_results(baseline, current, threshold=0.10):
+    """
+    Changes between two result files for matching runs. A change worse than
+    threshold (a fraction) in a field's bad direction is a regression.
+    """
+    base_rows = _result_rows(baseline)
+    changes = []
+    for key, row in _result_rows(current).items():
+        base = base_rows.get(key)
+        if base is None:
+            continue
+        for field, lower_is_better in COMPARED_FIELDS.items():
+            old, new = base.get(field), row.get(field)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = change > threshold if lower_is_better else change < -threshold
+            changes.append({
+                "run": "/".join(str(part) for part in key),
+                "field": field,
+                "baseline": old,
+                "current": new,
+                "change_percent": round(change * 100, 1),
+                "regression": worse,
+            })
+    return {
+        "benchmark": "compare",
+        "threshold_percent": threshold * 100,
+        "regressions": sum(1 for change in changes if change["regression"]),
+        "changes": changes,
+    }
+
+
+def _csv(value, convert=str):
+    return [convert(part.strip()) for part in value.split(",") if part.strip()]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="benchmark", description="AV1 converter benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    languages = sub.add_parser("languages", help="Subtitle language detection micro-benchmark")
+    languages.add_argument("--count", type=int, default=100000, help="Number of synthetic filenames")
+    languages.add_argument("--repeat", type=int, default=3, help="Best of N runs")
+
+    subs = sub.add_parser("subtitles", help="Library scan and subtitle matching on a synthetic tree")
+    subs.add_argument("--dirs", type=int, default=200, help="Number of folders")
+    subs.add_argument("--videos", type=int, default=24, help="Videos per folder")
+    subs.add_argument("--repeat", type=int, default=3, help="Best of N runs")
+
+    probe = sub.add_parser("probe", help="Duration probing, uncached versus cached")
+    probe.add_argument("--files", type=int, default=500, help="Number of synthetic files")
+    probe.add_argument("--repeat", type=int, default=3, help="Best of N runs for cache hits")
+
+    encode = sub.add_parser("encode", help="Encode synthetic clips with every backend and preset")
+    encode.add_argument("--resolutions", type=_csv, default=list(CLIP_SIZES),
+                        help=f"Comma-separated clip sizes ({', '.join(CLIP_SIZES)})")
+    encode.add_argument("--durations", type=lambda value: _csv(value, int), default=[10],
+                        help="Comma-separated clip lengths in seconds")
+    encode.add_argument("--encoders", type=_csv, default=None,
+                        help="Comma-separated backend keys (default: every usable one)")
+    encode.add_argument("--presets", type=_csv, default=None,
+                        help=f"Comma-separated presets (default: {', '.join(PRESETS)})")
+    encode.add_argument("--quality", type=int, default=40, help="CQ value")
+    encode.add_argument("--profiles", type=_csv, default=[DEFAULT_PROFILE],
+                        help=f"Comma-separated encode profiles (default: {DEFAULT_PROFILE})")
+
+    profiles = sub.add_parser("profiles", help="Size/speed trade-off of each encode profile")
+    profiles.add_argument("--resolutions", type=_csv, default=["720p"],
+                          help=f"Comma-separated clip sizes ({', '.join(CLIP_SIZES)})")
+    profiles.add_argument("--durations", type=lambda value: _csv(value, int), default=[10],
+                          help="Comma-separated clip lengths in seconds")
+    profiles.add_argument("--encoders", type=_csv, default=None,
+                          help="Comma-separated backend keys (default: every usable one)")
+    profiles.add_argument("--preset", choices=PRESETS, default=DEFAULT_PRESET, help="Speed preset")
+    profiles.add_argument("--quality", type=int, default=40, help="CQ value")
+
+    compare = sub.add_parser("compare", help="Compare two result files")
+    compare.add_argument("baseline", help="Earlier result JSON")
+    compare.add_argument("current", help="New result JSON")
+    compare.add_argument("--threshold", type=float, default=10.0,
+                         help="Percent change counted as a regression")
+
+    for command in (languages, subs, probe, encode, profiles, compare):
+        command.add_argument("--output", help="Write the JSON result to this file")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command in ("encode", "profiles"):
+        unknown = [resolution for resolution in args.resolutions if resolution not in CLIP_SIZES]
+        if unknown:
+            parser.error(f"unknown resolution: {', '.join(unknown)}")
+    if args.command == "encode":
+        unknown = [profile for profile in args.profiles if profile not in PROFILES]
+        if unknown:
+            parser.error(f"unknown profile: {', '.join(unknown)}")
+
+    try:
+        if args.command == "languages":
+            result = bench_language_detection(args.count, args.repeat)
+        elif args.command == "subtitles":
+            result = bench_subtitle_scan(args.dirs, args.videos, args.repeat)
+        elif args.command == "probe":
+            result = bench_probe(args.files, args.repeat)
+        elif args.command == "encode":
+            result = bench_encode(args.resolutions, args.durations, args.encoders, args.presets,
+                                  args.quality, log=lambda message: print(message, file=sys.stderr),
+                                  profiles=args.profiles)
+        elif args.command == "profiles":
+            result = bench_profiles(args.resolutions, args.durations, args.encoders, args.preset,
+                                    args.quality, log=lambda message: print(message, file=sys.stderr))
+        else:
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)
+            with open(args.current, encoding="utf-8") as f:
+                current = json.load(f)
+            result = compare_results(baseline, current, args.threshold / 100)
+    except (RuntimeError, subprocess.CalledProcessError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+    if args.command != "compare":
+        result["environment"] = environment()
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.command == "compare" and result["regressions"]:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,303 @@
+"""
+Resumable chunked encoding.
+Splits a long input at keyframes, encodes the video of each segment in its
+own ffmpeg process (several at once), checkpoints finished segments in a
+manifest, then concatenates them losslessly and muxes audio and subtitles
+from the source in one final pass. Re-running after a crash only encodes
+the segments that are missing.
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from conversion_engine import (
+    audio_args,
+    source_stream_args,
+    subtitle_codec_args,
+    subtitle_input_args,
+    subtitle_map_args,
+    video_encode_args,
+)
+from ffmpeg_progress import PROGRESS_ARGS
+from ffmpeg_utils import CREATE_NO_WINDOW, find_ffprobe
+from scheduler import CancelledError, RetryableError
+
+
+MANIFEST_VERSION = 1
+
+
+def keyframe_times(input_file, ffprobe_path=None):
+    """
+    Return the presentation times (seconds) of video keyframes.
+    Reads packet flags only, so nothing is decoded.
+    """
+    ffprobe_path = ffprobe_path or find_ffprobe()
+    if not ffprobe_path:
+        raise FileNotFoundError("ffprobe is required for chunked encoding")
+    cmd = [
+        ffprobe_path,
+        '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags',
+        '-of', 'csv=p=0',
+        str(input_file),
+    ]
+    result = subprocess.run(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        creationflags=CREATE_NO_WINDOW,
+    )
+    if result.returncode != 0:
+        raise Exception(f"Could not read keyframes: {result.stderr.strip()}")
+
+    times = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' in flags and pts_time not in ('', 'N/A'):
+            times.append(float(pts_time))
+    return sorted(set(times))
+
+
+def plan_segments(keyframes, duration, target_seconds):
+    """
+    Choose segment boundaries on keyframes, each segment at least
+    target_seconds long (the last one absorbs the remainder).
+    Returns [(start, end), ...] covering 0..duration.
+    """
+    boundaries = [0.0]
+    for time_point in keyframes:
+        if time_point - boundaries[-1] >= target_seconds and duration - time_point >= target_seconds / 2:
+            boundaries.append(time_point)
+    boundaries.append(duration)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+class ChunkManifest:
+    """Checkpoint file recording which segments of an encode are finished"""
+
+    def __init__(self, path, fingerprint, settings_key, segments):
+        self.path = Path(path)
+        self.fingerprint = fingerprint
+        self.settings_key = settings_key
+        self.segments = segments
+        self.done = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load_or_create(cls, path, fingerprint, settings_key, segments):
+        """
+        Reuse an existing manifest if it belongs to the same input, settings
+        and segment plan; otherwise start fresh.
+        """
+        manifest = cls(path, fingerprint, settings_key, segments)
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return manifest
+        same_job = (
+            data.get('version') == MANIFEST_VERSION
+            and data.get('fingerprint') == fingerprint
+            and data.get('settings_key') == settings_key
+            and [tuple(seg) for seg in data.get('segments', [])] == [tuple(seg) for seg in segments]
+        )
+        if same_job:
+            manifest.done = set(data.get('done', []))
+        return manifest
+
+    def mark_done(self, index):
+        with self._lock:
+            self.done.add(index)
+            self.save()
+
+    def save(self):
+        data = {
+            'version': MANIFEST_VERSION,
+            'fingerprint': self.fingerprint,
+            'settings_key': self.settings_key,
+            'segments': self.segments,
+            'done': sorted(self.done),
+        }
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+class ChunkedEncoder:
+    """Encodes one job as keyframe-aligned segments on a small worker pool"""
+
+    def __init__(self, ffmpeg_path, settings, log, segment_seconds=120, workers=2):
+        self.ffmpeg_path = ffmpeg_path
+        self.settings = settings
+        self.log = log
+        self.segment_seconds = segment_seconds
+        self.workers = max(1, workers)
+
+    def work_dir_for(self, output_path):
+        return output_path.parent / '.chunks' / output_path.stem
+
+    def run(self, job, scheduler, input_file, output_path, subtitles, duration, fingerprint, settings_key,
+            settings=None, write_path=None, hw_decode=None, threads=None, selection=None, frame_rate=None):
+        """
+        settings overrides the batch settings for this file (e.g. a searched CQ).
+        write_path is where the final mux is written if not output_path itself
+        (the work directory is still named after output_path so resumes find it).
+        hw_decode (a hwaccel.CudaDecode) decodes and scales segments on the GPU.
+        threads caps the job's threads, shared between the segment workers.
+        selection (a stream_selection.StreamSelection) picks the source streams
+        muxed in at the end. frame_rate sets the profile's keyframe interval.
+        """
+        settings = settings or self.settings
+        name = os.path.basename(input_file)
+        work_dir = self.work_dir_for(output_path)
+        work_dir.mkdir(parents=True, exist_ok=True)
+
+        segments = plan_segments(keyframe_times(input_file), duration, self.segment_seconds)
+        manifest = ChunkManifest.load_or_create(
+            work_dir / 'manifest.json', fingerprint, settings_key, segments
+        )
+        manifest.save()
+
+        pending = [
+            i for i in range(len(segments))
+            if i not in manifest.done or not self.segment_path(work_dir, i).exists()
+        ]
+        self.log(
+            f"[{name}] Chunked encode: {len(segments)} segment(s), "
+            f"{len(segments) - len(pending)} already done, {self.workers} worker(s)"
+        )
+
+        # Progress: finished segments count fully, running ones by their position
+        lengths = [end - start for start, end in segments]
+        positions = {i: lengths[i] for i in range(len(segments)) if i not in pending}
+        progress_lock = threading.Lock()
+
+        def on_segment_progress(index, seconds):
+            with progress_lock:
+                positions[index] = min(seconds, lengths[index])
+                total = sum(positions.values())
+            scheduler.report_progress(job, 0.95 * total / duration if duration else 0)
+
+        segment_threads = max(1, threads // self.workers) if threads else None
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = [
+                pool.submit(self.encode_segment, job, scheduler, input_file, work_dir,
+                            i, segments[i], manifest, on_segment_progress, settings, hw_decode,
+                            segment_threads, frame_rate)
+                for i in pending
+            ]
+            done, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+            error = next((f.exception() for f in futures if f in done and f.exception() is not None), None)
+            if error is not None:
+                # One failed segment fails the file: stop the others rather than finish them
+                for future in not_done:
+                    future.cancel()
+                while not_done:
+                    scheduler.stop_processes(job)
+                    done, not_done = wait(not_done, timeout=1)
+        if scheduler.is_cancelled(job):
+            raise CancelledError()
+        if error is not None:
+            raise error
+
+        self.log(f"[{name}] All segments encoded, muxing final output")
+        self.concat_and_mux(job, scheduler, input_file, work_dir, len(segments), write_path or output_path,
+                            subtitles, settings, selection)
+
+    @staticmethod
+    def segment_path(work_dir, index):
+        return work_dir / f'segment_{index:05d}.mkv'
+
+    def encode_segment(self, job, scheduler, input_file, work_dir, index, segment, manifest, on_progress,
+                       settings, hw_decode=None, threads=None, frame_rate=None):
+        """Encode the video of one segment; audio and subtitles are added at the end"""
+        if scheduler.is_cancelled(job):
+            raise CancelledError()
+        start, end = segment
+        final_path = self.segment_path(work_dir, index)
+        partial_path = final_path.with_name(final_path.stem + '.partial.mkv')
+
+        cmd = [self.ffmpeg_path, '-hide_banner', '-loglevel', 'warning']
+        cmd.extend(PROGRESS_ARGS)
+        if hw_decode is not None:
+            cmd.extend(hw_decode.input_args())
+        if threads:
+            cmd.extend(['-threads', str(threads)])
+        cmd.extend([
+            '-ss', f'{start:.6f}',
+            '-i', str(input_file),
+            '-t', f'{end - start:.6f}',
+            '-map', '0:v:0',
+            '-an', '-sn', '-dn',
+        ])
+        cmd.extend(video_encode_args(settings, hw_decode, threads, frame_rate))
+        cmd.extend(['-y', str(partial_path)])
+
+        def segment_progress(event):
+            if event.out_time is not None:
+                on_progress(index, event.out_time)
+
+        result = scheduler.run_process(job, cmd, end - start, on_progress=segment_progress)
+        if result.returncode != 0:
+            error = result.last_error()
+            detail = f": {error}" if error else ""
+            # Finished segments are kept, so a retry only redoes the missing ones
+            error_type = RetryableError if result.returncode < 0 or result.is_transient() else Exception
+            raise error_type(f"Segment {index} failed with code {result.returncode}{detail}")
+
+        os.replace(partial_path, final_path)
+        manifest.mark_done(index)
+        on_progress(index, end - start)
+
+    def concat_and_mux(self, job, scheduler, input_file, work_dir, segment_count, output_path, subtitles,
+                       settings, selection=None):
+        """Join segments without re-encoding and add audio/subtitles from the source"""
+        list_path = work_dir / 'segments.txt'
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for i in range(segment_count):
+                # concat demuxer quoting: escape single quotes
+                segment = str(self.segment_path(work_dir, i)).replace("'", "'\\''")
+                f.write(f"file '{segment}'\n")
+
+        cmd = [self.ffmpeg_path, '-hide_banner', '-loglevel', 'warning']
+        cmd.extend(PROGRESS_ARGS)
+        cmd.extend([
+            '-f', 'concat', '-safe', '0', '-i', str(list_path),
+            '-i', str(input_file),
+        ])
+        cmd.extend(subtitle_input_args(subtitles))
+        cmd.extend(['-c:v', 'copy'])
+        cmd.extend(audio_args(settings))
+        cmd.extend(['-map', '0:v'])
+        embedded = len(selection.subtitles) if selection is not None else 0
+        cmd.extend(subtitle_codec_args(subtitles, first_index=embedded))
+        if selection is None:
+            cmd.extend(['-map', '1:a?'])
+        else:
+            cmd.extend(source_stream_args(selection, 1))
+        cmd.extend(subtitle_map_args(subtitles, first_input=2, first_index=embedded))
+        cmd.extend(['-y', str(output_path)])
+
+        result = scheduler.run_process(job, cmd)
+        if result.returncode != 0:
+            error_type = RetryableError if result.is_transient() else Exception
+            raise error_type(f"Final mux failed: {result.last_error() or result.returncode}")
+
+    def cleanup(self, output_path):
+        """Remove segment files once the final output has been verified"""
+        work_dir = self.work_dir_for(output_path)
+        shutil.rmtree(work_dir, ignore_errors=True)
+        try:
+            work_dir.parent.rmdir()  # only succeeds once no other job is using it
+        except OSError:
+            pass
@@ -0,0 +1,754 @@
+"""
+GUI-free conversion engine.
+Builds ffmpeg commands, runs them and reports progress through callbacks,
+so the same code drives both the desktop app and the headless CLI.
+"""
+
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from encode_profiles import DEFAULT_PROFILE, get_profile
+from encoders import DEFAULT_ENCODER, DEFAULT_PRESET, PRESETS, get_backend, merge_encoder_params
+from ffmpeg_progress import PROGRESS_ARGS
+from ffmpeg_utils import find_ffmpeg
+from media_probe import probe_media
+from job_ledger import fingerprint_file, settings_key
+from output_files import commit_output, discard, sweep_orphans, temp_output_path
+from scheduler import CancelledError, RetryableError, PROBING, ENCODING, SKIPPED, FAILED
+from stream_selection import normalize_language, select_streams
+from subtitles import SubtitleIndex
+
+
+# Resolution mapping
+RESOLUTION_MAP = {
+    "Original": None,
+    "1080p": "1920:1080",
+    "720p": "1280:720"
+}
+
+# Audio codec mapping
+AUDIO_CODEC_MAP = {
+    "Copy Original (Recommended)": {"codec": "copy", "bitrate": None},
+    "AAC 128k": {"codec": "aac", "bitrate": "128k"},
+    "AAC 192k": {"codec": "aac", "bitrate": "192k"},
+    "Opus 128k": {"codec": "libopus", "bitrate": "128k"}
+}
+
+DEFAULT_RESOLUTION = "Original"
+DEFAULT_AUDIO = "Copy Original (Recommended)"
+DEFAULT_QUALITY = 40
+
+# Metrics the per-title CQ search can target
+QUALITY_METRICS = ("vmaf", "ssim")
+
+
+class ConversionSettings:
+    """
+    Encode options for a batch or a single queued file.
+    Immutable: worker threads read it without locks, and changing the form
+    in the app never alters settings already handed to a job.
+    """
+
+    __slots__ = (
+        "resolution", "audio", "quality", "output_name", "encoder", "preset",
+        "target_metric", "target_score", "audio_languages", "drop_commentary",
+        "keep_embedded_subtitles", "keep_attachments", "remux_only", "profile",
+    )
+    FIELDS = __slots__
+
+    def __init__(self, resolution=DEFAULT_RESOLUTION, audio=DEFAULT_AUDIO,
+                 quality=DEFAULT_QUALITY, output_name="", encoder=DEFAULT_ENCODER,
+                 preset=DEFAULT_PRESET, target_metric=None, target_score=None,
+                 audio_languages=(), drop_commentary=False, keep_embedded_subtitles=True,
+                 keep_attachments=True, remux_only=False, profile=DEFAULT_PROFILE):
+        if resolution not in RESOLUTION_MAP:
+            raise ValueError(f"Unknown resolution: {resolution}")
+        if audio not in AUDIO_CODEC_MAP:
+            raise ValueError(f"Unknown audio option: {audio}")
+        if preset not in PRESETS:
+            raise ValueError(f"Unknown preset: {preset}")
+        get_backend(encoder)  # validates the key
+        get_profile(profile)
+        if target_metric is not None and (target_metric not in QUALITY_METRICS or target_score is None):
+            raise ValueError(f"Invalid quality target: {target_metric} {target_score}")
+        languages = tuple(normalize_language(code) for code in audio_languages)
+        if None in languages:
+            raise ValueError(f"Unknown audio language in {list(audio_languages)}")
+        values = {
+            "resolution": resolution,
+            "audio": audio,
+            "quality": int(quality),
+            "output_name": (output_name or "").strip(),
+            # Backend key from encoders.py, already resolved against what is available
+            "encoder": encoder,
+            "preset": preset,
+            # Per-title CQ search: pick each file's CQ to reach this score
+            "target_metric": target_metric,
+            "target_score": target_score,
+            # Stream selection (stream_selection.py): audio languages to keep
+            # (empty keeps all), commentary, embedded subtitles, attachments
+            "audio_languages": languages,
+            "drop_commentary": bool(drop_commentary),
+            "keep_embedded_subtitles": bool(keep_embedded_subtitles),
+            "keep_attachments": bool(keep_attachments),
+            # Copy video and audio, only adding subtitles / dropping streams
+            "remux_only": bool(remux_only),
+            # encode_profiles.PROFILES name: GOP, lookahead, AQ, grain, two-pass
+            "profile": profile,
+        }
+        for field, value in values.items():
+            object.__setattr__(self, field, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __repr__(self):
+        return f"ConversionSettings({self.to_dict()})"
+
+    def describe(self):
+        """Short summary for log lines"""
+        quality = (
+            f"{self.target_metric.upper()} {self.target_score:g}" if self.target_metric
+            else f"CQ {self.quality}"
+        )
+        if self.remux_only:
+            parts = ["remux only"]
+        else:
+            parts = [self.resolution, quality, self.audio]
+            if self.profile != DEFAULT_PROFILE:
+                parts.append(f"{self.profile} profile")
+        if self.audio_languages:
+            parts.append(f"audio {'+'.join(self.audio_languages)}")
+        if self.drop_commentary:
+            parts.append("no commentary")
+        if not self.keep_embedded_subtitles:
+            parts.append("no embedded subtitles")
+        if self.output_name:
+            parts.append(f"named {self.output_name}")
+        return ", ".join(parts)
+
+    def with_quality(self, quality):
+        """Copy of these settings with a different CQ (used for per-file searches)"""
+        values = self.to_dict()
+        values["quality"] = quality
+        return ConversionSettings(**values)
+
+    def to_dict(self):
+        values = {field: getattr(self, field) for field in self.FIELDS}
+        values["audio_languages"] = list(self.audio_languages)  # JSON friendly
+        return values
+
+    @property
+    def default_streams(self):
+        """True if stream selection keeps everything, as before it existed"""
+        return (not self.audio_languages and not self.drop_commentary
+                and self.keep_embedded_subtitles and self.keep_attachments)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild saved settings; fields missing from older snapshots keep their defaults"""
+        return cls(**{field: data[field] for field in cls.FIELDS if field in data})
+
+
+def output_path_for(input_file, settings):
+    """Return the output path for input_file inside its Converted folder"""
+    input_path = Path(input_file)
+    output_dir = input_path.parent / "Converted"
+
+    if settings.output_name:
+        # Use custom name, ensure .mkv extension
+        if not settings.output_name.endswith('.mkv'):
+            output_filename = f"{settings.output_name}.mkv"
+        else:
+            output_filename = settings.output_name
+    elif settings.remux_only:
+        # Video is untouched, so the name stays; Converted/ keeps it apart
+        output_filename = f"{input_path.stem}.mkv"
+    else:
+        # Use default naming
+        output_filename = f"{input_path.stem}_AV1.mkv"
+
+    return output_dir / output_filename
+
+
+class JobSpec:
+    """
+    Everything needed to convert one file, fixed when it is queued: the
+    input, where the output goes and the settings to use. Immutable like
+    ConversionSettings, so slot threads never need the UI to run a job.
+    """
+
+    __slots__ = ("input_path", "output_path", "settings")
+
+    def __init__(self, input_path, settings, output_path=None):
+        object.__setattr__(self, "input_path", str(input_path))
+        object.__setattr__(self, "settings", settings)
+        object.__setattr__(
+            self, "output_path", Path(output_path) if output_path else output_path_for(input_path, settings)
+        )
+
+    def __setattr__(self, name, value):
+        raise AttributeError("JobSpec is immutable")
+
+    def __repr__(self):
+        return f"JobSpec({self.input_path!r} -> {str(self.output_path)!r})"
+
+
+class OutputPlanner:
+    """
+    Hands out output paths so no two jobs write the same file. A custom
+    output name (or two inputs sharing a stem, like a.mp4 and a.mkv) would
+    otherwise send several files to one path; later ones get " (2)", " (3)"...
+    """
+
+    def __init__(self):
+        self._taken = set()
+        self._lock = threading.Lock()
+
+    def plan(self, input_path, settings):
+        """JobSpec for input_path with an output path no earlier job has claimed"""
+        base = output_path_for(input_path, settings)
+        candidate = base
+        with self._lock:
+            number = 2
+            while os.path.normcase(str(candidate)) in self._taken:
+                candidate = base.with_name(f"{base.stem} ({number}){base.suffix}")
+                number += 1
+            self._taken.add(os.path.normcase(str(candidate)))
+        return JobSpec(input_path, settings, candidate)
+
+
+def subtitle_title(track):
+    """Track title shown by players, e.g. 'English (Forced)' or 'English SDH'"""
+    title = track.language_title
+    if track.tags.sdh:
+        title += " SDH"
+    if track.tags.forced:
+        title += " (Forced)"
+    return title
+
+
+def video_encode_args(settings, hw_decode=None, threads=None, frame_rate=None):
+    """
+    Video codec, rate control, encode profile and scaling arguments.
+    hw_decode (a hwaccel.CudaDecode) scales on the GPU instead of with the
+    software scale filter; its input_args() must then precede the input.
+    threads caps the encoder's threads. frame_rate (of the source) turns
+    the profile's keyframe interval into frames.
+    """
+    backend = get_backend(settings.encoder)
+    args = backend.video_args(settings.quality, settings.preset)
+    args.extend(backend.profile_args(get_profile(settings.profile), frame_rate))
+    if threads:
+        args.extend(backend.thread_args(threads))
+
+    # Resolution scaling if not original
+    scale = RESOLUTION_MAP[settings.resolution]
+    if scale:
+        if hw_decode is not None:
+            args.extend(['-vf', hw_decode.scale_filter(scale)])
+        else:
+            args.extend(['-vf', f'scale={scale}:force_original_aspect_ratio=decrease'])
+    return merge_encoder_params(args)
+
+
+def needs_first_pass(settings):
+    """True if settings' profile asks for two passes and the encoder runs them as separate ffmpeg runs"""
+    return get_profile(settings.profile).two_pass and get_backend(settings.encoder).two_pass == "external"
+
+
+def pass_args(pass_number, passlog):
+    return ['-pass', str(pass_number), '-passlogfile', str(passlog)]
+
+
+def first_pass_command(ffmpeg_path, input_file, settings, passlog, hw_decode=None, threads=None,
+                       frame_rate=None):
+    """argv for the analysis pass of a two-pass encode: video only, output discarded"""
+    cmd = [ffmpeg_path, '-hide_banner', '-loglevel', 'warning']
+    cmd.extend(PROGRESS_ARGS)
+    if hw_decode is not None:
+        cmd.extend(hw_decode.input_args())
+    if threads:
+        cmd.extend(['-threads', str(int(threads))])
+    cmd.extend(['-i', str(input_file), '-map', '0:v:0'])
+    cmd.extend(video_encode_args(settings, hw_decode, threads, frame_rate))
+    cmd.extend(pass_args(1, passlog))
+    cmd.extend(['-an', '-sn', '-dn', '-f', 'null', '-y', '-'])
+    return cmd
+
+
+def audio_args(settings):
+    """Audio codec arguments: copy or re-encode based on selection"""
+    if settings.remux_only:
+        return ['-c:a', 'copy']
+    audio_settings = AUDIO_CODEC_MAP[settings.audio]
+    args = ['-c:a', audio_settings['codec']]
+
+    # Only add bitrate if not copying
+    if audio_settings['bitrate'] is not None:
+        args.extend(['-b:a', audio_settings['bitrate']])
+    return args
+
+
+def subtitle_input_args(subtitles):
+    """Add all subtitle files as inputs"""
+    args = []
+    for track in subtitles:
+        args.extend(['-i', str(track.path)])
+    return args
+
+
+def subtitle_codec_args(subtitles, first_index=0):
+    """
+    Copy subtitles as-is, except WebVTT which MKV players handle poorly.
+    Sidecars follow first_index embedded subtitle tracks in the output.
+    """
+    args = ['-c:s', 'copy']
+    for idx, track in enumerate(subtitles, first_index):
+        if Path(track.path).suffix.lower() == '.vtt':
+            args.extend([f'-c:s:{idx}', 'srt'])
+    return args
+
+
+def subtitle_map_args(subtitles, first_input, first_index=0):
+    """
+    Map each subtitle input (starting at input index first_input) and set
+    metadata; the sidecars become output subtitle tracks first_index onwards
+    """
+    args = []
+    for idx, track in enumerate(subtitles, first_index):
+        args.extend(['-map', f'{first_input + idx - first_index}:0'])
+        args.extend([f'-metadata:s:s:{idx}', f'language={track.language_code}'])
+        args.extend([f'-metadata:s:s:{idx}', f'title={subtitle_title(track)}'])
+
+        dispositions = []
+        if track.tags.default:
+            dispositions.append('default')
+        if track.tags.forced:
+            dispositions.append('forced')
+        if track.tags.sdh:
+            dispositions.append('hearing_impaired')
+        if dispositions:
+            args.extend([f'-disposition:s:{idx}', '+'.join(dispositions)])
+    return args
+
+
+def source_stream_args(selection, input_index):
+    """
+    Map, codec and disposition arguments for the source's selected audio,
+    embedded subtitle and attachment streams (not video), where the source
+    is input input_index. selection is a stream_selection.StreamSelection.
+    """
+    args = selection.map_args(input_index, video=False)
+    args.extend(selection.audio_disposition_args())
+    args.extend(selection.subtitle_codec_args())
+    args.extend(selection.attachment_args())
+    return args
+
+
+def build_ffmpeg_command(ffmpeg_path, input_file, output_path, subtitles, settings, copy_video=False,
+                         hw_decode=None, threads=None, selection=None, frame_rate=None, passlog=None):
+    """
+    Build the ffmpeg argv for one conversion.
+    subtitles is a list of subtitles.SubtitleTrack.
+    selection (a stream_selection.StreamSelection) picks the source's audio,
+    embedded subtitles and attachments; None maps all video and audio.
+    copy_video remuxes the video stream instead of encoding it.
+    hw_decode (a hwaccel.CudaDecode) decodes and scales on the GPU.
+    threads caps the decoder's and the encoder's threads.
+    frame_rate is the source's, for the profile's keyframe interval.
+    passlog makes this the second pass of a two-pass encode.
+    Pure: runs nothing, so the argv can be checked without ffmpeg.
+    """
+    cmd = [ffmpeg_path, '-hide_banner', '-loglevel', 'warning']
+    cmd.extend(PROGRESS_ARGS)
+    if hw_decode is not None and not copy_video:
+        cmd.extend(hw_decode.input_args())
+    if threads and not copy_video:
+        cmd.extend(['-threads', str(int(threads))])
+    cmd.extend(['-i', str(input_file)])
+    cmd.extend(subtitle_input_args(subtitles))
+    if copy_video:
+        cmd.extend(['-c:v', 'copy'])
+    else:
+        cmd.extend(video_encode_args(settings, hw_decode, threads, frame_rate))
+        if passlog is not None:
+            cmd.extend(pass_args(2, passlog))
+    cmd.extend(audio_args(settings))
+
+    # Map streams (CRITICAL: proper mapping for video, audio, and all subtitles)
+    embedded = 0
+    if selection is None:
+        cmd.extend(subtitle_codec_args(subtitles))
+        cmd.extend(['-map', '0:v'])  # Map video from first input
+        cmd.extend(['-map', '0:a'])  # Map audio from first input
+    else:
+        # Embedded subtitles come first; sidecars are numbered after them
+        embedded = len(selection.subtitles)
+        cmd.extend(subtitle_codec_args(subtitles, first_index=embedded))
+        for stream in selection.video:
+            cmd.extend(['-map', f'0:{stream.index}'])
+        cmd.extend(source_stream_args(selection, 0))
+    cmd.extend(subtitle_map_args(subtitles, first_input=1, first_index=embedded))
+
+    # Output file
+    cmd.extend(['-y', str(output_path)])
+    return cmd
+
+
+def expected_streams(info, subtitles, selection=None):
+    """Stream counts a finished output must contain, or None if the input wasn't probed"""
+    if info is None:
+        return None
+    if selection is None:
+        selection = select_streams(info, ConversionSettings())
+    return {
+        # Chunked encodes keep only the main video stream
+        "video": 1 if info.video else 0,
+        "audio": len(selection.audio),
+        "subtitle": len(selection.subtitles) + len(subtitles),
+        "attachment": len(selection.attachments),
+    }
+
+
+class ConversionEngine:
+    """
+    Runs conversions for an EncodeScheduler.
+    log(message) receives human-readable status lines.
+    """
+
+    def __init__(self, settings, ffmpeg_path=None, log=None, ledger=None, skip_completed=True,
+                 chunked_encoder=None, analyzer=None, quality_search=None, staging=None, hw_decode=None,
+                 limits=None):
+        self.settings = settings
+        self.ffmpeg_path = ffmpeg_path or find_ffmpeg()
+        self.log = log or (lambda message: None)
+        # Optional job_ledger.JobLedger recording finished outputs
+        self.ledger = ledger
+        self.skip_completed = skip_completed
+        # Optional chunked_encode.ChunkedEncoder used for long inputs
+        self.chunked_encoder = chunked_encoder
+        # Optional analysis.Analyzer deciding encode / remux / skip per file
+        self.analyzer = analyzer
+        # Optional quality_search.QualitySearch choosing a CQ per file
+        self.quality_search = quality_search
+        # Optional staging.StagingArea for inputs/outputs on network shares
+        self.staging = staging
+        # Optional hwaccel.CudaDecode, used for sources NVDEC can handle
+        self.hw_decode = hw_decode
+        # Optional load_control.ProcessLimits; its thread cap goes on each command
+        self.limits = limits
+        # Folders are scanned once per batch, not once per video
+        self.subtitle_index = SubtitleIndex()
+        # Output folders already swept for temp files left by crashed runs
+        self._swept_dirs = set()
+        self._sweep_lock = threading.Lock()
+
+    def probe_input(self, input_file):
+        """Container metadata for input_file, or None if it can't be read"""
+        try:
+            return probe_media(input_file)
+        except Exception as e:
+            self.log(f"Could not probe input: {e}")
+        return None
+
+    def sweep_output_dir(self, directory):
+        """Remove orphaned temp outputs, once per folder per batch"""
+        directory = str(directory)
+        with self._sweep_lock:
+            if directory in self._swept_dirs:
+                return
+            self._swept_dirs.add(directory)
+        sweep_orphans(directory, self.log)
+
+    def run_job(self, job, scheduler):
+        """Convert a single video file (runs on a scheduler slot thread)"""
+        if not self.ffmpeg_path:
+            raise FileNotFoundError("ffmpeg could not be found")
+
+        # Jobs submitted without a spec use the batch settings
+        spec = job.spec or JobSpec(job.input_path, self.settings)
+        input_file = spec.input_path
+        name = os.path.basename(input_file)
+
+        self.log(f"\n{'='*60}")
+        self.log(f"Converting {job.index}/{len(scheduler.jobs)} (slot {job.slot + 1}): {name}")
+        self.log(f"{'='*60}")
+
+        job_settings = spec.settings
+        output_path = spec.output_path
+        output_path.parent.mkdir(exist_ok=True)
+        self.sweep_output_dir(output_path.parent)
+        job.output_path = str(output_path)
+
+        # Get video duration for progress calculation
+        scheduler.set_state(job, PROBING)
+        probe_start = time.monotonic()
+        info = self.probe_input(input_file)
+        job.probe_seconds = time.monotonic() - probe_start
+        duration = info.duration if info else 0
+        job.media_duration = duration
+        if info is not None:
+            job.input_bytes = info.size
+            if info.frame_rate and duration:
+                job.frames = round(info.frame_rate * duration)
+        if job.input_bytes is None:
+            try:
+                job.input_bytes = os.path.getsize(input_file)
+            except OSError:
+                pass
+
+        # Smart Subtitle Scanner - Find all matching subtitle sidecars
+        subtitles = self.subtitle_index.find(input_file)
+        if subtitles:
+            subtitle_names = [f"{track.path.name} ({subtitle_title(track)})" for track in subtitles]
+            self.log(f"[{name}] Found {len(subtitles)} subtitle file(s): {', '.join(subtitle_names)}")
+        else:
+            self.log(f"[{name}] No subtitle files found")
+
+        # Which of the source's own streams to keep; unprobed inputs map everything
+        selection = select_streams(info, job_settings) if info is not None else None
+        if selection is not None:
+            self.log(f"[{name}] Streams: {selection.summary()}")
+
+        frame_rate = info.frame_rate if info is not None else None
+        # Segments can't share a first-pass log, so two-pass files encode in one piece
+        chunked = (
+            self.chunked_encoder is not None
+            and not job_settings.remux_only
+            and not needs_first_pass(job_settings)
+            and duration >= 2 * self.chunked_encoder.segment_seconds
+        )
+
+        # Skip inputs already converted with identical settings
+        job_key = None
+        if self.ledger is not None or chunked or self.quality_search is not None:
+            job_key = (fingerprint_file(input_file), settings_key(job_settings, subtitles))
+        if self.ledger is not None and self.skip_completed:
+            entry = self.ledger.find_valid_output(*job_key)
+            if entry is not None:
+                job.output_path = entry.output_path
+                self.log(f"↷ Already converted, skipping: {name} -> {entry.output_path}")
+                scheduler.set_state(job, SKIPPED)
+                return
+
+        action = "encode"
+        if job_settings.remux_only:
+            action = "remux"
+            if not subtitles and (selection is None or not selection.dropped):
+                # Nothing to add or remove: a remux would only copy the file
+                self.log(f"↷ Nothing to remux, skipping: {name}")
+                job.output_path = None
+                scheduler.set_state(job, SKIPPED)
+                return
+        elif self.analyzer is not None:
+            analysis = self.analyzer.decide(input_file, subtitles, job_settings, job=job, scheduler=scheduler)
+            action = analysis.action
+            self.log(f"[{name}] Analysis: {analysis.summary()}")
+            if action == "skip":
+                job.output_path = None
+                scheduler.set_state(job, SKIPPED)
+                return
+
+        # With staging, ffmpeg reads a local copy (when prefetched in time)
+        # and writes to local scratch; the output is moved afterwards
+        source = input_file
+        work_output = output_path
+        if self.staging is not None:
+            self.staging.prefetch(scheduler.upcoming(self.staging.prefetch_count))
+            source = self.staging.acquire(input_file)
+            work_output = self.staging.local_output_path(output_path)
+            if source != input_file:
+                self.log(f"[{name}] Reading prefetched local copy")
+        # ffmpeg writes to a hidden temp name; it only replaces work_output
+        # once verified, so an interrupted run never leaves a truncated file
+        temp_output = temp_output_path(work_output)
+        try:
+            settings = job_settings
+            if action == "encode" and self.quality_search is not None and duration > 0:
+                result = self.quality_search.find_cq(
+                    job, scheduler, source, duration, job_key[0], settings=job_settings
+                )
+                settings = job_settings.with_quality(result.cq)
+                self.log(f"[{name}] Using CQ {result.cq} ({self.quality_search.metric} {result.score:.3f})")
+
+            scheduler.set_state(job, ENCODING)
+            if action == "remux":
+                chunked = False
+                self.encode_single(job, scheduler, source, temp_output, subtitles, duration,
+                                   settings, copy_video=True, selection=selection)
+            else:
+                if get_profile(settings.profile).two_pass and get_backend(settings.encoder).two_pass is None:
+                    self.log(f"[{name}] {get_backend(settings.encoder).name} has no two-pass mode, "
+                             "encoding in one pass")
+                decode = self.hw_decode
+                if decode is not None and not decode.supports(info):
+                    self.log(f"[{name}] Source format not supported by the GPU decoder, decoding on the CPU")
+                    decode = None
+                try:
+                    self.encode_video(job, scheduler, source, work_output, temp_output, subtitles,
+                                      duration, settings, chunked, job_key, decode, selection, frame_rate)
+                except (CancelledError, RetryableError):
+                    raise
+                except Exception as e:
+                    if decode is None:
+                        raise
+                    self.log(f"[{name}] GPU decode failed ({e}), retrying with CPU decode")
+                    discard(temp_output)
+                    self.encode_video(job, scheduler, source, work_output, temp_output, subtitles,
+                                      duration, settings, chunked, job_key, None, selection, frame_rate)
+            self.verify_output(temp_output, duration, expected_streams(info, subtitles, selection))
+            commit_output(temp_output, work_output)
+            job.output_bytes = work_output.stat().st_size
+        except BaseException:
+            discard(temp_output)
+            raise
+        finally:
+            if self.staging is not None:
+                self.staging.release(input_file)
+
+        if chunked:
+            self.chunked_encoder.cleanup(work_output)
+
+        # Remux decisions depend on the analysis settings, which aren't part
+        # of the ledger key, so only real encodes are recorded
+        record = self.ledger is not None and action == "encode"
+        if work_output != output_path:
+            # The slot moves on to the next file while the move runs
+            self.staging.publish(
+                work_output,
+                output_path,
+                on_done=(lambda: self.ledger.record(*job_key, input_file, output_path)) if record else None,
+                on_error=lambda error: self._publish_failed(job, scheduler, error),
+            )
+            self.log(f"✓ Successfully converted: {output_path.name} (moving to destination)")
+            return
+        if record:
+            self.ledger.record(*job_key, input_file, output_path)
+        self.log(f"✓ Successfully converted: {output_path.name}")
+
+    def _publish_failed(self, job, scheduler, error):
+        """A staged output could not be moved into place after the job finished"""
+        job.error = f"Could not move output to {job.output_path}: {error}"
+        scheduler.set_state(job, FAILED)
+
+    def encode_video(self, job, scheduler, source, work_output, temp_output, subtitles, duration,
+                     settings, chunked, job_key, hw_decode, selection=None, frame_rate=None):
+        """Encode in one ffmpeg process or in chunks, writing temp_output"""
+        if chunked:
+            self.chunked_encoder.run(
+                job, scheduler, source, work_output, subtitles, duration, *job_key,
+                settings=settings, write_path=temp_output, hw_decode=hw_decode,
+                threads=self.threads_for(scheduler), selection=selection, frame_rate=frame_rate
+            )
+        else:
+            self.encode_single(job, scheduler, source, temp_output, subtitles, duration, settings,
+                               hw_decode=hw_decode, selection=selection, frame_rate=frame_rate)
+
+    def threads_for(self, scheduler):
+        """Thread cap for an ffmpeg run starting now, or None"""
+        return self.limits.threads_for(scheduler.running) if self.limits is not None else None
+
+    def analyze_batch(self, paths, workers=2, settings_by_path=None):
+        """
+        Run the analyzer over paths up front; returns their Analysis objects in order.
+        settings_by_path maps a path to the settings its job was queued with.
+        """
+        settings_by_path = settings_by_path or {}
+
+        def decide(path):
+            settings = settings_by_path.get(path, self.settings)
+            return self.analyzer.decide(path, self.subtitle_index.find(path), settings)
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            return list(pool.map(decide, paths))
+
+    def encode_single(self, job, scheduler, input_file, output_path, subtitles, duration,
+                      settings=None, copy_video=False, hw_decode=None, selection=None, frame_rate=None):
+        """Encode the whole file in one ffmpeg process, or two for a two-pass profile"""
+        settings = settings or self.settings
+        if copy_video or not needs_first_pass(settings):
+            cmd = build_ffmpeg_command(
+                self.ffmpeg_path, input_file, output_path, subtitles, settings,
+                copy_video=copy_video, hw_decode=hw_decode, threads=self.threads_for(scheduler),
+                selection=selection, frame_rate=frame_rate
+            )
+            self.run_ffmpeg(job, scheduler, cmd, input_file, duration)
+            return
+
+        # The analysis pass fills the first half of the progress bar
+        with tempfile.TemporaryDirectory(prefix="av1pass_") as workdir:
+            passlog = os.path.join(workdir, "pass")
+            self.log(f"[{os.path.basename(input_file)}] Two-pass encode, analysis pass")
+            cmd = first_pass_command(self.ffmpeg_path, input_file, settings, passlog, hw_decode,
+                                     self.threads_for(scheduler), frame_rate)
+            self.run_ffmpeg(job, scheduler, cmd, input_file, duration, progress_range=(0.0, 0.5))
+            cmd = build_ffmpeg_command(
+                self.ffmpeg_path, input_file, output_path, subtitles, settings,
+                hw_decode=hw_decode, threads=self.threads_for(scheduler), selection=selection,
+                frame_rate=frame_rate, passlog=passlog
+            )
+            self.run_ffmpeg(job, scheduler, cmd, input_file, duration, progress_range=(0.5, 1.0))
+
+    def run_ffmpeg(self, job, scheduler, cmd, input_file, duration, progress_range=(0.0, 1.0)):
+        """Run one ffmpeg command for job, reporting its progress within progress_range"""
+        name = os.path.basename(input_file)
+        start, end = progress_range
+        self.log(f"Command: {' '.join(cmd)}")
+
+        # Progress blocks arrive on stdout, warnings/errors on stderr
+        try:
+            result = scheduler.run_process(
+                job, cmd, duration,
+                on_progress=lambda event: scheduler.report_progress(
+                    job, start + event.fraction * (end - start), event
+                ),
+                on_line=lambda line: self.log(f"[{name}] {line}"),
+            )
+        except CancelledError:
+            self.log(f"Cancelled: {name}")
+            raise
+        if job.stats is not None and job.stats.frame:
+            job.frames = job.stats.frame
+
+        if result.returncode != 0:
+            detail = result.last_error()
+            # A negative code means ffmpeg was killed by a signal (e.g. out of memory)
+            error_type = RetryableError if result.returncode < 0 or result.is_transient() else Exception
+            raise error_type(
+                f"FFmpeg exited with code {result.returncode}" + (f": {detail}" if detail else "")
+            )
+
+    def verify_output(self, output_path, expected_duration, expected_streams=None):
+        """
+        Raise if the output is missing, noticeably shorter than the input or
+        lacks streams that were mapped into it
+        """
+        if not output_path.exists() or output_path.stat().st_size == 0:
+            raise Exception(f"Output was not written: {output_path}")
+        if expected_duration <= 0 and not expected_streams:
+            return
+        try:
+            info = probe_media(output_path, use_cache=False)
+        except Exception as e:
+            raise Exception(f"Output could not be read back: {e}")
+        # Allow for container rounding and trailing frame differences
+        if expected_duration > 0 and info.duration < expected_duration - max(1.0, expected_duration * 0.01):
+            raise Exception(
+                f"Output looks truncated: {info.duration:.1f}s of {expected_duration:.1f}s"
+            )
+        actual = {
+            "video": len(info.video_streams),
+            "audio": len(info.audio_streams),
+            "subtitle": len(info.subtitle_streams),
+            "attachment": len(info.streams_of("attachment")),
+        }
+        for codec_type, count in (expected_streams or {}).items():
+            if actual[codec_type] < count:
+                raise Exception(
+                    f"Output has {actual[codec_type]} {codec_type} stream(s), expected {count}"
+                )
@@ -0,0 +1,637 @@
+"""
+Distributed work queue.
+A coordinator owns the job list and serves it over HTTP; workers (other
+machines, or several processes on one) lease one job at a time, convert it
+with their own ConversionEngine and heartbeat progress while it runs. A
+lease that isn't renewed within lease_seconds - the worker crashed, hung or
+lost the network - puts the job back in the queue for someone else.
+
+Workers must see inputs and outputs under the same paths as the
+coordinator (a shared mount), or translate them with path maps.
+
+Protocol, JSON over HTTP:
+    POST /lease      {"worker"}                       -> {"job": {...} or null, "done"}
+    POST /heartbeat  {"worker", "jobs": [{"id", "lease", "state", "progress", "stats"}]}
+                                                      -> {"lost": [ids]}
+    POST /finish     {"worker", "id", "lease", "state", "error", "output", "metrics"}
+                                                      -> {"accepted"}
+    GET  /status                                      -> counts and every job
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from conversion_engine import JobSpec
+from job_queue import QueuedJob, job_settings
+from metrics import REPORT_FIELDS, job_metrics
+from scheduler import FINISHED_STATES, QUEUED, PROBING, ENCODING, DONE, SKIPPED, FAILED, CANCELLED
+
+
+# Coordinator-side state of an item out with a worker that hasn't reported yet
+LEASED = "leased"
+
+DEFAULT_PORT = 9470
+DEFAULT_LEASE_SECONDS = 60
+# A job whose lease runs out this many times is failed rather than handed out again
+DEFAULT_MAX_EXPIRIES = 3
+# How long an idle worker waits before asking for work again
+POLL_SECONDS = 5
+
+
+class WorkItem:
+    """One job on the coordinator, with the lease it is currently out on"""
+
+    def __init__(self, id, spec, priority=0, job_id=None):
+        self.id = id
+        self.spec = spec
+        self.priority = priority
+        self.job_id = job_id            # JobStore row, if the queue is persisted
+        self.state = QUEUED
+        self.worker = None
+        self.lease = None
+        self.lease_expires = None
+        self.leases = 0
+        self.expiries = 0
+        self.progress = 0.0
+        self.stats = None               # last ProgressEvent.to_dict() from the worker
+        self.error = None
+        self.output_path = None
+        self.metrics = None
+        self.started_at = None
+        self.finished_at = None
+        self.retry_at = None
+
+    @property
+    def input_path(self):
+        return self.spec.input_path
+
+    @property
+    def is_finished(self):
+        return self.state in FINISHED_STATES
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "input": self.input_path,
+            "output": self.output_path or str(self.spec.output_path),
+            "state": self.state,
+            "worker": self.worker,
+            "progress": round(self.progress, 4),
+            "stats": self.stats,
+            "leases": self.leases,
+            "error": self.error,
+            "metrics": self.metrics,
+        }
+
+    def report_record(self):
+        """metrics.RunReport record: the worker's measurements plus the coordinator's outcome"""
+        record = dict.fromkeys(REPORT_FIELDS)
+        record.update(self.metrics or {})
+        record.update(
+            index=self.id,
+            input=self.input_path,
+            output=self.output_path,
+            state=self.state,
+            error=self.error,
+            finished_at=self.finished_at,
+            worker=self.worker,
+        )
+        return record
+
+    def __repr__(self):
+        return f"WorkItem({self.id}, {self.input_path!r}, {self.state})"
+
+
+class Coordinator:
+    """
+    The job list workers lease from. on_update(item) is called whenever an
+    item is leased, reports progress, finishes or is requeued. store, if
+    given, is a job_queue.JobStore kept in step like the scheduler does.
+    """
+
+    def __init__(self, lease_seconds=DEFAULT_LEASE_SECONDS, max_expiries=DEFAULT_MAX_EXPIRIES,
+                 store=None, on_update=None, log=None):
+        self.lease_seconds = lease_seconds
+        self.max_expiries = max(1, max_expiries)
+        self.store = store
+        self.on_update = on_update
+        self.log = log or (lambda message: None)
+        self.items = []
+        self._by_id = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._closed = False
+        self._cancelled = False
+        self._reaper = None
+        self._workers = {}       # name -> last contact
+        self._released = set()   # workers told there is nothing left
+
+    def submit(self, spec, priority=0, job_id=None):
+        with self._lock:
+            item = WorkItem(len(self.items) + 1, spec, priority, job_id)
+            self.items.append(item)
+            self._by_id[item.id] = item
+            self._changed.notify_all()
+        return item
+
+    def start(self):
+        """Start expiring leases in the background"""
+        self._reaper = threading.Thread(target=self._reap_loop, daemon=True)
+        self._reaper.start()
+
+    def close(self):
+        """No more submissions; the coordinator drains once every item has finished"""
+        with self._lock:
+            self._closed = True
+            self._changed.notify_all()
+
+    def cancel_all(self):
+        """Hand out nothing more; workers hear their leases are lost at the next heartbeat"""
+        with self._lock:
+            self._cancelled = True
+            self._closed = True
+            items = [item for item in self.items if not item.is_finished]
+            for item in items:
+                item.state = CANCELLED
+                item.lease = None
+                item.finished_at = time.time()
+            self._changed.notify_all()
+        for item in items:
+            self._finished(item)
+
+    @property
+    def drained(self):
+        with self._lock:
+            return self._drained()
+
+    def wait(self):
+        with self._lock:
+            while not self._drained():
+                self._changed.wait(1)
+
+    def release_workers(self, timeout=POLL_SECONDS * 2):
+        """After draining, give workers seen recently the chance to hear they can stop"""
+        deadline = time.time() + timeout
+        with self._lock:
+            while time.time() < deadline:
+                recent = {name for name, seen in self._workers.items()
+                          if seen > deadline - timeout - self.lease_seconds}
+                if recent <= self._released:
+                    return
+                self._changed.wait(deadline - time.time())
+
+    def counts(self):
+        """Number of items in each state"""
+        with self._lock:
+            return self._counts()
+
+    def status(self):
+        with self._lock:
+            return {
+                "counts": self._counts(),
+                "closed": self._closed,
+                "jobs": [item.to_dict() for item in self.items],
+            }
+
+    # Worker requests ---------------------------------------------------
+
+    def lease(self, worker):
+        """Hand the highest-priority queued item to worker; (item or None, drained)"""
+        self.expire_leases()
+        with self._lock:
+            self._workers[worker] = time.time()
+            queued = [item for item in self.items if item.state == QUEUED]
+            if self._cancelled or not queued:
+                done = self._cancelled or self._drained()
+                if done:
+                    self._released.add(worker)
+                    self._changed.notify_all()
+                return None, done
+            item = min(queued, key=lambda item: (-item.priority, item.id))
+            item.state = LEASED
+            item.worker = worker
+            item.lease = uuid.uuid4().hex
+            item.lease_expires = time.time() + self.lease_seconds
+            item.leases += 1
+            item.progress = 0.0
+            item.stats = None
+            item.started_at = time.time()
+        if self.store is not None:
+            self.store.mark_started(item)
+        self.log(f"[{os.path.basename(item.input_path)}] Leased to {worker}")
+        self._notify(item)
+        return item, False
+
+    def heartbeat(self, worker, reports):
+        """Renew worker's leases and record progress; returns the ids it no longer holds"""
+        lost = []
+        updated = []
+        now = time.time()
+        with self._lock:
+            self._workers[worker] = now
+            for report in reports:
+                item = self._by_id.get(report.get("id"))
+                if item is None or item.is_finished or item.lease != report.get("lease"):
+                    lost.append(report.get("id"))
+                    continue
+                item.lease_expires = now + self.lease_seconds
+                # A job waiting out a retry on the worker is still leased
+                item.state = report.get("state") if report.get("state") in (PROBING, ENCODING) else LEASED
+                item.progress = float(report.get("progress") or 0.0)
+                item.stats = report.get("stats")
+                updated.append(item)
+        for item in updated:
+            self._notify(item)
+        return lost
+
+    def finish(self, worker, item_id, lease, state, error=None, output_path=None, metrics=None):
+        """A worker is done with a lease; False if it had already been taken away"""
+        with self._lock:
+            item = self._by_id.get(item_id)
+            if item is None or item.is_finished or item.lease != lease:
+                return False
+            item.lease = None
+            item.error = error
+            item.metrics = metrics
+            if state == CANCELLED and not self._cancelled:
+                # The worker stopped (shut down, or was interrupted), not the job
+                self._requeue(item, f"worker {worker} stopped")
+                finished = False
+            else:
+                item.state = state if state in FINISHED_STATES else FAILED
+                item.output_path = output_path
+                item.progress = 1.0
+                item.finished_at = time.time()
+                finished = True
+            self._changed.notify_all()
+        if finished:
+            self._finished(item)
+        else:
+            self._requeued(item)
+        return True
+
+    def expire_leases(self):
+        """Put items whose lease ran out back in the queue (or fail them)"""
+        now = time.time()
+        requeued = []
+        failed = []
+        with self._lock:
+            for item in self.items:
+                if item.lease is None or item.is_finished or item.lease_expires > now:
+                    continue
+                item.expiries += 1
+                message = f"lease expired on {item.worker}"
+                if item.expiries >= self.max_expiries:
+                    item.lease = None
+                    item.state = FAILED
+                    item.error = f"{message} ({item.expiries} times)"
+                    item.finished_at = now
+                    failed.append(item)
+                else:
+                    self._requeue(item, message)
+                    requeued.append(item)
+            if requeued or failed:
+                self._changed.notify_all()
+        for item in requeued:
+            self.log(f"[{os.path.basename(item.input_path)}] {item.error.capitalize()}, requeued")
+            self._requeued(item)
+        for item in failed:
+            self._finished(item)
+
+    # Internals --------------------------------------------------------
+
+    def _counts(self):
+        counts = {}
+        for item in self.items:
+            counts[item.state] = counts.get(item.state, 0) + 1
+        return counts
+
+    def _drained(self):
+        return self._closed and all(item.is_finished for item in self.items)
+
+    def _requeue(self, item, reason):
+        item.state = QUEUED
+        item.worker = None
+        item.lease = None
+        item.lease_expires = None
+        item.progress = 0.0
+        item.stats = None
+        item.error = reason
+
+    def _requeued(self, item):
+        if self.store is not None:
+            self.store.mark_retry(item)
+        self._notify(item)
+
+    def _finished(self, item):
+        if self.store is not None:
+            self.store.mark_finished(item)
+        self._notify(item)
+
+    def _notify(self, item):
+        if self.on_update:
+            self.on_update(item)
+
+    def _reap_loop(self):
+        interval = max(self.lease_seconds / 4, 0.5)
+        while not self.drained:
+            time.sleep(interval)
+            self.expire_leases()
+
+
+class _CoordinatorHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/status":
+            self.send_error(404)
+            return
+        self._reply(self.server.coordinator.status())
+
+    def do_POST(self):
+        coordinator = self.server.coordinator
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            request = json.loads(self.rfile.read(length) or b"{}")
+            worker = str(request["worker"])
+        except (ValueError, KeyError, TypeError):
+            self.send_error(400, "Expected a JSON object with a worker name")
+            return
+
+        route = self.path.split("?")[0]
+        if route == "/lease":
+            item, done = coordinator.lease(worker)
+            job = None
+            if item is not None:
+                job = {
+                    "id": item.id,
+                    "lease": item.lease,
+                    "lease_seconds": coordinator.lease_seconds,
+                    "input": item.input_path,
+                    "output": str(item.spec.output_path),
+                    "settings": item.spec.settings.to_dict(),
+                }
+            self._reply({"job": job, "done": done})
+        elif route == "/heartbeat":
+            self._reply({"lost": coordinator.heartbeat(worker, request.get("jobs") or [])})
+        elif route == "/finish":
+            accepted = coordinator.finish(
+                worker,
+                request.get("id"),
+                request.get("lease"),
+                request.get("state"),
+                error=request.get("error"),
+                output_path=request.get("output"),
+                metrics=request.get("metrics"),
+            )
+            self._reply({"accepted": accepted})
+        else:
+            self.send_error(404)
+
+    def _reply(self, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class CoordinatorServer:
+    """Serves a Coordinator to workers from a daemon thread"""
+
+    def __init__(self, coordinator, port=DEFAULT_PORT, host=""):
+        self._server = ThreadingHTTPServer((host, port), _CoordinatorHandler)
+        self._server.daemon_threads = True
+        self._server.coordinator = coordinator
+        self._thread = None
+
+    @property
+    def address(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host or socket.gethostname()}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# Worker side -----------------------------------------------------------
+
+def parse_address(text, default_host=""):
+    """'host:port', ':port' or 'port' -> (host, port)"""
+    host, _, port = text.rpartition(":")
+    if not port.isdigit():
+        raise ValueError(f"Expected [HOST:]PORT, got {text!r}")
+    return host or default_host, int(port)
+
+
+def parse_path_map(text):
+    """'/mnt/share=Z:\\share' -> ('/mnt/share', 'Z:\\share')"""
+    remote, sep, local = text.partition("=")
+    if not sep or not remote or not local:
+        raise ValueError(f"Expected COORDINATOR_PATH=LOCAL_PATH, got {text!r}")
+    return remote, local
+
+
+def map_path(path, path_maps):
+    """Translate a coordinator path to this machine's, using the longest matching prefix"""
+    for remote, local in sorted(path_maps, key=lambda pair: len(pair[0]), reverse=True):
+        prefix = remote.rstrip("/\\")
+        if not path.startswith(prefix) or path[len(prefix):len(prefix) + 1] not in ("", "/", "\\"):
+            continue
+        rest = path[len(prefix):].lstrip("/\\")
+        if not rest:
+            return local
+        separator = "\\" if "\\" in local and "/" not in local else "/"
+        return local.rstrip("/\\") + separator + rest.replace("\\", "/").replace("/", separator)
+    return path
+
+
+class CoordinatorClient:
+    """The worker's end of the protocol; raises ConnectionError when unreachable"""
+
+    def __init__(self, url, timeout=15):
+        self.url = url.rstrip("/")
+        if "://" not in self.url:
+            self.url = "http://" + self.url
+        self.timeout = timeout
+
+    def lease(self, worker):
+        return self._post("/lease", {"worker": worker})
+
+    def heartbeat(self, worker, jobs):
+        return self._post("/heartbeat", {"worker": worker, "jobs": jobs}).get("lost", [])
+
+    def finish(self, worker, job_id, lease, state, error=None, output=None, metrics=None):
+        reply = self._post("/finish", {
+            "worker": worker, "id": job_id, "lease": lease, "state": state,
+            "error": error, "output": output, "metrics": metrics,
+        })
+        return reply.get("accepted", False)
+
+    def _post(self, path, payload):
+        request = urllib.request.Request(
+            self.url + path,
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read() or b"{}")
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            raise ConnectionError(f"Coordinator {self.url} unreachable: {e}") from e
+
+
+def default_worker_name():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class Worker:
+    """
+    Leases jobs from a coordinator and runs them on a local EncodeScheduler,
+    one lease per free slot. Jobs get `default` settings where the
+    coordinator's snapshot doesn't apply (the encoder is always this
+    machine's). Call job_update(job) from the scheduler's on_update.
+    """
+
+    def __init__(self, client, scheduler, default, name=None, path_maps=(), log=None,
+                 poll_seconds=POLL_SECONDS):
+        self.client = client
+        self.scheduler = scheduler
+        self.default = default
+        self.name = name or default_worker_name()
+        self.path_maps = list(path_maps)
+        self.log = log or (lambda message: None)
+        self.poll_seconds = poll_seconds
+        self.heartbeat_seconds = DEFAULT_LEASE_SECONDS / 4
+        self._leases = {}    # local EncodeJob -> (coordinator id, lease, coordinator output path)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._finished = threading.Event()
+        self._wake = threading.Event()
+        self._heartbeat = threading.Thread(target=self._heartbeat_loop, daemon=True)
+
+    def run(self):
+        """
+        Lease and run jobs until the coordinator has none left (or stop()),
+        then wait for them. If interrupted, the caller drains or cancels the
+        scheduler; leases are kept alive until close().
+        """
+        self._heartbeat.start()
+        unreachable = False
+        while not self._stopped.is_set():
+            if not self._has_capacity():
+                self._stopped.wait(0.5)
+                continue
+            try:
+                reply = self.client.lease(self.name)
+            except ConnectionError as e:
+                if not unreachable:
+                    self.log(f"WARNING: {e}; retrying")
+                unreachable = True
+                self._stopped.wait(self.poll_seconds)
+                continue
+            if unreachable:
+                self.log("Coordinator reachable again")
+                unreachable = False
+            if reply.get("job"):
+                self._start(reply["job"])
+            elif reply.get("done"):
+                break
+            else:
+                self._stopped.wait(self.poll_seconds)
+        self.scheduler.close()
+        self.scheduler.wait()
+
+    def stop(self):
+        """Lease nothing more; running jobs finish"""
+        self._stopped.set()
+
+    def close(self):
+        """Stop sending heartbeats, once the scheduler has finished"""
+        self._finished.set()
+        self._wake.set()
+        if self._heartbeat.is_alive():
+            self._heartbeat.join()
+
+    def job_update(self, job):
+        if not job.is_finished:
+            return
+        with self._lock:
+            lease = self._leases.pop(job, None)
+        if lease is None:
+            return
+        job_id, token, output = lease
+        try:
+            accepted = self.client.finish(
+                self.name, job_id, token, job.state, error=job.error,
+                output=output if job.state == DONE else None, metrics=job_metrics(job),
+            )
+        except ConnectionError as e:
+            self.log(f"WARNING: could not report {os.path.basename(job.input_path)}: {e}")
+            return
+        if not accepted and job.state in (DONE, SKIPPED):
+            self.log(f"[{os.path.basename(job.input_path)}] Lease had expired; the coordinator "
+                     "may have handed the file to another worker")
+
+    def _has_capacity(self):
+        # At most one leased job waits locally, so load-based admission can't hoard work
+        scheduler = self.scheduler
+        return scheduler.queue_depth() == 0 and scheduler.running < scheduler.slots
+
+    def _start(self, lease):
+        self.heartbeat_seconds = max(min(lease["lease_seconds"] / 4, DEFAULT_LEASE_SECONDS / 4), 0.5)
+        settings = job_settings(
+            QueuedJob(lease["id"], lease["input"], lease["settings"]), self.default, self.log
+        )
+        input_path = map_path(lease["input"], self.path_maps)
+        spec = JobSpec(input_path, settings, map_path(lease["output"], self.path_maps))
+        job = self.scheduler.submit(input_path, spec=spec)
+        with self._lock:
+            self._leases[job] = (lease["id"], lease["lease"], lease["output"])
+        # Report in right away, and from now on at this lease's pace
+        self._wake.set()
+
+    def _heartbeat_loop(self):
+        while True:
+            self._wake.wait(self.heartbeat_seconds)
+            self._wake.clear()
+            if self._finished.is_set():
+                return
+            with self._lock:
+                leases = dict(self._leases)
+            if not leases:
+                continue
+            reports = [{
+                "id": job_id,
+                "lease": token,
+                "state": job.state,
+                "progress": round(job.progress, 4),
+                "stats": job.stats.to_dict() if job.stats else None,
+            } for job, (job_id, token, _) in leases.items()]
+            try:
+                lost = set(self.client.heartbeat(self.name, reports))
+            except ConnectionError as e:
+                self.log(f"WARNING: heartbeat failed: {e}")
+                continue
+            for job, (job_id, _, _) in leases.items():
+                if job_id in lost and not job.is_finished:
+                    self.log(f"[{os.path.basename(job.input_path)}] Lease lost, stopping")
+                    with self._lock:
+                        self._leases.pop(job, None)
+                    self.scheduler.cancel_job(job)
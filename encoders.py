@@ -0,0 +1,365 @@
+"""
+AV1 encoder backends.
+Each backend maps the app's CQ slider and speed preset onto one ffmpeg
+encoder's own rate-control and speed options. Which backends are usable is
+detected from `ffmpeg -encoders` (plus a tiny test encode for hardware
+encoders, which are listed even when no suitable GPU is present).
+
+Run `python -m encoders` to list what this machine supports, or
+`python -m encoders --smoke` to encode a short generated clip with each.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+
+from ffmpeg_utils import CREATE_NO_WINDOW, find_ffmpeg
+
+
+# Speed presets shown to the user, slowest/best first
+PRESETS = ["quality", "balanced", "fast"]
+DEFAULT_PRESET = "quality"
+
+# The CQ slider uses NVENC's 0-51 quantizer scale
+CQ_SCALE_MAX = 51
+
+# Options taking a ':'-separated key=value list; ffmpeg only honours the last
+# occurrence, so repeats are merged by merge_encoder_params()
+PARAM_OPTIONS = ('-svtav1-params', '-aom-params', '-rav1e-params')
+
+
+def _rescale(cq, new_max):
+    """Map a 0-51 CQ value linearly onto an encoder's 0-new_max scale"""
+    return max(0, min(new_max, round(int(cq) * new_max / CQ_SCALE_MAX)))
+
+
+def merge_encoder_params(args):
+    """Fold repeated -svtav1-params style options into the first one, in order"""
+    merged = []
+    positions = {}
+    i = 0
+    while i < len(args):
+        option = args[i]
+        if option in PARAM_OPTIONS and i + 1 < len(args):
+            if option in positions:
+                merged[positions[option]] += ':' + args[i + 1]
+            else:
+                positions[option] = len(merged) + 1
+                merged.extend([option, args[i + 1]])
+            i += 2
+        else:
+            merged.append(option)
+            i += 1
+    return merged
+
+
+class EncoderBackend:
+    """Base class: subclasses set the class attributes and implement video_args"""
+
+    key = None          # short name used in settings and on the CLI
+    name = None         # label shown in the GUI
+    encoder = None      # ffmpeg encoder name
+    hardware = False
+    # How profiles with two_pass run: "internal" (one ffmpeg run), "external"
+    # (an analysis pass with -pass 1 first) or None (single pass only)
+    two_pass = None
+
+    def video_args(self, cq, preset=DEFAULT_PRESET):
+        """ffmpeg output options selecting this encoder at the given quality/speed"""
+        raise NotImplementedError
+
+    def profile_args(self, profile, frame_rate=None):
+        """
+        ffmpeg output options for an encode_profiles.EncodeProfile; the
+        keyframe interval needs the source frame rate. Subclasses add what
+        their encoder supports.
+        """
+        keyint = profile.keyint(frame_rate)
+        return ['-g', str(keyint)] if keyint else []
+
+    def thread_args(self, threads):
+        """ffmpeg output options limiting the encoder to `threads` threads"""
+        return ['-threads', str(int(threads))]
+
+    def __repr__(self):
+        return f"{type(self).__name__}()"
+
+
+class NvencBackend(EncoderBackend):
+    key = "nvenc"
+    name = "NVIDIA NVENC (GPU)"
+    encoder = "av1_nvenc"
+    hardware = True
+    two_pass = "internal"
+
+    SPEED = {"quality": "p7", "balanced": "p5", "fast": "p3"}
+    MAX_LOOKAHEAD = 32
+
+    def video_args(self, cq, preset=DEFAULT_PRESET):
+        return ['-c:v', self.encoder, '-preset', self.SPEED[preset], '-cq', str(int(cq))]
+
+    def profile_args(self, profile, frame_rate=None):
+        # Scene cuts get keyframes by default once lookahead is on
+        args = super().profile_args(profile, frame_rate)
+        if profile.lookahead:
+            args.extend(['-rc-lookahead', str(min(profile.lookahead, self.MAX_LOOKAHEAD))])
+        if profile.spatial_aq:
+            args.extend(['-spatial-aq', '1'])
+        if profile.temporal_aq:
+            args.extend(['-temporal-aq', '1'])
+        if profile.aq_strength and (profile.spatial_aq or profile.temporal_aq):
+            args.extend(['-aq-strength', str(profile.aq_strength)])
+        if profile.b_ref_mode:
+            args.extend(['-bf', '3', '-b_ref_mode', profile.b_ref_mode])
+        if profile.two_pass:
+            args.extend(['-multipass', 'fullres'])
+        return args
+
+    def thread_args(self, threads):
+        return []  # encoding runs on the GPU
+
+
+class SvtAv1Backend(EncoderBackend):
+    key = "svtav1"
+    name = "SVT-AV1 (CPU)"
+    encoder = "libsvtav1"
+
+    SPEED = {"quality": 4, "balanced": 6, "fast": 8}
+    MAX_LOOKAHEAD = 120
+
+    def video_args(self, cq, preset=DEFAULT_PRESET):
+        return [
+            '-c:v', self.encoder,
+            '-preset', str(self.SPEED[preset]),
+            '-crf', str(_rescale(cq, 63)),
+        ]
+
+    def profile_args(self, profile, frame_rate=None):
+        # libsvtav1 has no two-pass CRF through ffmpeg; its lookahead covers it
+        args = super().profile_args(profile, frame_rate)
+        params = []
+        if profile.lookahead:
+            params.append(f'lookahead={min(profile.lookahead, self.MAX_LOOKAHEAD)}')
+        if profile.spatial_aq:
+            params.append('aq-mode=2')
+        if profile.temporal_aq:
+            params.append('enable-tf=1')
+        if profile.scene_detection:
+            params.append('scd=1')
+        if profile.film_grain:
+            params.append(f'film-grain={int(profile.film_grain)}')
+        if params:
+            args.extend(['-svtav1-params', ':'.join(params)])
+        return args
+
+    def thread_args(self, threads):
+        # libsvtav1 ignores -threads; lp is its "level of parallelism"
+        return ['-svtav1-params', f'lp={int(threads)}']
+
+
+class AomBackend(EncoderBackend):
+    key = "aom"
+    name = "libaom AV1 (CPU)"
+    encoder = "libaom-av1"
+    two_pass = "external"
+
+    SPEED = {"quality": 4, "balanced": 6, "fast": 8}
+    MAX_LOOKAHEAD = 35
+
+    def video_args(self, cq, preset=DEFAULT_PRESET):
+        return [
+            '-c:v', self.encoder,
+            '-cpu-used', str(self.SPEED[preset]),
+            '-crf', str(_rescale(cq, 63)),
+            '-b:v', '0',  # constant quality mode
+            '-row-mt', '1',
+        ]
+
+    def profile_args(self, profile, frame_rate=None):
+        # libaom places keyframes on scene cuts by itself
+        args = super().profile_args(profile, frame_rate)
+        if profile.lookahead:
+            args.extend(['-lag-in-frames', str(min(profile.lookahead, self.MAX_LOOKAHEAD))])
+        if profile.spatial_aq:
+            args.extend(['-aq-mode', '1'])
+        if profile.temporal_aq:
+            args.extend(['-aom-params', 'enable-tpl-model=1'])
+        if profile.film_grain:
+            args.extend(['-denoise-noise-level', str(int(profile.film_grain))])
+        return args
+
+
+class Rav1eBackend(EncoderBackend):
+    key = "rav1e"
+    name = "rav1e (CPU)"
+    encoder = "librav1e"
+
+    SPEED = {"quality": 4, "balanced": 6, "fast": 9}
+    MAX_LOOKAHEAD = 40
+
+    def video_args(self, cq, preset=DEFAULT_PRESET):
+        return [
+            '-c:v', self.encoder,
+            '-speed', str(self.SPEED[preset]),
+            '-qp', str(_rescale(cq, 255)),
+        ]
+
+    def profile_args(self, profile, frame_rate=None):
+        # Constant-quantizer rav1e gains nothing from two passes; scene
+        # detection is always on
+        args = super().profile_args(profile, frame_rate)
+        if profile.lookahead:
+            args.extend(['-rav1e-params', f'rdo_lookahead_frames={min(profile.lookahead, self.MAX_LOOKAHEAD)}'])
+        return args
+
+
+# In order of preference for automatic selection
+BACKENDS = [NvencBackend(), SvtAv1Backend(), AomBackend(), Rav1eBackend()]
+BACKENDS_BY_KEY = {backend.key: backend for backend in BACKENDS}
+DEFAULT_ENCODER = NvencBackend.key
+
+
+def get_backend(key):
+    try:
+        return BACKENDS_BY_KEY[key]
+    except KeyError:
+        raise ValueError(f"Unknown encoder: {key}")
+
+
+def list_ffmpeg_encoders(ffmpeg_path):
+    """Names of all encoders compiled into this ffmpeg build"""
+    result = subprocess.run(
+        [ffmpeg_path, '-hide_banner', '-encoders'],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        universal_newlines=True,
+        creationflags=CREATE_NO_WINDOW,
+    )
+    names = set()
+    for line in result.stdout.splitlines():
+        # " V....D av1_nvenc            NVIDIA NVENC av1 encoder"
+        parts = line.split()
+        if len(parts) >= 2 and len(parts[0]) == 6 and parts[0][0] in "VAS":
+            names.add(parts[1])
+    return names
+
+
+def test_encode(ffmpeg_path, backend, timeout=30):
+    """Encode a few generated frames to check the encoder actually works here"""
+    cmd = [
+        ffmpeg_path, '-hide_banner', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', 'testsrc2=size=256x144:rate=24:duration=0.25',
+    ]
+    cmd.extend(backend.video_args(40, "fast"))
+    cmd.extend(['-f', 'null', '-'])
+    try:
+        result = subprocess.run(
+            cmd,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=timeout,
+            creationflags=CREATE_NO_WINDOW,
+        )
+    except (subprocess.TimeoutExpired, OSError):
+        return False
+    return result.returncode == 0
+
+
+_capabilities = {}
+_capabilities_lock = threading.Lock()
+
+
+def detect_backends(ffmpeg_path=None):
+    """
+    Return the usable backends for this ffmpeg, in preference order.
+    Results are cached per ffmpeg binary for the life of the process.
+    """
+    ffmpeg_path = ffmpeg_path or find_ffmpeg()
+    if not ffmpeg_path:
+        return []
+    with _capabilities_lock:
+        if ffmpeg_path in _capabilities:
+            return list(_capabilities[ffmpeg_path])
+
+    compiled = list_ffmpeg_encoders(ffmpeg_path)
+    usable = []
+    for backend in BACKENDS:
+        if backend.encoder not in compiled:
+            continue
+        # Hardware encoders are listed even without a capable GPU/driver
+        if backend.hardware and not test_encode(ffmpeg_path, backend):
+            continue
+        usable.append(backend)
+
+    with _capabilities_lock:
+        _capabilities[ffmpeg_path] = usable
+    return list(usable)
+
+
+def select_backend(preferred="auto", ffmpeg_path=None, log=None):
+    """
+    Resolve an encoder choice to a usable backend.
+    'auto' picks the first usable backend; an unavailable explicit choice
+    falls back the same way (logging why). Raises if nothing is usable.
+    """
+    usable = detect_backends(ffmpeg_path)
+    if not usable:
+        raise RuntimeError("No AV1 encoder found in this ffmpeg build")
+
+    if preferred and preferred != "auto":
+        backend = get_backend(preferred)
+        if backend in usable:
+            return backend
+        if log:
+            log(f"{backend.name} is not available here, falling back to {usable[0].name}")
+    return usable[0]
+
+
+def smoke_test(ffmpeg_path, backend, workdir):
+    """Encode a tiny generated clip end to end; returns the output size in bytes"""
+    output = os.path.join(workdir, f"smoke_{backend.key}.mkv")
+    cmd = [
+        ffmpeg_path, '-hide_banner', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', 'testsrc2=size=320x180:rate=24:duration=1',
+        '-f', 'lavfi', '-i', 'sine=frequency=440:duration=1',
+    ]
+    cmd.extend(backend.video_args(40, "fast"))
+    cmd.extend(['-c:a', 'libopus', '-b:a', '64k', '-shortest', '-y', output])
+    subprocess.run(cmd, check=True, creationflags=CREATE_NO_WINDOW)
+    return os.path.getsize(output)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="encoders", description="Detect available AV1 encoders")
+    parser.add_argument("--smoke", action="store_true",
+                        help="Encode a short generated clip with every usable backend")
+    args = parser.parse_args(argv)
+
+    ffmpeg_path = find_ffmpeg()
+    if not ffmpeg_path:
+        print("ffmpeg not found")
+        return 2
+
+    usable = detect_backends(ffmpeg_path)
+    for backend in BACKENDS:
+        status = "available" if backend in usable else "not available"
+        print(f"{backend.key:8} {backend.encoder:12} {status}")
+
+    failures = 0
+    if args.smoke:
+        with tempfile.TemporaryDirectory() as workdir:
+            for backend in usable:
+                try:
+                    size = smoke_test(ffmpeg_path, backend, workdir)
+                    print(f"smoke {backend.key}: ok ({size} bytes)")
+                except subprocess.CalledProcessError as e:
+                    failures += 1
+                    print(f"smoke {backend.key}: FAILED ({e.returncode})")
+    return 1 if failures or not usable else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""
+Structured ffmpeg progress.
+ffmpeg is run with `-progress pipe:1 -nostats`, which writes blocks of
+key=value lines to stdout, each ending in `progress=continue` or
+`progress=end`. ProgressParser turns those blocks into ProgressEvent
+objects; stderr is left for warnings and errors only.
+"""
+
+import time
+
+
+# Global options that switch ffmpeg from the stderr status line to the
+# machine-readable progress channel on stdout
+PROGRESS_ARGS = ['-progress', 'pipe:1', '-nostats']
+
+# stderr fragments (lowercase) of failures that may well succeed on a retry:
+# share/disk hiccups, and NVENC sessions or GPU memory taken by another process
+TRANSIENT_ERRORS = (
+    "input/output error",
+    "connection reset",
+    "connection timed out",
+    "network is unreachable",
+    "host is down",
+    "stale file handle",
+    "resource temporarily unavailable",
+    "device or resource busy",
+    "openencodesessionex failed",
+    "no capable devices found",
+    "out of memory",
+)
+
+
+def is_transient_failure(lines):
+    """True if any of the ffmpeg stderr lines points at a transient cause"""
+    for line in lines:
+        line = line.lower()
+        if any(fragment in line for fragment in TRANSIENT_ERRORS):
+            return True
+    return False
+
+
+def _parse_float(value):
+    """ffmpeg reports unknown values as N/A"""
+    try:
+        return float(value.rstrip('x'))
+    except (AttributeError, ValueError):
+        return None
+
+
+def _parse_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_clock(value):
+    """'00:01:02.500000' -> 62.5"""
+    try:
+        hours, minutes, seconds = value.split(':')
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    except (AttributeError, ValueError):
+        return None
+
+
+def _parse_bitrate(value):
+    """'1234.5kbits/s' -> 1234.5 (kbit/s)"""
+    if value and value.endswith('kbits/s'):
+        return _parse_float(value[:-len('kbits/s')])
+    return None
+
+
+class ProgressEvent:
+    """One progress block from ffmpeg, plus position relative to the input duration"""
+
+    def __init__(self, out_time=None, frame=None, fps=None, bitrate=None, total_size=None,
+                 speed=None, dup_frames=None, drop_frames=None, finished=False, duration=0):
+        self.out_time = out_time        # seconds of output written
+        self.frame = frame
+        self.fps = fps
+        self.bitrate = bitrate          # kbit/s
+        self.total_size = total_size    # bytes
+        self.speed = speed              # multiple of realtime
+        self.dup_frames = dup_frames
+        self.drop_frames = drop_frames
+        self.finished = finished
+        self.duration = duration
+
+    @property
+    def fraction(self):
+        """Share of the input encoded so far, 0..1 (0 if the duration is unknown)"""
+        if self.finished:
+            return 1.0
+        if not self.duration or self.out_time is None:
+            return 0.0
+        return min(max(self.out_time / self.duration, 0.0), 1.0)
+
+    @property
+    def eta(self):
+        """Estimated seconds remaining, or None when it can't be estimated yet"""
+        if self.finished:
+            return 0.0
+        if not self.duration or self.out_time is None or not self.speed:
+            return None
+        return max(self.duration - self.out_time, 0.0) / self.speed
+
+    def to_dict(self):
+        return {
+            'out_time': self.out_time,
+            'frame': self.frame,
+            'fps': self.fps,
+            'bitrate': self.bitrate,
+            'total_size': self.total_size,
+            'speed': self.speed,
+            'dup_frames': self.dup_frames,
+            'drop_frames': self.drop_frames,
+            'eta': self.eta,
+        }
+
+    def summary(self):
+        """Short human-readable status, e.g. '42% 87.0 fps 2.1x ETA 0:03:10'"""
+        parts = [f"{int(self.fraction * 100)}%"]
+        if self.fps:
+            parts.append(f"{self.fps:.1f} fps")
+        if self.speed:
+            parts.append(f"{self.speed:.2f}x")
+        if self.eta is not None:
+            parts.append(f"ETA {format_seconds(self.eta)}")
+        if self.drop_frames or self.dup_frames:
+            parts.append(f"dup {self.dup_frames or 0}/drop {self.drop_frames or 0}")
+        return " ".join(parts)
+
+
+def format_seconds(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+class ProgressParser:
+    """Incremental parser: feed() lines, get a ProgressEvent at the end of each block"""
+
+    def __init__(self, duration=0):
+        self.duration = duration
+        self._fields = {}
+
+    def feed(self, line):
+        key, sep, value = line.strip().partition('=')
+        if not sep:
+            return None
+        if key != 'progress':
+            self._fields[key] = value.strip()
+            return None
+        fields, self._fields = self._fields, {}
+        return self._event(fields, finished=value.strip() == 'end')
+
+    def _event(self, fields, finished):
+        # out_time_ms is in microseconds too (long-standing ffmpeg quirk)
+        out_time = None
+        for key in ('out_time_us', 'out_time_ms'):
+            micros = _parse_int(fields.get(key))
+            if micros is not None:
+                out_time = micros / 1e6
+                break
+        if out_time is None:
+            out_time = _parse_clock(fields.get('out_time'))
+        return ProgressEvent(
+            out_time=out_time,
+            frame=_parse_int(fields.get('frame')),
+            fps=_parse_float(fields.get('fps')),
+            bitrate=_parse_bitrate(fields.get('bitrate')),
+            total_size=_parse_int(fields.get('total_size')),
+            speed=_parse_float(fields.get('speed')),
+            dup_frames=_parse_int(fields.get('dup_frames')),
+            drop_frames=_parse_int(fields.get('drop_frames')),
+            finished=finished,
+            duration=self.duration,
+        )
+
+
+class Throttle:
+    """Lets an action through at most once per interval (seconds)"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._last = None
+
+    def ready(self, force=False):
+        now = time.monotonic()
+        if force or self._last is None or now - self._last >= self.interval:
+            self._last = now
+            return True
+        return False
@@ -0,0 +1,46 @@
+"""
+Helpers for locating the ffmpeg/ffprobe binaries and launching them
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+
+
+# Hide the console window for child processes on Windows (no-op elsewhere)
+CREATE_NO_WINDOW = getattr(subprocess, "CREATE_NO_WINDOW", 0)
+
+
+def _search_dirs():
+    """Directories checked before PATH: working dir, then the app's own dir"""
+    dirs = [os.getcwd()]
+    if getattr(sys, "frozen", False):
+        dirs.append(os.path.dirname(sys.executable))
+    else:
+        dirs.append(os.path.dirname(os.path.abspath(__file__)))
+    return dirs
+
+
+def find_tool(name):
+    """
+    Locate an ffmpeg suite binary (ffmpeg, ffprobe).
+    Prefers a copy placed next to the app, then falls back to PATH.
+    Returns the full path, or None if it cannot be found.
+    """
+    for directory in _search_dirs():
+        for candidate in (f"{name}.exe", name):
+            path = os.path.join(directory, candidate)
+            if os.path.isfile(path) and os.access(path, os.X_OK):
+                return path
+    return shutil.which(name)
+
+
+def find_ffmpeg():
+    """Locate ffmpeg"""
+    return find_tool("ffmpeg")
+
+
+def find_ffprobe():
+    """Locate ffprobe"""
+    return find_tool("ffprobe")
@@ -0,0 +1,154 @@
+"""
+GPU decode for the NVENC backend.
+By default ffmpeg decodes on the CPU, scales with the software `scale`
+filter and uploads every frame to the GPU for NVENC, which makes the CPU the
+bottleneck. With CUDA decode the frames stay in GPU memory from the decoder
+through `scale_cuda`/`scale_npp` to the encoder.
+
+Whether this works depends on the ffmpeg build, the driver and the source
+codec, so it is detected once per ffmpeg binary and checked per file; jobs
+fall back to software decode whenever it isn't usable.
+"""
+
+import subprocess
+import threading
+
+from encoders import NvencBackend
+from ffmpeg_utils import CREATE_NO_WINDOW, find_ffmpeg
+
+
+DECODE_MODES = ["auto", "cuda", "software"]
+DEFAULT_DECODE = "auto"
+
+# GPU scalers in order of preference
+CUDA_SCALERS = ["scale_cuda", "scale_npp"]
+
+# Source codecs NVDEC can decode (ffprobe codec names)
+NVDEC_CODECS = {"h264", "hevc", "av1", "vp9", "vp8", "mpeg2video", "mpeg4", "mpeg1video", "vc1", "mjpeg"}
+# 4:2:2 and 4:4:4 sources need newer GPUs; leave them to the CPU
+NVDEC_PIXEL_FORMATS = {"yuv420p", "yuvj420p", "yuv420p10le", "yuv420p12le", "nv12", "p010le"}
+
+
+class CudaDecode:
+    """ffmpeg arguments for decoding and scaling on the GPU"""
+
+    def __init__(self, scaler=CUDA_SCALERS[0]):
+        self.scaler = scaler
+
+    def input_args(self):
+        """Options that go before the input's -i"""
+        return ['-hwaccel', 'cuda', '-hwaccel_output_format', 'cuda']
+
+    def scale_filter(self, scale):
+        return f'{self.scaler}={scale}:force_original_aspect_ratio=decrease'
+
+    def supports(self, info):
+        """True if NVDEC can decode this MediaInfo's video (unknown formats are allowed)"""
+        video = info.video if info is not None else None
+        if video is None:
+            return False
+        if video.codec_name not in NVDEC_CODECS:
+            return False
+        return video.pix_fmt is None or video.pix_fmt in NVDEC_PIXEL_FORMATS
+
+    def __repr__(self):
+        return f"CudaDecode({self.scaler!r})"
+
+
+def _ffmpeg_lines(ffmpeg_path, flag):
+    result = subprocess.run(
+        [ffmpeg_path, '-hide_banner', flag],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        universal_newlines=True,
+        creationflags=CREATE_NO_WINDOW,
+    )
+    return result.stdout.splitlines()
+
+
+def list_hwaccels(ffmpeg_path):
+    """Hardware decode methods compiled into this ffmpeg build"""
+    # "Hardware acceleration methods:" followed by one name per line
+    return {line.strip() for line in _ffmpeg_lines(ffmpeg_path, '-hwaccels')[1:] if line.strip()}
+
+
+def _filter_names(ffmpeg_path):
+    names = set()
+    for line in _ffmpeg_lines(ffmpeg_path, '-filters'):
+        parts = line.split()
+        if len(parts) >= 3 and "->" in parts[2]:
+            names.add(parts[1])
+    return names
+
+
+def test_gpu_scaler(ffmpeg_path, scaler, timeout=30):
+    """Upload a few generated frames, scale them on the GPU and encode with NVENC"""
+    cmd = [
+        ffmpeg_path, '-hide_banner', '-loglevel', 'error',
+        '-init_hw_device', 'cuda=gpu', '-filter_hw_device', 'gpu',
+        '-f', 'lavfi', '-i', 'testsrc2=size=256x144:rate=24:duration=0.25',
+        '-vf', f'format=nv12,hwupload,{scaler}=128:72',
+    ]
+    cmd.extend(NvencBackend().video_args(40, "fast"))
+    cmd.extend(['-f', 'null', '-'])
+    try:
+        result = subprocess.run(
+            cmd,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=timeout,
+            creationflags=CREATE_NO_WINDOW,
+        )
+    except (subprocess.TimeoutExpired, OSError):
+        return False
+    return result.returncode == 0
+
+
+_detected = {}
+_detected_lock = threading.Lock()
+
+
+def detect_cuda_decode(ffmpeg_path=None):
+    """
+    Return a CudaDecode using the best working GPU scaler, or None.
+    Cached per ffmpeg binary for the life of the process.
+    """
+    ffmpeg_path = ffmpeg_path or find_ffmpeg()
+    if not ffmpeg_path:
+        return None
+    with _detected_lock:
+        if ffmpeg_path in _detected:
+            return _detected[ffmpeg_path]
+
+    decode = None
+    if "cuda" in list_hwaccels(ffmpeg_path):
+        filters = _filter_names(ffmpeg_path)
+        for scaler in CUDA_SCALERS:
+            if scaler in filters and test_gpu_scaler(ffmpeg_path, scaler):
+                decode = CudaDecode(scaler)
+                break
+
+    with _detected_lock:
+        _detected[ffmpeg_path] = decode
+    return decode
+
+
+def select_decode(mode, backend, ffmpeg_path=None, log=None):
+    """
+    Resolve a decode mode ('auto', 'cuda', 'software') for the chosen encoder
+    backend to a CudaDecode or None (software decode), logging fallbacks.
+    """
+    if mode == "software":
+        return None
+    if backend.key != NvencBackend.key:
+        if mode == "cuda" and log:
+            log(f"GPU decode needs the NVENC encoder, decoding on the CPU for {backend.name}")
+        return None
+    decode = detect_cuda_decode(ffmpeg_path)
+    if decode is None:
+        if mode == "cuda" and log:
+            log("CUDA decode or GPU scaling is not available here, decoding on the CPU")
+        return None
+    if log:
+        log(f"Decoding on the GPU (CUDA, {decode.scaler})")
+    return decode
@@ -0,0 +1,168 @@
+"""
+Persistent ledger of completed conversions.
+Lets repeat runs skip inputs that were already converted with the same
+settings, and notices when a recorded output has since been truncated,
+replaced or deleted.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from app_paths import app_data_dir
+from encode_profiles import DEFAULT_PROFILE
+
+
+# Bytes hashed from each of the start, middle and end of a file
+SAMPLE_SIZE = 1024 * 1024
+
+
+def fingerprint_file(path, sample_size=SAMPLE_SIZE):
+    """
+    Fast content fingerprint: blake2b over the file size plus samples from
+    the start, middle and end. Stable across renames and touch; changes when
+    the content is re-muxed, re-encoded or truncated. Cost is constant
+    regardless of file size.
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(str(size).encode())
+    with open(path, "rb") as f:
+        if size <= sample_size * 3:
+            digest.update(f.read())
+        else:
+            for offset in (0, size // 2 - sample_size // 2, size - sample_size):
+                f.seek(offset)
+                digest.update(f.read(sample_size))
+    return digest.hexdigest()
+
+
+def settings_key(settings, subtitles=()):
+    """Hash of everything that changes the output for a given input"""
+    payload = {
+        "quality": settings.quality,
+        "resolution": settings.resolution,
+        "audio": settings.audio,
+        "output_name": settings.output_name,
+        "encoder": settings.encoder,
+        "preset": settings.preset,
+        "subtitles": sorted(
+            (track.path.name, os.path.getsize(track.path), track.language_code)
+            for track in subtitles
+        ),
+    }
+    # Only present when used, so keys recorded before the option existed still match
+    if settings.target_metric:
+        payload["target"] = [settings.target_metric, settings.target_score]
+    if settings.profile != DEFAULT_PROFILE:
+        payload["profile"] = settings.profile
+    if not settings.default_streams or settings.remux_only:
+        payload["streams"] = [
+            list(settings.audio_languages), settings.drop_commentary,
+            settings.keep_embedded_subtitles, settings.keep_attachments, settings.remux_only,
+        ]
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+class LedgerEntry:
+    """A completed conversion as recorded in the ledger"""
+
+    def __init__(self, fingerprint, settings_key, input_path, output_path,
+                 output_size, output_checksum, completed_at):
+        self.fingerprint = fingerprint
+        self.settings_key = settings_key
+        self.input_path = input_path
+        self.output_path = output_path
+        self.output_size = output_size
+        self.output_checksum = output_checksum
+        self.completed_at = completed_at
+
+
+class JobLedger:
+    """SQLite-backed record of finished outputs keyed by input fingerprint + settings"""
+
+    def __init__(self, db_path=None):
+        self.db_path = Path(db_path) if db_path else app_data_dir() / "ledger.sqlite3"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS completed ("
+            " fingerprint TEXT NOT NULL,"
+            " settings_key TEXT NOT NULL,"
+            " input_path TEXT,"
+            " output_path TEXT,"
+            " output_size INTEGER,"
+            " output_checksum TEXT,"
+            " completed_at REAL,"
+            " PRIMARY KEY (fingerprint, settings_key))"
+        )
+        self._conn.commit()
+
+    def lookup(self, fingerprint, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fingerprint, settings_key, input_path, output_path, output_size,"
+                " output_checksum, completed_at FROM completed"
+                " WHERE fingerprint = ? AND settings_key = ?",
+                (fingerprint, key),
+            ).fetchone()
+        return LedgerEntry(*row) if row else None
+
+    def find_valid_output(self, fingerprint, key):
+        """
+        Return the ledger entry if its output still exists intact, else None.
+        Entries whose output went missing or changed are dropped so the input
+        is converted again.
+        """
+        entry = self.lookup(fingerprint, key)
+        if entry is None:
+            return None
+        output = entry.output_path
+        try:
+            intact = (
+                os.path.getsize(output) == entry.output_size
+                and fingerprint_file(output) == entry.output_checksum
+            )
+        except OSError:
+            intact = False
+        if not intact:
+            self.forget(fingerprint, key)
+            return None
+        return entry
+
+    def record(self, fingerprint, key, input_path, output_path):
+        """Store a finished output along with its size and checksum"""
+        output_path = str(output_path)
+        entry = LedgerEntry(
+            fingerprint,
+            key,
+            str(input_path),
+            output_path,
+            os.path.getsize(output_path),
+            fingerprint_file(output_path),
+            time.time(),
+        )
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completed VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (entry.fingerprint, entry.settings_key, entry.input_path, entry.output_path,
+                 entry.output_size, entry.output_checksum, entry.completed_at),
+            )
+            self._conn.commit()
+        return entry
+
+    def forget(self, fingerprint, key):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM completed WHERE fingerprint = ? AND settings_key = ?",
+                (fingerprint, key),
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,229 @@
+"""
+Persistent job queue.
+Every queued file is a row in a SQLite (WAL) database together with the
+settings it will be converted with, its priority, state, attempt count and
+timings, so the queue survives closing the app or a crash. Rows are owned by
+the process that queued or reloaded them; rows whose owner is no longer
+running are picked up again by the next run.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from app_paths import app_data_dir
+from conversion_engine import ConversionSettings
+from output_files import host_tag, pid_alive
+
+
+# Job states that take a row out of the queue; everything else is reloaded
+COMPLETED_STATES = ("done", "skipped")
+
+# Completed rows are kept this long as history, then pruned on load
+HISTORY_SECONDS = 30 * 24 * 60 * 60
+
+
+def owner_tag():
+    """Identifies this process: host plus pid"""
+    return f"{host_tag()}-{os.getpid()}"
+
+
+def _owner_alive(owner):
+    host, _, pid = owner.rpartition("-")
+    if host != host_tag():
+        return True  # can't tell; leave another machine's rows alone
+    return pid.isdigit() and pid_alive(int(pid))
+
+
+class QueuedJob:
+    """One row of the queue"""
+
+    FIELDS = (
+        "id", "input_path", "settings", "priority", "status", "attempts", "error",
+        "output_path", "owner", "created_at", "started_at", "finished_at", "retry_at",
+    )
+
+    def __init__(self, id, input_path, settings=None, priority=0, status="queued", attempts=0,
+                 error=None, output_path=None, owner=None, created_at=None, started_at=None,
+                 finished_at=None, retry_at=None):
+        self.id = id
+        self.input_path = input_path
+        # ConversionSettings.to_dict() snapshot, or None until the batch starts
+        self.settings = settings
+        self.priority = priority
+        self.status = status
+        self.attempts = attempts
+        self.error = error
+        self.output_path = output_path
+        self.owner = owner
+        self.created_at = created_at
+        self.started_at = started_at
+        self.finished_at = finished_at
+        self.retry_at = retry_at
+
+    @classmethod
+    def from_row(cls, row):
+        job = cls(*row)
+        job.settings = json.loads(job.settings) if job.settings else None
+        return job
+
+    def __repr__(self):
+        return f"QueuedJob({self.id}, {self.input_path!r}, {self.status})"
+
+
+class JobStore:
+    """SQLite-backed queue shared by the app and the CLI"""
+
+    def __init__(self, db_path=None):
+        self.db_path = Path(db_path) if db_path else app_data_dir() / "queue.sqlite3"
+        self.owner = owner_tag()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        # WAL keeps the many small state updates cheap and readers unblocked
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " input_path TEXT NOT NULL,"
+            " settings TEXT,"
+            " priority INTEGER NOT NULL DEFAULT 0,"
+            " status TEXT NOT NULL DEFAULT 'queued',"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " error TEXT,"
+            " output_path TEXT,"
+            " owner TEXT,"
+            " created_at REAL,"
+            " started_at REAL,"
+            " finished_at REAL,"
+            " retry_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, priority, id)")
+        self._conn.commit()
+
+    def add(self, paths, priority=0, settings=None):
+        """Queue paths; returns their QueuedJob rows in the same order"""
+        now = time.time()
+        encoded = json.dumps(settings) if settings else None
+        jobs = []
+        with self._lock:
+            # One transaction for the whole batch
+            for path in paths:
+                cursor = self._conn.execute(
+                    "INSERT INTO jobs (input_path, settings, priority, owner, created_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (str(path), encoded, priority, self.owner, now),
+                )
+                jobs.append(QueuedJob(cursor.lastrowid, str(path), settings, priority,
+                                      owner=self.owner, created_at=now))
+            self._conn.commit()
+        return jobs
+
+    def load_pending(self):
+        """
+        Claim and return every unfinished job not owned by a live process,
+        highest priority first. Jobs that were running when their process
+        died come back as queued.
+        """
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                COMPLETED_STATES + (time.time() - HISTORY_SECONDS,),
+            )
+            rows = self._conn.execute(
+                f"SELECT {', '.join(QueuedJob.FIELDS)} FROM jobs"
+                " WHERE status NOT IN (?, ?) ORDER BY priority DESC, id",
+                COMPLETED_STATES,
+            ).fetchall()
+            jobs = [QueuedJob.from_row(row) for row in rows]
+            alive = {}
+            claimed = []
+            for job in jobs:
+                if job.owner and job.owner != self.owner:
+                    if job.owner not in alive:
+                        alive[job.owner] = _owner_alive(job.owner)
+                    if alive[job.owner]:
+                        continue
+                claimed.append(job)
+            self._conn.executemany(
+                "UPDATE jobs SET owner = ?, status = CASE WHEN status = 'running' THEN 'queued'"
+                " ELSE status END WHERE id = ?",
+                [(self.owner, job.id) for job in claimed],
+            )
+            self._conn.commit()
+        for job in claimed:
+            job.owner = self.owner
+            if job.status == "running":
+                job.status = "queued"
+        return claimed
+
+    def assign_settings(self, jobs, settings):
+        """Store the settings snapshot for jobs that don't have one yet"""
+        jobs = [job for job in jobs if job.settings is None]
+        encoded = json.dumps(settings)
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE jobs SET settings = ? WHERE id = ? AND settings IS NULL",
+                [(encoded, job.id) for job in jobs],
+            )
+            self._conn.commit()
+        for job in jobs:
+            job.settings = settings
+
+    def remove(self, job_ids):
+        with self._lock:
+            self._conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in job_ids])
+            self._conn.commit()
+
+    # Scheduler hooks: take a scheduler.EncodeJob carrying job_id ----------
+
+    def mark_started(self, job):
+        self._update(
+            job,
+            "status = 'running', attempts = attempts + 1, started_at = ?, retry_at = NULL, owner = ?",
+            (job.started_at, self.owner),
+        )
+
+    def mark_retry(self, job):
+        self._update(job, "status = 'queued', error = ?, retry_at = ?", (job.error, job.retry_at))
+
+    def mark_finished(self, job):
+        self._update(
+            job,
+            "status = ?, error = ?, output_path = ?, finished_at = ?",
+            (job.state, job.error, job.output_path, job.finished_at or time.time()),
+        )
+
+    def _update(self, job, assignments, values):
+        if job.job_id is None:
+            return
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", values + (job.job_id,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def job_settings(job, default, log=None):
+    """
+    ConversionSettings for a queued job: its saved snapshot, else default.
+    The encoder always comes from default, which has been resolved against
+    this machine's ffmpeg. A snapshot that no longer validates is logged and
+    replaced by default.
+    """
+    if not job.settings:
+        return default
+    values = dict(job.settings)
+    values["encoder"] = default.encoder
+    try:
+        return ConversionSettings.from_dict(values)
+    except ValueError as e:
+        if log:
+            log(f"WARNING: job {job.id} ({os.path.basename(job.input_path)}) has invalid saved settings "
+                f"({e}), using the current settings")
+        return default
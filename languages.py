@@ -0,0 +1,256 @@
+"""
+ISO 639 language table used to recognise language tags in filenames.
+Each row: (ISO 639-1, ISO 639-2/B, ISO 639-2/T, English name, native names)
+MKV language metadata uses the 639-2/B code.
+"""
+
+import unicodedata
+
+
+LANGUAGES = [
+    ("aa", "aar", "aar", "Afar", ("afaraf",)),
+    ("ab", "abk", "abk", "Abkhazian", ("аҧсуа",)),
+    ("ae", "ave", "ave", "Avestan", ()),
+    ("af", "afr", "afr", "Afrikaans", ()),
+    ("ak", "aka", "aka", "Akan", ()),
+    ("am", "amh", "amh", "Amharic", ("አማርኛ",)),
+    ("an", "arg", "arg", "Aragonese", ("aragonés",)),
+    ("ar", "ara", "ara", "Arabic", ("العربية",)),
+    ("as", "asm", "asm", "Assamese", ("অসমীয়া",)),
+    ("av", "ava", "ava", "Avaric", ()),
+    ("ay", "aym", "aym", "Aymara", ()),
+    ("az", "aze", "aze", "Azerbaijani", ("azərbaycan",)),
+    ("ba", "bak", "bak", "Bashkir", ()),
+    ("be", "bel", "bel", "Belarusian", ("беларуская",)),
+    ("bg", "bul", "bul", "Bulgarian", ("български",)),
+    ("bh", "bih", "bih", "Bihari", ()),
+    ("bi", "bis", "bis", "Bislama", ()),
+    ("bm", "bam", "bam", "Bambara", ()),
+    ("bn", "ben", "ben", "Bengali", ("বাংলা", "bangla")),
+    ("bo", "tib", "bod", "Tibetan", ("བོད་ཡིག",)),
+    ("br", "bre", "bre", "Breton", ("brezhoneg",)),
+    ("bs", "bos", "bos", "Bosnian", ("bosanski",)),
+    ("ca", "cat", "cat", "Catalan", ("català",)),
+    ("ce", "che", "che", "Chechen", ()),
+    ("ch", "cha", "cha", "Chamorro", ()),
+    ("co", "cos", "cos", "Corsican", ("corsu",)),
+    ("cr", "cre", "cre", "Cree", ()),
+    ("cs", "cze", "ces", "Czech", ("čeština",)),
+    ("cu", "chu", "chu", "Church Slavic", ()),
+    ("cv", "chv", "chv", "Chuvash", ()),
+    ("cy", "wel", "cym", "Welsh", ("cymraeg",)),
+    ("da", "dan", "dan", "Danish", ("dansk",)),
+    ("de", "ger", "deu", "German", ("deutsch",)),
+    ("dv", "div", "div", "Divehi", ()),
+    ("dz", "dzo", "dzo", "Dzongkha", ()),
+    ("ee", "ewe", "ewe", "Ewe", ()),
+    ("el", "gre", "ell", "Greek", ("ελληνικά",)),
+    ("en", "eng", "eng", "English", ()),
+    ("eo", "epo", "epo", "Esperanto", ()),
+    ("es", "spa", "spa", "Spanish", ("español", "castellano")),
+    ("et", "est", "est", "Estonian", ("eesti",)),
+    ("eu", "baq", "eus", "Basque", ("euskara",)),
+    ("fa", "per", "fas", "Persian", ("فارسی", "farsi")),
+    ("ff", "ful", "ful", "Fulah", ()),
+    ("fi", "fin", "fin", "Finnish", ("suomi",)),
+    ("fj", "fij", "fij", "Fijian", ()),
+    ("fo", "fao", "fao", "Faroese", ("føroyskt",)),
+    ("fr", "fre", "fra", "French", ("français",)),
+    ("fy", "fry", "fry", "Western Frisian", ("frysk",)),
+    ("ga", "gle", "gle", "Irish", ("gaeilge",)),
+    ("gd", "gla", "gla", "Scottish Gaelic", ("gàidhlig",)),
+    ("gl", "glg", "glg", "Galician", ("galego",)),
+    ("gn", "grn", "grn", "Guarani", ()),
+    ("gu", "guj", "guj", "Gujarati", ("ગુજરાતી",)),
+    ("gv", "glv", "glv", "Manx", ()),
+    ("ha", "hau", "hau", "Hausa", ()),
+    ("he", "heb", "heb", "Hebrew", ("עברית",)),
+    ("hi", "hin", "hin", "Hindi", ("हिन्दी",)),
+    ("ho", "hmo", "hmo", "Hiri Motu", ()),
+    ("hr", "hrv", "hrv", "Croatian", ("hrvatski",)),
+    ("ht", "hat", "hat", "Haitian", ("kreyòl",)),
+    ("hu", "hun", "hun", "Hungarian", ("magyar",)),
+    ("hy", "arm", "hye", "Armenian", ("հայերեն",)),
+    ("hz", "her", "her", "Herero", ()),
+    ("ia", "ina", "ina", "Interlingua", ()),
+    ("id", "ind", "ind", "Indonesian", ("indonesia",)),
+    ("ie", "ile", "ile", "Interlingue", ()),
+    ("ig", "ibo", "ibo", "Igbo", ()),
+    ("ii", "iii", "iii", "Sichuan Yi", ()),
+    ("ik", "ipk", "ipk", "Inupiaq", ()),
+    ("io", "ido", "ido", "Ido", ()),
+    ("is", "ice", "isl", "Icelandic", ("íslenska",)),
+    ("it", "ita", "ita", "Italian", ("italiano",)),
+    ("iu", "iku", "iku", "Inuktitut", ()),
+    ("ja", "jpn", "jpn", "Japanese", ("日本語",)),
+    ("jv", "jav", "jav", "Javanese", ()),
+    ("ka", "geo", "kat", "Georgian", ("ქართული",)),
+    ("kg", "kon", "kon", "Kongo", ()),
+    ("ki", "kik", "kik", "Kikuyu", ()),
+    ("kj", "kua", "kua", "Kuanyama", ()),
+    ("kk", "kaz", "kaz", "Kazakh", ("қазақ",)),
+    ("kl", "kal", "kal", "Kalaallisut", ()),
+    ("km", "khm", "khm", "Khmer", ("ខ្មែរ",)),
+    ("kn", "kan", "kan", "Kannada", ("ಕನ್ನಡ",)),
+    ("ko", "kor", "kor", "Korean", ("한국어",)),
+    ("kr", "kau", "kau", "Kanuri", ()),
+    ("ks", "kas", "kas", "Kashmiri", ()),
+    ("ku", "kur", "kur", "Kurdish", ("kurdî",)),
+    ("kv", "kom", "kom", "Komi", ()),
+    ("kw", "cor", "cor", "Cornish", ()),
+    ("ky", "kir", "kir", "Kyrgyz", ()),
+    ("la", "lat", "lat", "Latin", ("latina",)),
+    ("lb", "ltz", "ltz", "Luxembourgish", ("lëtzebuergesch",)),
+    ("lg", "lug", "lug", "Ganda", ()),
+    ("li", "lim", "lim", "Limburgish", ()),
+    ("ln", "lin", "lin", "Lingala", ()),
+    ("lo", "lao", "lao", "Lao", ("ລາວ",)),
+    ("lt", "lit", "lit", "Lithuanian", ("lietuvių",)),
+    ("lu", "lub", "lub", "Luba-Katanga", ()),
+    ("lv", "lav", "lav", "Latvian", ("latviešu",)),
+    ("mg", "mlg", "mlg", "Malagasy", ()),
+    ("mh", "mah", "mah", "Marshallese", ()),
+    ("mi", "mao", "mri", "Maori", ("māori",)),
+    ("mk", "mac", "mkd", "Macedonian", ("македонски",)),
+    ("ml", "mal", "mal", "Malayalam", ("മലയാളം",)),
+    ("mn", "mon", "mon", "Mongolian", ("монгол",)),
+    ("mr", "mar", "mar", "Marathi", ("मराठी",)),
+    ("ms", "may", "msa", "Malay", ("melayu",)),
+    ("mt", "mlt", "mlt", "Maltese", ("malti",)),
+    ("my", "bur", "mya", "Burmese", ("မြန်မာ",)),
+    ("na", "nau", "nau", "Nauru", ()),
+    ("nb", "nob", "nob", "Norwegian Bokmål", ("bokmål",)),
+    ("nd", "nde", "nde", "North Ndebele", ()),
+    ("ne", "nep", "nep", "Nepali", ("नेपाली",)),
+    ("ng", "ndo", "ndo", "Ndonga", ()),
+    ("nl", "dut", "nld", "Dutch", ("nederlands", "flemish", "vlaams")),
+    ("nn", "nno", "nno", "Norwegian Nynorsk", ("nynorsk",)),
+    ("no", "nor", "nor", "Norwegian", ("norsk",)),
+    ("nr", "nbl", "nbl", "South Ndebele", ()),
+    ("nv", "nav", "nav", "Navajo", ()),
+    ("ny", "nya", "nya", "Chichewa", ()),
+    ("oc", "oci", "oci", "Occitan", ()),
+    ("oj", "oji", "oji", "Ojibwa", ()),
+    ("om", "orm", "orm", "Oromo", ()),
+    ("or", "ori", "ori", "Oriya", ("ଓଡ଼ିଆ",)),
+    ("os", "oss", "oss", "Ossetian", ()),
+    ("pa", "pan", "pan", "Punjabi", ("ਪੰਜਾਬੀ",)),
+    ("pi", "pli", "pli", "Pali", ()),
+    ("pl", "pol", "pol", "Polish", ("polski",)),
+    ("ps", "pus", "pus", "Pashto", ("پښتو",)),
+    ("pt", "por", "por", "Portuguese", ("português", "brazilian")),
+    ("qu", "que", "que", "Quechua", ()),
+    ("rm", "roh", "roh", "Romansh", ()),
+    ("rn", "run", "run", "Rundi", ()),
+    ("ro", "rum", "ron", "Romanian", ("română",)),
+    ("ru", "rus", "rus", "Russian", ("русский",)),
+    ("rw", "kin", "kin", "Kinyarwanda", ()),
+    ("sa", "san", "san", "Sanskrit", ()),
+    ("sc", "srd", "srd", "Sardinian", ()),
+    ("sd", "snd", "snd", "Sindhi", ()),
+    ("se", "sme", "sme", "Northern Sami", ()),
+    ("sg", "sag", "sag", "Sango", ()),
+    ("si", "sin", "sin", "Sinhala", ("සිංහල",)),
+    ("sk", "slo", "slk", "Slovak", ("slovenčina",)),
+    ("sl", "slv", "slv", "Slovenian", ("slovenščina",)),
+    ("sm", "smo", "smo", "Samoan", ()),
+    ("sn", "sna", "sna", "Shona", ()),
+    ("so", "som", "som", "Somali", ("soomaali",)),
+    ("sq", "alb", "sqi", "Albanian", ("shqip",)),
+    ("sr", "srp", "srp", "Serbian", ("српски", "srpski")),
+    ("ss", "ssw", "ssw", "Swati", ()),
+    ("st", "sot", "sot", "Southern Sotho", ()),
+    ("su", "sun", "sun", "Sundanese", ()),
+    ("sv", "swe", "swe", "Swedish", ("svenska",)),
+    ("sw", "swa", "swa", "Swahili", ("kiswahili",)),
+    ("ta", "tam", "tam", "Tamil", ("தமிழ்",)),
+    ("te", "tel", "tel", "Telugu", ("తెలుగు",)),
+    ("tg", "tgk", "tgk", "Tajik", ()),
+    ("th", "tha", "tha", "Thai", ("ไทย",)),
+    ("ti", "tir", "tir", "Tigrinya", ()),
+    ("tk", "tuk", "tuk", "Turkmen", ()),
+    ("tl", "tgl", "tgl", "Tagalog", ()),
+    ("tn", "tsn", "tsn", "Tswana", ()),
+    ("to", "ton", "ton", "Tonga", ()),
+    ("tr", "tur", "tur", "Turkish", ("türkçe",)),
+    ("ts", "tso", "tso", "Tsonga", ()),
+    ("tt", "tat", "tat", "Tatar", ()),
+    ("tw", "twi", "twi", "Twi", ()),
+    ("ty", "tah", "tah", "Tahitian", ()),
+    ("ug", "uig", "uig", "Uyghur", ()),
+    ("uk", "ukr", "ukr", "Ukrainian", ("українська",)),
+    ("ur", "urd", "urd", "Urdu", ("اردو",)),
+    ("uz", "uzb", "uzb", "Uzbek", ("oʻzbek",)),
+    ("ve", "ven", "ven", "Venda", ()),
+    ("vi", "vie", "vie", "Vietnamese", ("tiếng việt",)),
+    ("vo", "vol", "vol", "Volapük", ()),
+    ("wa", "wln", "wln", "Walloon", ()),
+    ("wo", "wol", "wol", "Wolof", ()),
+    ("xh", "xho", "xho", "Xhosa", ()),
+    ("yi", "yid", "yid", "Yiddish", ()),
+    ("yo", "yor", "yor", "Yoruba", ()),
+    ("za", "zha", "zha", "Zhuang", ()),
+    ("zh", "chi", "zho", "Chinese", ("中文", "mandarin")),
+    ("zu", "zul", "zul", "Zulu", ()),
+    # ISO 639-2 only
+    (None, "fil", "fil", "Filipino", ("filipino",)),
+    (None, "yue", "yue", "Cantonese", ("粵語",)),
+]
+
+# Common non-ISO tags seen in release filenames
+EXTRA_ALIASES = {
+    "jp": "jpn",
+    "cn": "chi",
+    "chs": "chi",
+    "cht": "chi",
+    "zhs": "chi",
+    "zht": "chi",
+    "cz": "cze",
+    "gr": "gre",
+    "ua": "ukr",
+    "dk": "dan",
+    "latino": "spa",
+    "castilian": "spa",
+    "ptbr": "por",
+}
+
+# Three-letter codes that are also ordinary English words; only trusted in
+# the trailing tag section of a filename
+AMBIGUOUS_CODES = {
+    "art", "bis", "est", "fin", "hat", "her", "ice", "ido", "kin", "lao",
+    "lit", "mal", "mar", "may", "new", "nor", "per", "run", "sag", "sin", "sun",
+    "tam", "tel", "ton",
+}
+
+
+def fold_accents(text):
+    """'español' -> 'espanol'"""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def _build_tables():
+    """
+    Return (codes, names, by_code):
+    codes maps lowercase ISO codes/aliases to a 639-2/B code,
+    names maps lowercase English/native names to a 639-2/B code,
+    by_code maps a 639-2/B code to its English name.
+    """
+    codes = {}
+    names = {}
+    by_code = {}
+    for alpha2, code_b, code_t, english, natives in LANGUAGES:
+        by_code[code_b] = english
+        for code in (alpha2, code_b, code_t):
+            if code:
+                codes[code] = code_b
+        for name in (english,) + tuple(natives):
+            name = name.lower()
+            names[name] = code_b
+            names.setdefault(fold_accents(name), code_b)
+    for alias, code_b in EXTRA_ALIASES.items():
+        codes.setdefault(alias, code_b)
+    return codes, names, by_code
+
+
+LANGUAGE_CODES, LANGUAGE_NAMES, LANGUAGE_TITLES = _build_tables()
@@ -0,0 +1,164 @@
+"""
+Recursive library scanner.
+Walks folder trees with several os.scandir workers at once (NAS shares are
+latency-bound, not CPU-bound), applies the user's filters and yields video
+files as soon as each directory has been read, so encoding can start while
+the rest of the library is still being scanned.
+"""
+
+import fnmatch
+import glob
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from media_probe import probe_media
+from output_files import is_temp_output
+from subtitles import VIDEO_EXTENSIONS
+
+
+# Directory names that hold our own outputs or work files
+OUTPUT_DIR_NAMES = {"converted"}
+
+DEFAULT_SCAN_WORKERS = 8
+
+
+def _matches_any(rel_path, name, patterns):
+    """Patterns containing a slash match the path relative to the root, others the file name"""
+    for pattern in patterns:
+        target = rel_path if "/" in pattern else name
+        if fnmatch.fnmatch(target.lower(), pattern.lower()):
+            return True
+    return False
+
+
+class ScanFilter:
+    """Which files a scan should return"""
+
+    def __init__(self, include=(), exclude=(), min_size=0, skip_av1=False,
+                 extensions=VIDEO_EXTENSIONS):
+        self.include = list(include)
+        self.exclude = list(exclude)
+        self.min_size = min_size
+        # Probes each candidate, so only enable it when asked for
+        self.skip_av1 = skip_av1
+        self.extensions = {ext.lower() for ext in extensions}
+
+    def accepts(self, rel_path, name, size):
+        """Cheap checks on the directory entry alone"""
+        if os.path.splitext(name)[1].lower() not in self.extensions:
+            return False
+        if is_temp_output(name):
+            return False  # another run's unfinished output
+        if size < self.min_size:
+            return False
+        if self.include and not _matches_any(rel_path, name, self.include):
+            return False
+        if self.exclude and _matches_any(rel_path, name, self.exclude):
+            return False
+        return True
+
+    def accepts_media(self, path):
+        """Checks that need the file's metadata"""
+        if not self.skip_av1:
+            return True
+        try:
+            return probe_media(path).video_codec != "av1"
+        except Exception:
+            return True  # let the encode report unreadable files
+
+
+def expand_inputs(paths):
+    """
+    Expand command-line style inputs (files, folders, glob patterns) into
+    (files, folders). Explicitly named files are kept whatever their extension.
+    """
+    files = []
+    folders = []
+    for item in paths:
+        matches = glob.glob(item) if glob.has_magic(item) else [item]
+        for match in sorted(matches):
+            path = os.path.abspath(match)
+            if os.path.isdir(path):
+                folders.append(path)
+            elif os.path.isfile(path):
+                files.append(path)
+    return files, folders
+
+
+def _skip_dir(name):
+    return name.startswith(".") or name.lower() in OUTPUT_DIR_NAMES
+
+
+class LibraryScanner:
+    """
+    Scans folders with a pool of scandir workers.
+    Use scan() as a generator, or scan_into(callback) from a background thread;
+    stop() ends a scan early.
+    """
+
+    def __init__(self, filters=None, workers=DEFAULT_SCAN_WORKERS, recursive=True):
+        self.filters = filters or ScanFilter()
+        self.workers = max(1, workers)
+        self.recursive = recursive
+        self.errors = []
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _read_dir(self, root, directory):
+        """Worker task: list one directory, returning (accepted files, subdirectories)"""
+        files = []
+        subdirs = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if self._stopped.is_set():
+                        break
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if self.recursive and not _skip_dir(entry.name):
+                                subdirs.append(entry.path)
+                        elif entry.is_file():
+                            rel_path = os.path.relpath(entry.path, root).replace(os.sep, "/")
+                            if self.filters.accepts(rel_path, entry.name, entry.stat().st_size):
+                                files.append(entry.path)
+                    except OSError as e:
+                        self.errors.append((entry.path, str(e)))
+        except OSError as e:
+            self.errors.append((directory, str(e)))
+        files = [path for path in sorted(files) if self.filters.accepts_media(path)]
+        return files, sorted(subdirs)
+
+    def scan(self, roots):
+        """Yield absolute paths of matching files; each path is yielded once"""
+        seen = set()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            # future -> the root its directory belongs to (for relative-path globs)
+            running = {}
+            for root in roots:
+                root = os.path.abspath(root)
+                if os.path.isdir(root):
+                    running[pool.submit(self._read_dir, root, root)] = root
+            while running and not self._stopped.is_set():
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    root = running.pop(future)
+                    files, subdirs = future.result()
+                    for subdir in subdirs:
+                        running[pool.submit(self._read_dir, root, subdir)] = root
+                    for path in files:
+                        if path not in seen:
+                            seen.add(path)
+                            yield path
+            for future in running:
+                future.cancel()
+
+    def scan_into(self, roots, on_found):
+        """Run a scan, calling on_found(path) for each match; returns the count"""
+        count = 0
+        for path in self.scan(roots):
+            on_found(path)
+            count += 1
+        return count
@@ -0,0 +1,409 @@
+"""
+Load-aware concurrency.
+Instead of a fixed number of parallel encodes, the scheduler asks an
+AdmissionController before starting each queued job. The controller samples
+CPU, memory, disk and NVENC utilization in the background and only lets
+another job start while every one of them has headroom, so CPU encoders,
+GPU encoders and slow disks each settle at the concurrency they can sustain.
+ProcessLimits lowers the CPU/IO priority of every ffmpeg child and caps its
+threads, so concurrent jobs share the machine without making it unusable.
+"""
+
+import ctypes
+import math
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+from ffmpeg_utils import CREATE_NO_WINDOW
+
+
+# Upper bound on concurrent jobs chosen automatically
+MAX_AUTO_JOBS = 8
+# Consumer GPUs limit concurrent NVENC sessions; stay below that
+MAX_HARDWARE_JOBS = 3
+
+DEFAULT_NICE = 10
+
+GIB = 1024 ** 3
+
+
+class LoadSample:
+    """One measurement; fields are 0-1 fractions (or bytes), None if unknown"""
+
+    def __init__(self, cpu=None, memory_available=None, memory_total=None, disk=None, gpu_encoder=None):
+        self.cpu = cpu
+        self.memory_available = memory_available
+        self.memory_total = memory_total
+        self.disk = disk                  # busiest physical disk
+        self.gpu_encoder = gpu_encoder    # busiest NVENC engine
+
+    def describe(self):
+        parts = []
+        if self.cpu is not None:
+            parts.append(f"CPU {self.cpu:.0%}")
+        if self.memory_available is not None:
+            parts.append(f"{self.memory_available / GIB:.1f} GiB free")
+        if self.disk is not None:
+            parts.append(f"disk {self.disk:.0%}")
+        if self.gpu_encoder is not None:
+            parts.append(f"NVENC {self.gpu_encoder:.0%}")
+        return ", ".join(parts) or "no measurements"
+
+    def __repr__(self):
+        return f"LoadSample({self.describe()})"
+
+
+# Samplers -------------------------------------------------------------------
+
+def _read_proc_stat():
+    """(busy, total) jiffies across all CPUs"""
+    with open("/proc/stat", encoding="ascii") as f:
+        values = [int(value) for value in f.readline().split()[1:]]
+    idle = values[3] + (values[4] if len(values) > 4 else 0)  # idle + iowait
+    total = sum(values[:8])  # guest time is already counted in user
+    return total - idle, total
+
+
+def _read_meminfo():
+    fields = {}
+    with open("/proc/meminfo", encoding="ascii") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if name in ("MemTotal", "MemAvailable"):
+                fields[name] = int(value.split()[0]) * 1024
+    return fields.get("MemAvailable"), fields.get("MemTotal")
+
+
+def _physical_disks():
+    try:
+        names = os.listdir("/sys/block")
+    except OSError:
+        return set()
+    return {name for name in names if not name.startswith(("loop", "ram", "zram", "dm-", "md", "sr"))}
+
+
+def _read_diskstats(disks):
+    """{disk: milliseconds spent doing I/O}"""
+    ticks = {}
+    with open("/proc/diskstats", encoding="ascii") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 13 and parts[2] in disks:
+                ticks[parts[2]] = int(parts[12])
+    return ticks
+
+
+class _FILETIME(ctypes.Structure):
+    _fields_ = [("low", ctypes.c_uint32), ("high", ctypes.c_uint32)]
+
+    @property
+    def value(self):
+        return (self.high << 32) | self.low
+
+
+class _MEMORYSTATUSEX(ctypes.Structure):
+    _fields_ = [
+        ("dwLength", ctypes.c_uint32),
+        ("dwMemoryLoad", ctypes.c_uint32),
+        ("ullTotalPhys", ctypes.c_uint64),
+        ("ullAvailPhys", ctypes.c_uint64),
+        ("ullTotalPageFile", ctypes.c_uint64),
+        ("ullAvailPageFile", ctypes.c_uint64),
+        ("ullTotalVirtual", ctypes.c_uint64),
+        ("ullAvailVirtual", ctypes.c_uint64),
+        ("ullAvailExtendedVirtual", ctypes.c_uint64),
+    ]
+
+
+def _windows_cpu_times():
+    idle, kernel, user = _FILETIME(), _FILETIME(), _FILETIME()
+    ctypes.windll.kernel32.GetSystemTimes(ctypes.byref(idle), ctypes.byref(kernel), ctypes.byref(user))
+    total = kernel.value + user.value  # kernel time includes idle time
+    return total - idle.value, total
+
+
+def _windows_memory():
+    status = _MEMORYSTATUSEX()
+    status.dwLength = ctypes.sizeof(_MEMORYSTATUSEX)
+    if not ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+        return None, None
+    return status.ullAvailPhys, status.ullTotalPhys
+
+
+def query_nvenc_utilization(nvidia_smi):
+    """Highest encoder utilization (0-1) across NVIDIA GPUs, or None"""
+    try:
+        result = subprocess.run(
+            [nvidia_smi, "--query-gpu=utilization.encoder", "--format=csv,noheader,nounits"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+            timeout=5,
+            creationflags=CREATE_NO_WINDOW,
+        )
+    except (subprocess.TimeoutExpired, OSError):
+        return None
+    values = [int(line) for line in result.stdout.split() if line.strip().isdigit()]
+    return max(values) / 100 if values else None
+
+
+class SystemSampler:
+    """
+    Measures system load. CPU and disk figures are averages since the
+    previous sample() call, so call it at a steady interval.
+    """
+
+    def __init__(self, gpu=True):
+        self._last_cpu = None
+        self._last_disk = None
+        self._last_time = None
+        self._disks = _physical_disks() if sys.platform.startswith("linux") else set()
+        self._nvidia_smi = shutil.which("nvidia-smi") if gpu else None
+
+    def _cpu_times(self):
+        if sys.platform.startswith("linux"):
+            return _read_proc_stat()
+        if os.name == "nt":
+            return _windows_cpu_times()
+        return None
+
+    def sample(self):
+        now = time.monotonic()
+        cpu = None
+        try:
+            times = self._cpu_times()
+        except (OSError, ValueError, IndexError, AttributeError):
+            times = None
+        if times is not None:
+            if self._last_cpu is not None and times[1] > self._last_cpu[1]:
+                cpu = (times[0] - self._last_cpu[0]) / (times[1] - self._last_cpu[1])
+            self._last_cpu = times
+        elif hasattr(os, "getloadavg"):
+            # macOS/BSD: the run queue length per core is close enough
+            cpu = min(os.getloadavg()[0] / (os.cpu_count() or 1), 1.0)
+
+        memory_available = memory_total = None
+        try:
+            if sys.platform.startswith("linux"):
+                memory_available, memory_total = _read_meminfo()
+            elif os.name == "nt":
+                memory_available, memory_total = _windows_memory()
+        except (OSError, ValueError):
+            pass
+
+        disk = None
+        if self._disks:
+            try:
+                ticks = _read_diskstats(self._disks)
+            except (OSError, ValueError):
+                ticks = None
+            if ticks and self._last_disk is not None and now > self._last_time:
+                elapsed_ms = (now - self._last_time) * 1000
+                busy = [
+                    (ticks[name] - self._last_disk[name]) / elapsed_ms
+                    for name in ticks if name in self._last_disk
+                ]
+                disk = min(max(busy), 1.0) if busy else None
+            self._last_disk = ticks
+
+        gpu_encoder = query_nvenc_utilization(self._nvidia_smi) if self._nvidia_smi else None
+        self._last_time = now
+        return LoadSample(cpu, memory_available, memory_total, disk, gpu_encoder)
+
+
+# Admission --------------------------------------------------------------------
+
+def default_max_jobs(backend):
+    """Upper bound on concurrent jobs for an encoder backend"""
+    if backend.hardware:
+        return MAX_HARDWARE_JOBS
+    # CPU encoders already use several cores each
+    return max(1, min(MAX_AUTO_JOBS, (os.cpu_count() or 1) // 4))
+
+
+class AdmissionController:
+    """
+    Decides whether the scheduler may start another job.
+
+    At least min_jobs and at most max_jobs run at once; in between, a job is
+    admitted only if CPU, disk and NVENC utilization are below their limits
+    and enough memory would be left over. After each admission the
+    controller waits settle_seconds so the new job's load shows up in the
+    measurements before deciding again.
+    """
+
+    def __init__(self, max_jobs, min_jobs=1, cpu_limit=0.85, disk_limit=0.90, gpu_limit=0.85,
+                 job_memory_bytes=int(1.5 * GIB), memory_reserve_bytes=1 * GIB, interval=2.0,
+                 settle_seconds=15.0, sampler=None, log=None):
+        self.max_jobs = max(1, int(max_jobs))
+        self.min_jobs = max(1, min(int(min_jobs), self.max_jobs))
+        self.cpu_limit = cpu_limit
+        self.disk_limit = disk_limit
+        self.gpu_limit = gpu_limit
+        self.job_memory_bytes = job_memory_bytes
+        self.memory_reserve_bytes = memory_reserve_bytes
+        self.interval = interval
+        self.settle_seconds = settle_seconds
+        self.sampler = sampler or SystemSampler()
+        self.log = log or (lambda message: None)
+        self.sample = None
+        self._last_admit = None
+        self._held_reason = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start sampling in the background"""
+        if self._thread is None:
+            self.sampler.sample()  # baseline for the first CPU/disk delta
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample = self.sampler.sample()
+            except Exception:
+                pass  # keep the last sample; a failed read must not stop admission
+
+    def headroom_problem(self, sample):
+        """(resource, description) that another job would overload, or None if it fits"""
+        if sample.cpu is not None and sample.cpu >= self.cpu_limit:
+            return "cpu", f"CPU at {sample.cpu:.0%}"
+        if sample.memory_available is not None:
+            if sample.memory_available - self.job_memory_bytes < self.memory_reserve_bytes:
+                return "memory", f"only {sample.memory_available / GIB:.1f} GiB of memory free"
+        if sample.disk is not None and sample.disk >= self.disk_limit:
+            return "disk", f"disk busy {sample.disk:.0%}"
+        if sample.gpu_encoder is not None and sample.gpu_encoder >= self.gpu_limit:
+            return "gpu", f"NVENC at {sample.gpu_encoder:.0%}"
+        return None
+
+    def admit(self, running):
+        """True if a job may start now with `running` jobs already running"""
+        if running < self.min_jobs:
+            self._last_admit = time.monotonic()
+            return True
+        if running >= self.max_jobs:
+            return False
+        if self._last_admit is not None and time.monotonic() - self._last_admit < self.settle_seconds:
+            return False
+        sample = self.sample
+        if sample is None:
+            return False
+        problem = self.headroom_problem(sample)
+        if problem is not None:
+            resource, description = problem
+            # Log when the limiting resource changes, not on every check
+            if resource != self._held_reason:
+                self.log(f"Holding further jobs with {running} running: {description}")
+            self._held_reason = resource
+            return False
+        if self._held_reason is not None:
+            self.log(f"Headroom available ({sample.describe()}), starting job {running + 1}")
+            self._held_reason = None
+        self._last_admit = time.monotonic()
+        return True
+
+
+# Per-process limits -------------------------------------------------------------
+
+def threads_per_job(max_jobs):
+    """Thread cap so max_jobs concurrent encodes together fill the CPU, or None for one job"""
+    if max_jobs <= 1:
+        return None
+    return max(2, math.ceil((os.cpu_count() or 1) / max_jobs))
+
+
+def _linux_thread_ids(pid):
+    try:
+        return [int(tid) for tid in os.listdir(f"/proc/{pid}/task")]
+    except (OSError, ValueError):
+        return [pid]
+
+
+class ProcessLimits:
+    """
+    Priority and thread limits for ffmpeg children.
+    nice is the POSIX niceness (0-19, mapped to a priority class on Windows);
+    low_io puts them in the lowest best-effort I/O class on Linux; threads
+    caps encoder and decoder threads (None leaves ffmpeg's default).
+    Without a fixed cap, share_threads divides the CPU between the jobs
+    running when each child starts, so a job running alone is uncapped.
+    """
+
+    def __init__(self, nice=DEFAULT_NICE, low_io=True, threads=None, share_threads=False):
+        self.nice = nice
+        self.low_io = low_io
+        self.threads = threads
+        self.share_threads = share_threads
+        self._ionice = shutil.which("ionice") if low_io and sys.platform.startswith("linux") else None
+
+    def threads_for(self, running):
+        """Thread cap for a child started while `running` jobs (its own included) run, or None"""
+        if self.threads or not self.share_threads:
+            return self.threads
+        return threads_per_job(running)
+
+    def apply(self, pid):
+        """Lower a just-started process's priority; failures are ignored"""
+        if os.name == "nt":
+            self._apply_windows(pid)
+            return
+        # On Linux niceness and I/O priority are per thread, so cover any
+        # threads the process has already started (later ones inherit)
+        tids = _linux_thread_ids(pid) if sys.platform.startswith("linux") else [pid]
+        if self.nice:
+            for tid in tids:
+                try:
+                    if os.getpriority(os.PRIO_PROCESS, tid) < self.nice:
+                        os.setpriority(os.PRIO_PROCESS, tid, self.nice)
+                except OSError:
+                    pass
+        if self._ionice:
+            try:
+                subprocess.run(
+                    [self._ionice, "-c", "2", "-n", "7", "-p"] + [str(tid) for tid in tids],
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                    timeout=5,
+                )
+            except (subprocess.TimeoutExpired, OSError):
+                pass
+
+    def _apply_windows(self, pid):
+        if not self.nice:
+            return
+        PROCESS_SET_INFORMATION = 0x0200
+        IDLE_PRIORITY_CLASS = 0x0040
+        BELOW_NORMAL_PRIORITY_CLASS = 0x4000
+        handle = ctypes.windll.kernel32.OpenProcess(PROCESS_SET_INFORMATION, False, pid)
+        if not handle:
+            return
+        try:
+            priority = IDLE_PRIORITY_CLASS if self.nice >= 15 else BELOW_NORMAL_PRIORITY_CLASS
+            ctypes.windll.kernel32.SetPriorityClass(handle, priority)
+        finally:
+            ctypes.windll.kernel32.CloseHandle(handle)
+
+    def __repr__(self):
+        return (f"ProcessLimits(nice={self.nice}, low_io={self.low_io}, threads={self.threads}, "
+                f"share_threads={self.share_threads})")
+
+
+def auto_concurrency(backend, log=None, nice=DEFAULT_NICE, threads=None):
+    """AdmissionController and ProcessLimits for running a batch on backend"""
+    max_jobs = default_max_jobs(backend)
+    admission = AdmissionController(max_jobs, log=log)
+    limits = ProcessLimits(nice=nice, low_io=nice > 0, threads=threads, share_threads=True)
+    return admission, limits
@@ -0,0 +1,71 @@
+"""
+Thread-safe log plumbing for the GUI.
+Worker threads write lines into a LogBuffer; the Tk thread drains them in
+batches on a timer. Every line also goes to a rotating log file, so the
+on-screen log can stay short without losing history.
+"""
+
+import collections
+import logging
+import logging.handlers
+import threading
+
+from app_paths import app_data_dir
+
+
+# Lines kept in the on-screen log; older ones are only in the log file
+MAX_LOG_LINES = 2000
+LOG_FILE_BYTES = 5 * 1024 * 1024
+LOG_FILE_BACKUPS = 3
+
+
+def default_log_path():
+    log_dir = app_data_dir() / "logs"
+    log_dir.mkdir(exist_ok=True)
+    return log_dir / "converter.log"
+
+
+class LogBuffer:
+    """
+    Collects log lines from any thread.
+    drain() hands back everything written since the last call; if the UI
+    falls far behind, only the newest max_pending lines are kept.
+    """
+
+    def __init__(self, log_path=None, max_pending=MAX_LOG_LINES):
+        self._lock = threading.Lock()
+        self._pending = collections.deque(maxlen=max_pending)
+        self._dropped = 0
+        self.log_path = log_path or default_log_path()
+
+        # A private logger so nothing else in the process writes to our file
+        self._logger = logging.Logger("av1converter.gui")
+        handler = logging.handlers.RotatingFileHandler(
+            self.log_path,
+            maxBytes=LOG_FILE_BYTES,
+            backupCount=LOG_FILE_BACKUPS,
+            encoding="utf-8",
+        )
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        self._logger.addHandler(handler)
+
+    def write(self, message):
+        self._logger.info(message)
+        with self._lock:
+            if len(self._pending) == self._pending.maxlen:
+                self._dropped += 1
+            self._pending.append(message)
+
+    def drain(self):
+        """Return (lines, dropped) and clear the pending buffer"""
+        with self._lock:
+            lines = list(self._pending)
+            dropped = self._dropped
+            self._pending.clear()
+            self._dropped = 0
+        return lines, dropped
+
+    def close(self):
+        for handler in list(self._logger.handlers):
+            handler.close()
+            self._logger.removeHandler(handler)
@@ -0,0 +1,365 @@
+"""
+Header-only media probing with an on-disk cache.
+Reads container metadata via ffprobe (or `ffmpeg -i` with no output as a
+fallback) so nothing is decoded just to learn a file's duration.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import subprocess
+import threading
+from pathlib import Path
+
+from app_paths import app_data_dir
+from ffmpeg_utils import CREATE_NO_WINDOW, find_ffmpeg, find_ffprobe
+
+
+class ProbeError(Exception):
+    """Raised when a file's metadata cannot be read"""
+
+
+def _parse_rate(value):
+    """Convert an ffprobe rate such as '24000/1001' to a float"""
+    if not value:
+        return None
+    try:
+        if "/" in value:
+            num, den = value.split("/", 1)
+            den = float(den)
+            return float(num) / den if den else None
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class StreamInfo:
+    """A single stream inside a media container"""
+
+    FIELDS = (
+        "index", "codec_type", "codec_name", "language", "title",
+        "width", "height", "frame_rate", "channels", "bit_rate", "disposition", "pix_fmt",
+    )
+
+    def __init__(self, index, codec_type, codec_name=None, language=None, title=None,
+                 width=None, height=None, frame_rate=None, channels=None,
+                 bit_rate=None, disposition=None, pix_fmt=None):
+        self.index = index
+        self.codec_type = codec_type
+        self.codec_name = codec_name
+        self.language = language
+        self.title = title
+        self.width = width
+        self.height = height
+        self.frame_rate = frame_rate
+        self.channels = channels
+        self.bit_rate = bit_rate
+        self.disposition = disposition or {}
+        self.pix_fmt = pix_fmt
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{field: data.get(field) for field in cls.FIELDS})
+
+    def __repr__(self):
+        return f"StreamInfo({self.index}, {self.codec_type}, {self.codec_name})"
+
+
+class MediaInfo:
+    """Container-level metadata plus the stream layout of a media file"""
+
+    def __init__(self, path, duration=0.0, size=None, bit_rate=None, format_name=None, streams=None):
+        self.path = str(path)
+        self.duration = duration or 0.0
+        self.size = size
+        self.bit_rate = bit_rate
+        self.format_name = format_name
+        self.streams = streams or []
+
+    def streams_of(self, codec_type):
+        return [s for s in self.streams if s.codec_type == codec_type]
+
+    @property
+    def video_streams(self):
+        # Cover art is exposed as a video stream; it is not the main video
+        return [
+            s for s in self.streams_of("video")
+            if not s.disposition.get("attached_pic")
+        ]
+
+    @property
+    def audio_streams(self):
+        return self.streams_of("audio")
+
+    @property
+    def subtitle_streams(self):
+        return self.streams_of("subtitle")
+
+    @property
+    def video(self):
+        """The primary video stream, or None for audio-only files"""
+        streams = self.video_streams
+        return streams[0] if streams else None
+
+    @property
+    def video_codec(self):
+        return self.video.codec_name if self.video else None
+
+    @property
+    def resolution(self):
+        if self.video and self.video.width and self.video.height:
+            return (self.video.width, self.video.height)
+        return None
+
+    @property
+    def frame_rate(self):
+        return self.video.frame_rate if self.video else None
+
+    def to_dict(self):
+        return {
+            "path": self.path,
+            "duration": self.duration,
+            "size": self.size,
+            "bit_rate": self.bit_rate,
+            "format_name": self.format_name,
+            "streams": [s.to_dict() for s in self.streams],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["path"],
+            duration=data.get("duration"),
+            size=data.get("size"),
+            bit_rate=data.get("bit_rate"),
+            format_name=data.get("format_name"),
+            streams=[StreamInfo.from_dict(s) for s in data.get("streams", [])],
+        )
+
+    def __repr__(self):
+        return f"MediaInfo({os.path.basename(self.path)!r}, {self.duration:.2f}s, {len(self.streams)} streams)"
+
+
+def _probe_with_ffprobe(path, ffprobe_path):
+    """Read metadata using ffprobe's JSON writer"""
+    cmd = [
+        ffprobe_path,
+        "-v", "error",
+        "-print_format", "json",
+        "-show_format",
+        "-show_streams",
+        str(path),
+    ]
+    result = subprocess.run(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        encoding="utf-8",
+        errors="replace",
+        creationflags=CREATE_NO_WINDOW,
+    )
+    if result.returncode != 0:
+        raise ProbeError(result.stderr.strip() or f"ffprobe exited with code {result.returncode}")
+
+    data = json.loads(result.stdout or "{}")
+    fmt = data.get("format", {})
+    streams = []
+    for s in data.get("streams", []):
+        tags = s.get("tags", {})
+        rate = _parse_rate(s.get("avg_frame_rate")) or _parse_rate(s.get("r_frame_rate"))
+        streams.append(StreamInfo(
+            index=s.get("index"),
+            codec_type=s.get("codec_type"),
+            codec_name=s.get("codec_name"),
+            language=tags.get("language"),
+            title=tags.get("title"),
+            width=_to_int(s.get("width")),
+            height=_to_int(s.get("height")),
+            frame_rate=rate if s.get("codec_type") == "video" else None,
+            channels=_to_int(s.get("channels")),
+            bit_rate=_to_int(s.get("bit_rate")),
+            disposition={k: v for k, v in s.get("disposition", {}).items() if v},
+            pix_fmt=s.get("pix_fmt"),
+        ))
+
+    duration = float(fmt.get("duration", 0) or 0)
+    return MediaInfo(
+        path,
+        duration=duration,
+        size=_to_int(fmt.get("size")),
+        bit_rate=_to_int(fmt.get("bit_rate")),
+        format_name=fmt.get("format_name"),
+        streams=streams,
+    )
+
+
+_DURATION_RE = re.compile(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)(?:.*?bitrate: (\d+) kb/s)?")
+_STREAM_RE = re.compile(r"Stream #\d+:(\d+)(?:\[\w+\])?(?:\((\w+)\))?: (Video|Audio|Subtitle|Data|Attachment): (\w+)(.*)")
+_SIZE_RE = re.compile(r"\b(\d{2,5})x(\d{2,5})\b")
+_FPS_RE = re.compile(r"([\d.]+) (?:fps|tbr)")
+_PIX_FMT_RE = re.compile(r"\b(yuvj?4[0-4][0-4]p\w*|nv12|p010le|gray\w*)\b")
+_CHANNELS_RE = re.compile(r"\b(mono|stereo|5\.1|7\.1)\b")
+_CHANNEL_COUNTS = {"mono": 1, "stereo": 2, "5.1": 6, "7.1": 8}
+
+
+def _probe_with_ffmpeg(path, ffmpeg_path):
+    """
+    Read metadata from `ffmpeg -i` with no output target.
+    ffmpeg prints the input summary and exits without decoding anything.
+    """
+    result = subprocess.run(
+        [ffmpeg_path, "-hide_banner", "-i", str(path)],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        universal_newlines=True,
+        encoding="utf-8",
+        errors="replace",
+        creationflags=CREATE_NO_WINDOW,
+    )
+    output = result.stdout
+
+    duration_match = _DURATION_RE.search(output)
+    if not duration_match:
+        raise ProbeError(output.strip().splitlines()[-1] if output.strip() else "No media information found")
+
+    hours, minutes, seconds, bitrate = duration_match.groups()
+    duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+    streams = []
+    for match in _STREAM_RE.finditer(output):
+        index, language, kind, codec, details = match.groups()
+        stream = StreamInfo(
+            index=int(index),
+            codec_type=kind.lower(),
+            codec_name=codec,
+            language=language if language and language != "und" else None,
+        )
+        if kind == "Video":
+            size = _SIZE_RE.search(details)
+            if size:
+                stream.width, stream.height = int(size.group(1)), int(size.group(2))
+            fps = _FPS_RE.search(details)
+            if fps:
+                stream.frame_rate = float(fps.group(1))
+            pix_fmt = _PIX_FMT_RE.search(details)
+            if pix_fmt:
+                stream.pix_fmt = pix_fmt.group(1)
+            if "(attached pic)" in details:
+                stream.disposition["attached_pic"] = 1
+        elif kind == "Audio":
+            channels = _CHANNELS_RE.search(details)
+            if channels:
+                stream.channels = _CHANNEL_COUNTS[channels.group(1)]
+        if "(default)" in details:
+            stream.disposition["default"] = 1
+        if "(forced)" in details:
+            stream.disposition["forced"] = 1
+        streams.append(stream)
+
+    return MediaInfo(
+        path,
+        duration=duration,
+        size=os.path.getsize(path),
+        bit_rate=int(bitrate) * 1000 if bitrate else None,
+        streams=streams,
+    )
+
+
+class ProbeCache:
+    """
+    Disk-backed cache of probe results.
+    Entries are keyed by absolute path, size and mtime, so an edited or
+    replaced file is automatically probed again.
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = Path(db_path) if db_path else app_data_dir() / "probe_cache.sqlite3"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS probe ("
+            " path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, data TEXT)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _key(path):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        return path, stat.st_size, stat.st_mtime_ns
+
+    def get(self, path):
+        """Return the cached MediaInfo for path, or None if missing or stale"""
+        key_path, size, mtime_ns = self._key(path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM probe WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (key_path, size, mtime_ns),
+            ).fetchone()
+        if row is None:
+            return None
+        return MediaInfo.from_dict(json.loads(row[0]))
+
+    def put(self, path, info):
+        key_path, size, mtime_ns = self._key(path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO probe (path, size, mtime_ns, data) VALUES (?, ?, ?, ?)",
+                (key_path, size, mtime_ns, json.dumps(info.to_dict())),
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_probe_cache():
+    """Return the shared process-wide probe cache"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ProbeCache()
+        return _default_cache
+
+
+def probe_media(path, use_cache=True):
+    """
+    Probe a media file's container metadata.
+    Returns a MediaInfo; raises ProbeError if the file can't be read.
+    """
+    path = str(path)
+    cache = get_probe_cache() if use_cache else None
+    if cache is not None:
+        cached = cache.get(path)
+        if cached is not None:
+            return cached
+
+    ffprobe_path = find_ffprobe()
+    if ffprobe_path:
+        info = _probe_with_ffprobe(path, ffprobe_path)
+    else:
+        ffmpeg_path = find_ffmpeg()
+        if not ffmpeg_path:
+            raise ProbeError("Neither ffprobe nor ffmpeg could be found")
+        info = _probe_with_ffmpeg(path, ffmpeg_path)
+
+    if cache is not None:
+        cache.put(path, info)
+    return info
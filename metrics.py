@@ -0,0 +1,210 @@
+"""
+Run telemetry.
+job_metrics() condenses a finished EncodeJob into one flat record (probe
+time, queue wait, encode wall time, average fps/speed, sizes, exit code);
+RunReport appends those records to a JSONL or CSV file as jobs finish.
+MetricsServer exposes live scheduler gauges over HTTP in the Prometheus
+text format, so headless nodes can be scraped or just curl'ed.
+"""
+
+import csv
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from scheduler import FINISHED_STATES, ENCODING, QUEUED
+
+
+DEFAULT_METRICS_HOST = "127.0.0.1"
+
+REPORT_FIELDS = [
+    "index", "input", "output", "state", "attempts", "retries",
+    "queue_wait", "probe_seconds", "encode_seconds", "media_duration",
+    "frames", "avg_fps", "avg_speed", "input_bytes", "output_bytes",
+    "compression_ratio", "exit_code", "error", "finished_at",
+]
+
+
+def _round(value, digits=3):
+    return round(value, digits) if value is not None else None
+
+
+def job_metrics(job):
+    """Flat dict of REPORT_FIELDS for a job (finished or not)"""
+    encode_seconds = None
+    if job.encode_started_at is not None:
+        end = job.finished_at if job.is_finished and job.finished_at else time.time()
+        encode_seconds = max(end - job.encode_started_at, 0)
+
+    avg_fps = avg_speed = None
+    if encode_seconds:
+        if job.frames:
+            avg_fps = job.frames / encode_seconds
+        if job.media_duration:
+            avg_speed = job.media_duration / encode_seconds
+
+    ratio = None
+    if job.input_bytes and job.output_bytes:
+        ratio = job.input_bytes / job.output_bytes
+
+    return {
+        "index": job.index,
+        "input": job.input_path,
+        "output": job.output_path,
+        "state": job.state,
+        "attempts": job.attempts,
+        "retries": max(job.attempts - 1, 0),
+        "queue_wait": _round(job.queue_wait),
+        "probe_seconds": _round(job.probe_seconds),
+        "encode_seconds": _round(encode_seconds),
+        "media_duration": _round(job.media_duration),
+        "frames": job.frames,
+        "avg_fps": _round(avg_fps, 2),
+        "avg_speed": _round(avg_speed, 3),
+        "input_bytes": job.input_bytes,
+        "output_bytes": job.output_bytes,
+        "compression_ratio": _round(ratio, 3),
+        "exit_code": job.exit_code,
+        "error": job.error,
+        "finished_at": _round(job.finished_at),
+    }
+
+
+class RunReport:
+    """
+    Appends one record per finished job to path; .csv gets CSV with a
+    header row, anything else JSON lines. Call add() from on_update.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.csv = os.path.splitext(path)[1].lower() == ".csv"
+        self._lock = threading.Lock()
+        self._written = set()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", newline="" if self.csv else None, encoding="utf-8")
+        self._writer = None
+        if self.csv:
+            self._writer = csv.DictWriter(self._file, fieldnames=REPORT_FIELDS, extrasaction="ignore")
+            if self._file.tell() == 0:
+                self._writer.writeheader()
+
+    def add(self, job):
+        """Write job's record once it has finished; earlier updates are ignored"""
+        if job.state not in FINISHED_STATES:
+            return None
+        return self.add_record(job.index, job_metrics(job))
+
+    def add_record(self, key, record):
+        """Write record unless one was already written for key"""
+        with self._lock:
+            if key in self._written or self._file.closed:
+                return None
+            self._written.add(key)
+            if self._writer is not None:
+                self._writer.writerow(record)
+            else:
+                self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+        return record
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_metrics(scheduler):
+    """Prometheus text exposition of the scheduler's current state"""
+    active = scheduler.active_jobs()
+    encoding = [job for job in active if job.state == ENCODING and job.stats is not None]
+    counts = scheduler.counts()
+    jobs = list(scheduler.jobs)
+    finished = [job for job in jobs if job.is_finished]
+
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP av1converter_{name} {help_text}")
+        lines.append(f"# TYPE av1converter_{name} {kind}")
+        for labels, value in samples:
+            if labels:
+                text = ",".join(f'{key}="{_label(val)}"' for key, val in labels.items())
+                lines.append(f"av1converter_{name}{{{text}}} {value}")
+            else:
+                lines.append(f"av1converter_{name} {value}")
+
+    metric("active_jobs", "gauge", "Jobs probing or encoding", [(None, len(active))])
+    metric("paused_jobs", "gauge", "Running jobs whose ffmpeg children are suspended",
+           [(None, sum(1 for job in active if job.paused))])
+    metric("queue_depth", "gauge", "Jobs waiting to start, including delayed retries",
+           [(None, scheduler.queue_depth())])
+    metric("slots", "gauge", "Parallel job limit", [(None, scheduler.slots)])
+    metric("fps", "gauge", "Combined frames per second of running encodes",
+           [(None, round(sum(job.stats.fps or 0 for job in encoding), 2))])
+    metric("speed", "gauge", "Combined realtime factor of running encodes",
+           [(None, round(sum(job.stats.speed or 0 for job in encoding), 3))])
+    metric("overall_progress", "gauge", "Batch progress from 0 to 1",
+           [(None, round(scheduler.overall_progress(), 4))])
+    states = [QUEUED] + [state for state in counts if state != QUEUED]
+    metric("jobs", "gauge", "Jobs in each state",
+           [({"state": state}, counts.get(state, 0)) for state in dict.fromkeys(states)])
+    metric("input_bytes_total", "counter", "Source bytes of finished jobs",
+           [(None, sum(job.input_bytes or 0 for job in finished))])
+    metric("output_bytes_total", "counter", "Output bytes of finished jobs",
+           [(None, sum(job.output_bytes or 0 for job in finished))])
+    metric("retries_total", "counter", "Extra attempts made after transient failures",
+           [(None, sum(max(job.attempts - 1, 0) for job in jobs))])
+    metric("job_progress", "gauge", "Progress of each running job",
+           [({"input": job.input_path}, round(job.progress, 4)) for job in active])
+    metric("job_fps", "gauge", "Frames per second of each running encode",
+           [({"input": job.input_path}, job.stats.fps or 0) for job in encoding])
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render_metrics(self.server.scheduler).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes would otherwise be printed to stderr every few seconds
+        pass
+
+
+class MetricsServer:
+    """Serves /metrics for a scheduler from a daemon thread"""
+
+    def __init__(self, scheduler, port, host=DEFAULT_METRICS_HOST):
+        self._server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        self._server.daemon_threads = True
+        self._server.scheduler = scheduler
+        self._thread = None
+
+    @property
+    def address(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,121 @@
+"""
+Crash-safe output files.
+Encodes are written to a hidden temp name next to the final output and only
+renamed into place once verified and flushed to disk, so a killed run never
+leaves a truncated file under the real name. The temp name carries the host
+and process id, which lets a later run tell its own work apart from the
+leftovers of a crashed one.
+"""
+
+import ctypes
+import os
+import re
+import socket
+import time
+from pathlib import Path
+
+
+TEMP_MARKER = ".converting-"
+
+# Temp files from another machine (shared output folders) can't be checked by
+# pid; a running encode rewrites its file constantly, so one this old is dead
+STALE_SECONDS = 60 * 60
+
+_TEMP_RE = re.compile(r'^\.(?P<name>.+)\.converting-(?P<host>[A-Za-z0-9]*)-(?P<pid>\d+)(?P<ext>\.[^.]+)$')
+
+
+def host_tag():
+    """This machine's name reduced to characters safe in a file name"""
+    return re.sub(r'[^A-Za-z0-9]', '', socket.gethostname())[:32]
+
+
+def temp_output_path(output_path):
+    """Hidden temp name in the same directory (same filesystem, so the rename is atomic)"""
+    output_path = Path(output_path)
+    return output_path.with_name(
+        f".{output_path.stem}{TEMP_MARKER}{host_tag()}-{os.getpid()}{output_path.suffix}"
+    )
+
+
+def is_temp_output(name):
+    return _TEMP_RE.match(name) is not None
+
+
+def pid_alive(pid):
+    """True if a process with this id is running on this machine"""
+    if pid == os.getpid():
+        return True
+    if os.name == "nt":
+        PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+        handle = ctypes.windll.kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return False
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, owned by someone else
+    return True
+
+
+def is_orphan(path):
+    """True if path is a temp output whose writer is no longer running"""
+    match = _TEMP_RE.match(os.path.basename(path))
+    if match is None:
+        return False
+    if match.group("host") == host_tag():
+        return not pid_alive(int(match.group("pid")))
+    try:
+        return time.time() - os.path.getmtime(path) > STALE_SECONDS
+    except OSError:
+        return False
+
+
+def fsync_file(path):
+    with open(path, "rb") as f:
+        os.fsync(f.fileno())
+
+
+def _fsync_dir(directory):
+    """Persist a rename; directories can't be opened for this on Windows"""
+    if os.name == "nt":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def commit_output(temp_path, output_path):
+    """Flush temp_path to disk and atomically rename it to output_path"""
+    fsync_file(temp_path)
+    os.replace(temp_path, output_path)
+    _fsync_dir(os.path.dirname(os.path.abspath(output_path)))
+
+
+def discard(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def sweep_orphans(directory, log=None):
+    """Delete orphaned temp outputs in directory; returns the paths removed"""
+    removed = []
+    try:
+        with os.scandir(directory) as entries:
+            paths = [entry.path for entry in entries if entry.is_file() and is_temp_output(entry.name)]
+    except OSError:
+        return removed
+    for path in paths:
+        if is_orphan(path):
+            discard(path)
+            removed.append(path)
+            if log:
+                log(f"Removed unfinished output from an interrupted run: {path}")
+    return removed
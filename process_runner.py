@@ -0,0 +1,309 @@
+"""
+ffmpeg children on one asyncio event loop.
+ProcessRunner starts every ffmpeg child of a batch as an asyncio subprocess
+on a single loop thread, which reads their progress and stderr, watches
+for stalls and delivers signals. The slot thread that asked for a run only
+waits for its events, so no reader threads are started per process.
+A run with a -progress channel whose out_time and frame count stop
+advancing for stall_seconds is killed and reported as stalled. Paused
+children (SIGSTOP/SIGCONT, NtSuspendProcess on Windows) don't stall.
+"""
+
+import asyncio
+import collections
+import ctypes
+import os
+import queue
+import signal
+import subprocess
+import threading
+import time
+
+from ffmpeg_progress import ProgressParser, is_transient_failure
+from ffmpeg_utils import CREATE_NO_WINDOW
+
+
+# Seconds without progress before a child counts as hung (0 disables)
+DEFAULT_STALL_SECONDS = 300
+
+# Longest single stdout/stderr line accepted from a child
+LINE_LIMIT = 1024 * 1024
+
+# Seconds to keep reading after a child exits, in case something it
+# started still holds its pipes open
+PIPE_GRACE_SECONDS = 2
+
+
+def _windows_suspend(pid, function):
+    PROCESS_SUSPEND_RESUME = 0x0800
+    handle = ctypes.windll.kernel32.OpenProcess(PROCESS_SUSPEND_RESUME, False, pid)
+    if not handle:
+        raise OSError(f"Cannot open process {pid}")
+    try:
+        getattr(ctypes.windll.ntdll, function)(handle)
+    finally:
+        ctypes.windll.kernel32.CloseHandle(handle)
+
+
+def suspend_process(pid):
+    """Stop a process in place until resume_process()"""
+    if os.name == "nt":
+        _windows_suspend(pid, "NtSuspendProcess")
+    else:
+        os.kill(pid, signal.SIGSTOP)
+
+
+def resume_process(pid):
+    if os.name == "nt":
+        _windows_suspend(pid, "NtResumeProcess")
+    else:
+        os.kill(pid, signal.SIGCONT)
+
+
+class _ChildProtocol(asyncio.subprocess.SubprocessStreamProtocol):
+    """Resolves `exited` when the child exits; Process.wait() also waits for its pipes to close"""
+
+    def __init__(self, limit, loop):
+        super().__init__(limit=limit, loop=loop)
+        self.exited = loop.create_future()
+
+    def process_exited(self):
+        super().process_exited()
+        if not self.exited.done():
+            self.exited.set_result(None)
+
+
+class ProcessResult:
+    """How a run ended: exit code, the last stderr lines and whether it was killed as stalled"""
+
+    def __init__(self, returncode, lines, stalled=False):
+        self.returncode = returncode
+        self.lines = lines
+        self.stalled = stalled
+
+    @property
+    def stderr(self):
+        return "\n".join(self.lines)
+
+    def last_error(self):
+        """The most relevant recent line, preferring ones that mention an error"""
+        for line in reversed(self.lines):
+            if 'error' in line.lower():
+                return line
+        return self.lines[-1] if self.lines else None
+
+    def is_transient(self):
+        return is_transient_failure(self.lines)
+
+
+class ProcessHandle:
+    """
+    A child started by ProcessRunner. Offers the part of subprocess.Popen
+    the scheduler relies on (pid, poll, wait, terminate, kill) plus
+    pause/resume; every method may be called from any thread.
+    """
+
+    def __init__(self, loop, transport, protocol, cmd):
+        self.pid = transport.get_pid()
+        self.args = cmd
+        self.returncode = None
+        self.paused = False
+        self.stalled = False
+        # Last time the child made progress (or was resumed); read by the watchdog
+        self.active_at = time.monotonic()
+        self._loop = loop
+        self._transport = transport
+        self._protocol = protocol
+        self._process = asyncio.subprocess.Process(transport, protocol, loop)
+        self._exited = threading.Event()
+        self._reaper = None
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self, timeout=None):
+        if not self._exited.wait(timeout):
+            raise subprocess.TimeoutExpired(self.args, timeout)
+        return self.returncode
+
+    def send_signal(self, sig):
+        self._call(self._process.send_signal, sig)
+
+    def terminate(self):
+        self._call(self._process.terminate)
+        # A stopped process only acts on the signal once it runs again
+        self.resume()
+
+    def kill(self):
+        self._call(self._process.kill)
+
+    def pause(self):
+        if self.paused or self.returncode is not None:
+            return
+        try:
+            suspend_process(self.pid)
+        except OSError:
+            return
+        self.paused = True
+
+    def resume(self):
+        if not self.paused:
+            return
+        self.paused = False
+        self.active_at = time.monotonic()
+        try:
+            resume_process(self.pid)
+        except OSError:
+            pass
+
+    def _call(self, method, *args):
+        if self.returncode is None:
+            self._loop.call_soon_threadsafe(self._signal, method, *args)
+
+    def _signal(self, method, *args):
+        # Runs on the loop, where the child can't be reaped mid-call
+        if self._process.returncode is None:
+            try:
+                method(*args)
+            except ProcessLookupError:
+                pass
+
+    async def _reap(self):
+        await self._protocol.exited
+        self.returncode = self._process.returncode
+        self._exited.set()
+
+
+class ProcessRunner:
+    """
+    Owns the event loop thread. spawn() and communicate() block the calling
+    (slot) thread; callbacks passed to communicate() run on that thread too,
+    never on the loop.
+    """
+
+    def __init__(self, stall_seconds=DEFAULT_STALL_SECONDS):
+        self.stall_seconds = stall_seconds
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._loop is not None:
+                return
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the loop; only call once every child has exited"""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join()
+        loop.close()
+
+    def spawn(self, cmd):
+        """Start cmd with its stdout and stderr piped; returns a ProcessHandle"""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(self._spawn(cmd), self._loop).result()
+
+    def communicate(self, handle, duration=0, on_progress=None, on_line=None, keep=20):
+        """
+        Wait for handle's child to exit. on_progress(event) gets each
+        ffmpeg_progress.ProgressEvent, on_line(line) each non-empty stderr
+        line; the result keeps the last `keep` stderr lines (None: all).
+        """
+        events = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(
+            self._communicate(handle, events, duration, keep), self._loop
+        )
+        try:
+            while True:
+                kind, value = events.get()
+                if kind == "progress":
+                    if on_progress is not None:
+                        on_progress(value)
+                elif kind == "line":
+                    if on_line is not None:
+                        on_line(value)
+                else:
+                    break
+        except BaseException:
+            # Nobody is listening any more; don't leave the child running
+            handle.kill()
+            raise
+        return future.result()
+
+    async def _spawn(self, cmd):
+        # asyncio.create_subprocess_exec(), with a protocol that reports the exit
+        transport, protocol = await self._loop.subprocess_exec(
+            lambda: _ChildProtocol(LINE_LIMIT, self._loop),
+            *cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            creationflags=CREATE_NO_WINDOW,
+        )
+        handle = ProcessHandle(self._loop, transport, protocol, cmd)
+        # Reaped even if nobody communicates (e.g. cancelled right after starting)
+        handle._reaper = self._loop.create_task(handle._reap())
+        return handle
+
+    async def _communicate(self, handle, events, duration, keep):
+        process = handle._process
+        lines = collections.deque(maxlen=keep)
+        parser = ProgressParser(duration)
+        last = {"out_time": None, "frame": None}
+
+        async def read_progress():
+            async for raw in process.stdout:
+                event = parser.feed(raw.decode("utf-8", "replace"))
+                if event is None:
+                    continue
+                for key, value in (("out_time", event.out_time), ("frame", event.frame)):
+                    if value is not None and (last[key] is None or value > last[key]):
+                        last[key] = value
+                        handle.active_at = time.monotonic()
+                events.put(("progress", event))
+
+        async def read_stderr():
+            async for raw in process.stderr:
+                line = raw.decode("utf-8", "replace").strip()
+                if line:
+                    lines.append(line)
+                    events.put(("line", line))
+
+        async def watchdog():
+            interval = min(max(self.stall_seconds / 10, 0.1), 5)
+            while True:
+                await asyncio.sleep(interval)
+                if not handle.paused and time.monotonic() - handle.active_at >= self.stall_seconds:
+                    handle.stalled = True
+                    handle._signal(process.kill)
+                    return
+
+        # Only runs with a progress channel report anything to judge a stall by
+        watch = None
+        if self.stall_seconds and "-progress" in handle.args:
+            handle.active_at = time.monotonic()
+            watch = asyncio.ensure_future(watchdog())
+        readers = asyncio.gather(read_progress(), read_stderr())
+        try:
+            await handle._reaper
+            try:
+                await asyncio.wait_for(readers, PIPE_GRACE_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+        except BaseException:
+            readers.cancel()
+            handle._signal(process.kill)
+            raise
+        finally:
+            handle._transport.close()
+            if watch is not None:
+                watch.cancel()
+            events.put(("done", None))
+        return ProcessResult(handle.returncode, list(lines), handle.stalled)
@@ -0,0 +1,251 @@
+"""
+Per-title CQ search.
+Instead of one CQ for the whole batch, encode a few short slices of each
+file at candidate CQ values, score them against the source with ffmpeg's
+libvmaf (or ssim) filter, and pick the highest CQ (smallest file) whose
+average score still meets the target. Results are cached per input
+fingerprint so re-runs skip the search.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from app_paths import app_data_dir
+from conversion_engine import RESOLUTION_MAP, video_encode_args
+from encode_profiles import DEFAULT_PROFILE
+from ffmpeg_progress import PROGRESS_ARGS
+from ffmpeg_utils import CREATE_NO_WINDOW
+
+
+# CQ values the search may choose from (NVENC scale, see encoders.py)
+MIN_CQ = 30
+MAX_CQ = 50
+
+DEFAULT_TARGETS = {"vmaf": 93.0, "ssim": 0.97}
+
+SAMPLE_COUNT = 4
+SAMPLE_SECONDS = 3
+
+_VMAF_RE = re.compile(r'VMAF score[:=]\s*([\d.]+)')
+_SSIM_RE = re.compile(r'\bAll:([\d.]+)')
+
+
+def available_filters(ffmpeg_path):
+    """Names of the filters compiled into this ffmpeg build"""
+    result = subprocess.run(
+        [ffmpeg_path, '-hide_banner', '-filters'],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        universal_newlines=True,
+        creationflags=CREATE_NO_WINDOW,
+    )
+    names = set()
+    for line in result.stdout.splitlines():
+        # " ... libvmaf           VV->V      Calculate the VMAF ..."
+        parts = line.split()
+        if len(parts) >= 3 and "->" in parts[2]:
+            names.add(parts[1])
+    return names
+
+
+def parse_score(metric, output):
+    """Pull the aggregate score out of the metric filter's log output"""
+    matches = (_VMAF_RE if metric == "vmaf" else _SSIM_RE).findall(output)
+    return float(matches[-1]) if matches else None
+
+
+def sample_starts(duration, count=SAMPLE_COUNT, seconds=SAMPLE_SECONDS):
+    """Evenly spread slice start times, avoiding the very start and end"""
+    seconds = min(seconds, duration / max(count, 1))
+    return [max(duration * (i + 1) / (count + 1) - seconds / 2, 0) for i in range(count)], seconds
+
+
+class SearchResult:
+    """Chosen CQ for one file plus the scores measured along the way"""
+
+    def __init__(self, cq, score, reached, probes):
+        self.cq = cq
+        self.score = score
+        self.reached = reached    # False if even the lowest CQ missed the target
+        self.probes = probes      # {cq: score}
+
+
+class QualitySearchCache:
+    """SQLite cache of search results keyed by input fingerprint + search parameters"""
+
+    def __init__(self, db_path=None):
+        self.db_path = Path(db_path) if db_path else app_data_dir() / "quality_search.sqlite3"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " fingerprint TEXT NOT NULL,"
+            " search_key TEXT NOT NULL,"
+            " cq INTEGER,"
+            " score REAL,"
+            " reached INTEGER,"
+            " probes TEXT,"
+            " created_at REAL,"
+            " PRIMARY KEY (fingerprint, search_key))"
+        )
+        self._conn.commit()
+
+    def get(self, fingerprint, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT cq, score, reached, probes FROM results WHERE fingerprint = ? AND search_key = ?",
+                (fingerprint, key),
+            ).fetchone()
+        if row is None:
+            return None
+        cq, score, reached, probes = row
+        return SearchResult(cq, score, bool(reached), {int(k): v for k, v in json.loads(probes).items()})
+
+    def put(self, fingerprint, key, result):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (fingerprint, key, result.cq, result.score, int(result.reached),
+                 json.dumps(result.probes), time.time()),
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class QualitySearch:
+    """
+    Finds a per-file CQ for settings.target_metric/target_score.
+    Sample encodes and scoring run `workers` at a time.
+    """
+
+    def __init__(self, ffmpeg_path, settings, log=None, cache=None, workers=2,
+                 samples=SAMPLE_COUNT, sample_seconds=SAMPLE_SECONDS, min_cq=MIN_CQ, max_cq=MAX_CQ):
+        self.ffmpeg_path = ffmpeg_path
+        self.settings = settings
+        self.log = log or (lambda message: None)
+        self.cache = cache
+        self.workers = max(1, workers)
+        self.samples = samples
+        self.sample_seconds = sample_seconds
+        self.min_cq = min_cq
+        self.max_cq = max_cq
+
+        self.metric = settings.target_metric
+        if self.metric == "vmaf" and "libvmaf" not in available_filters(ffmpeg_path):
+            self.log("libvmaf is not available in this ffmpeg build, targeting SSIM instead")
+            self.metric = "ssim"
+        self.target = settings.target_score
+        if self.metric != settings.target_metric:
+            self.target = DEFAULT_TARGETS[self.metric]
+
+    def search_key(self, settings=None):
+        settings = settings or self.settings
+        payload = {
+            "encoder": settings.encoder,
+            "preset": settings.preset,
+            "resolution": settings.resolution,
+            "metric": self.metric,
+            "target": self.target,
+            "range": [self.min_cq, self.max_cq],
+            "samples": [self.samples, self.sample_seconds],
+        }
+        if settings.profile != DEFAULT_PROFILE:
+            payload["profile"] = settings.profile
+        return hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def find_cq(self, job, scheduler, input_file, duration, fingerprint, settings=None):
+        """
+        Return a SearchResult for input_file, from the cache when possible.
+        settings overrides the batch settings (a job's own snapshot).
+        """
+        settings = settings or self.settings
+        name = os.path.basename(input_file)
+        key = self.search_key(settings)
+        if self.cache is not None:
+            cached = self.cache.get(fingerprint, key)
+            if cached is not None:
+                self.log(f"[{name}] Cached CQ {cached.cq} ({self.metric} {cached.score:.3f})")
+                return cached
+
+        starts, seconds = sample_starts(duration, self.samples, self.sample_seconds)
+        probes = {}
+        low, high = self.min_cq, self.max_cq
+        best = None
+        with tempfile.TemporaryDirectory(prefix="av1cq_") as workdir:
+            # Quality falls as CQ rises, so binary-search the highest passing CQ
+            while low <= high:
+                cq = (low + high) // 2
+                probes[cq] = self.measure(job, scheduler, input_file, starts, seconds, cq, workdir, settings)
+                self.log(f"[{name}] CQ {cq}: {self.metric} {probes[cq]:.3f} (target {self.target})")
+                if probes[cq] >= self.target:
+                    best = cq
+                    low = cq + 1
+                else:
+                    high = cq - 1
+
+        if best is None:
+            result = SearchResult(self.min_cq, probes[self.min_cq], False, probes)
+            self.log(f"[{name}] Target not reached, using lowest CQ {self.min_cq}")
+        else:
+            result = SearchResult(best, probes[best], True, probes)
+        if self.cache is not None:
+            self.cache.put(fingerprint, key, result)
+        return result
+
+    def measure(self, job, scheduler, input_file, starts, seconds, cq, workdir, settings=None):
+        """Mean score of all sample slices encoded at cq"""
+        settings = (settings or self.settings).with_quality(cq)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = [
+                pool.submit(self.score_sample, job, scheduler, input_file, start, seconds,
+                            settings, os.path.join(workdir, f"cq{cq}_{i}.mkv"))
+                for i, start in enumerate(starts)
+            ]
+            scores = [future.result() for future in futures]
+        return sum(scores) / len(scores)
+
+    def score_sample(self, job, scheduler, input_file, start, seconds, settings, output):
+        encode = [
+            self.ffmpeg_path, '-hide_banner', '-loglevel', 'error', *PROGRESS_ARGS,
+            '-ss', f'{start:.3f}', '-i', str(input_file), '-t', f'{seconds:.3f}',
+            '-map', '0:v:0', '-an', '-sn', '-dn',
+        ]
+        encode.extend(video_encode_args(settings))
+        encode.extend(['-y', output])
+        self._run(job, scheduler, encode)
+
+        # The reference is scaled to the sample's size, so downscaled encodes
+        # are judged at their output resolution
+        metric_filter = "libvmaf" if self.metric == "vmaf" else "ssim"
+        graph = f"[1:v][0:v]scale2ref=flags=bicubic[ref][dist];[dist][ref]{metric_filter}"
+        if not RESOLUTION_MAP[settings.resolution]:
+            graph = f"[0:v][1:v]{metric_filter}"
+        score_cmd = [
+            self.ffmpeg_path, '-hide_banner', *PROGRESS_ARGS,
+            '-i', output,
+            '-ss', f'{start:.3f}', '-t', f'{seconds:.3f}', '-i', str(input_file),
+            '-lavfi', graph, '-f', 'null', '-',
+        ]
+        score = parse_score(self.metric, self._run(job, scheduler, score_cmd))
+        if score is None:
+            raise Exception(f"Could not read the {self.metric} score")
+        return score
+
+    def _run(self, job, scheduler, cmd):
+        """Run an ffmpeg helper as part of job (so Cancel and Pause reach it); returns stderr"""
+        result = scheduler.run_process(job, cmd, keep=None)
+        if result.returncode != 0:
+            raise Exception(f"Sample encode failed: {result.lines[-1] if result.lines else result.returncode}")
+        return result.stderr
@@ -0,0 +1,529 @@
+"""
+Concurrent encode scheduler.
+Runs queued jobs across a number of encode slots. Higher-priority jobs run
+first, and jobs that fail for a transient reason are retried after a
+growing delay. With an admission controller the slots are an upper bound,
+and each further job only starts while the machine has headroom for it.
+The ffmpeg children of all jobs run on one process_runner event loop,
+through which single jobs or the whole batch can be cancelled, paused and
+resumed; children whose progress stalls are killed.
+"""
+
+import heapq
+import itertools
+import subprocess
+import threading
+import time
+
+from ffmpeg_progress import Throttle
+from process_runner import DEFAULT_STALL_SECONDS, ProcessRunner
+
+
+# Job states
+QUEUED = "queued"
+PROBING = "probing"
+ENCODING = "encoding"
+DONE = "done"
+SKIPPED = "skipped"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATES = (DONE, SKIPPED, FAILED, CANCELLED)
+
+# Attempts per job (per run) when failures are transient
+DEFAULT_MAX_ATTEMPTS = 3
+# Retry delay doubles after each attempt, up to RETRY_MAX_SECONDS
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 600
+
+
+class CancelledError(Exception):
+    """Raised inside a job runner when the batch has been cancelled"""
+
+
+class RetryableError(Exception):
+    """Raised inside a job runner for failures worth another attempt (I/O hiccups, busy GPU)"""
+
+
+def retry_delay(attempt, base=RETRY_BASE_SECONDS, limit=RETRY_MAX_SECONDS):
+    """Seconds to wait before retrying after the given (1-based) attempt"""
+    return min(base * 2 ** (attempt - 1), limit)
+
+
+class EncodeJob:
+    """A single file moving through the scheduler"""
+
+    def __init__(self, input_path, index=0, priority=0, spec=None, job_id=None):
+        self.input_path = input_path
+        self.index = index
+        # Higher runs first; equal priorities run in submission order
+        self.priority = priority
+        # conversion_engine.JobSpec fixed at enqueue time, or None for the batch settings
+        self.spec = spec
+        # Row id in a job_queue.JobStore, if the queue is persisted
+        self.job_id = job_id
+        self.attempts = 0
+        self.retry_at = None
+        self.state = QUEUED
+        self.progress = 0.0
+        # Latest ffmpeg_progress.ProgressEvent (fps, speed, ETA...), if any
+        self.stats = None
+        self.slot = None
+        self.error = None
+        self.output_path = None
+        # Running ffmpeg children; chunked encodes run several at once
+        self.processes = set()
+        self.cancel_requested = False   # cancel_job() on this job alone
+        self.paused = False             # pause_job(); its ffmpeg children are suspended
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        # Measurements for metrics.py; the runner fills in what it knows
+        self.queue_wait = None          # seconds from submit to the first attempt
+        self.encode_started_at = None   # when the current attempt entered ENCODING
+        self.probe_seconds = None
+        self.media_duration = None
+        self.frames = None
+        self.input_bytes = None
+        self.output_bytes = None
+        self.exit_code = None           # of the last ffmpeg run
+
+    @property
+    def is_finished(self):
+        return self.state in FINISHED_STATES
+
+    def __repr__(self):
+        return f"EncodeJob({self.input_path!r}, {self.state}, {self.progress:.0%})"
+
+
+def terminate_process(process, timeout=5):
+    """Stop an ffmpeg child, escalating to kill if it ignores terminate"""
+    if process is None or process.poll() is not None:
+        return
+    try:
+        process.terminate()
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+    except OSError:
+        pass
+
+
+class EncodeScheduler:
+    """
+    Runs jobs on `slots` worker threads.
+
+    run_job(job, scheduler) does the actual work. It should report state
+    and progress through set_state()/report_progress() and run each ffmpeg
+    child through run_process() so cancel and pause can reach it. Raising
+    RetryableError puts the job back in the queue until max_attempts is used up.
+    on_update(job) is called whenever a job changes state, and for progress
+    at most once per progress_interval seconds per job.
+    store, if given, is a job_queue.JobStore kept in step with every job's state.
+    admission, if given, is a load_control.AdmissionController consulted before
+    each job starts; slots then defaults to its max_jobs. limits, a
+    load_control.ProcessLimits, is applied to every attached ffmpeg child.
+    A child whose progress stops for stall_seconds is killed (0 never kills).
+    """
+
+    def __init__(self, run_job, slots=None, on_update=None, progress_interval=0.25, store=None,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS, retry_base=RETRY_BASE_SECONDS, admission=None,
+                 limits=None, stall_seconds=DEFAULT_STALL_SECONDS):
+        self.run_job = run_job
+        if slots is None:
+            slots = admission.max_jobs if admission is not None else 1
+        self.slots = max(1, int(slots))
+        self.on_update = on_update
+        self.progress_interval = progress_interval
+        self.store = store
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base = retry_base
+        self.admission = admission
+        self.limits = limits
+        self.runner = ProcessRunner(stall_seconds)
+        self._throttles = {}
+        self.jobs = []
+        # Ready jobs as (-priority, sequence, job); retries wait in _delayed
+        self._ready = []
+        self._delayed = []
+        self._sequence = itertools.count()
+        self._queue_cond = threading.Condition()
+        # Jobs taken off the queue and not finished yet
+        self._running = 0
+        self._lock = threading.Lock()
+        self._threads = []
+        # Set once every slot thread has exited; see wait()
+        self._live_slots = 0
+        self._slots_exited = threading.Event()
+        self._cancelled = threading.Event()
+        self._closed = False
+        # drain(): start nothing more; pause_all(): start nothing until resume_all()
+        self._draining = False
+        self._paused = False
+
+    # Submission -------------------------------------------------------
+
+    def submit(self, input_path, priority=0, spec=None, job_id=None):
+        """Queue a file; safe to call while the batch is running"""
+        with self._lock:
+            job = EncodeJob(input_path, len(self.jobs) + 1, priority, spec, job_id)
+            self.jobs.append(job)
+        with self._queue_cond:
+            heapq.heappush(self._ready, (-priority, next(self._sequence), job))
+            self._queue_cond.notify()
+        return job
+
+    def start(self):
+        """Start the slot threads"""
+        if self.admission is not None:
+            self.admission.start()
+        self.runner.start()
+        self._live_slots = self.slots
+        for slot in range(self.slots):
+            thread = threading.Thread(target=self._slot_loop, args=(slot,), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def close(self):
+        """Signal that no more jobs will be submitted; slots exit once idle"""
+        with self._queue_cond:
+            self._closed = True
+            self._queue_cond.notify_all()
+
+    def drain(self):
+        """
+        Graceful shutdown: running jobs finish, queued ones are not started
+        and stay queued (a JobStore keeps them for the next run)
+        """
+        with self._queue_cond:
+            self._draining = True
+            self._closed = True
+            self._queue_cond.notify_all()
+        self.resume_all()
+
+    def upcoming(self, limit):
+        """Input paths of the next `limit` ready jobs, in the order they will run"""
+        with self._queue_cond:
+            entries = heapq.nsmallest(limit, self._ready)
+        return [job.input_path for _, _, job in entries]
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def wait(self):
+        """Block until every slot thread has exited"""
+        # Not Thread.join() alone: on some Pythons a join interrupted by
+        # Ctrl+C leaves the thread looking finished, so the wait after
+        # drain() would return early
+        if self._threads:
+            self._slots_exited.wait()
+        for thread in self._threads:
+            thread.join()
+        self.runner.stop()
+        if self.admission is not None:
+            self.admission.stop()
+
+    @property
+    def running(self):
+        """Number of jobs currently running"""
+        return self._running
+
+    def queue_depth(self):
+        """Jobs waiting to start, including retries waiting out their delay"""
+        with self._queue_cond:
+            return len(self._ready) + len(self._delayed)
+
+    # Reporting --------------------------------------------------------
+
+    def set_state(self, job, state):
+        if self.is_cancelled(job) and state not in FINISHED_STATES:
+            raise CancelledError()
+        job.state = state
+        if state == ENCODING:
+            job.encode_started_at = time.time()
+        if state in FINISHED_STATES and self.store is not None:
+            self.store.mark_finished(job)
+        self._notify(job)
+
+    def report_progress(self, job, progress, stats=None):
+        """
+        Record progress; listeners only hear about it at the coalesced rate so
+        fast encodes don't flood the UI.
+        """
+        job.progress = min(max(progress, 0.0), 1.0)
+        if stats is not None:
+            job.stats = stats
+        throttle = self._throttles.get(job.index)
+        if throttle is None:
+            throttle = self._throttles[job.index] = Throttle(self.progress_interval)
+        if throttle.ready(force=job.progress >= 1.0):
+            self._notify(job)
+
+    def attach_process(self, job, process):
+        """Register a running ffmpeg child so it can be cancelled and paused"""
+        with self._lock:
+            job.processes.add(process)
+        if self.is_cancelled(job):
+            terminate_process(process)
+            raise CancelledError()
+        if self.limits is not None:
+            self.limits.apply(process.pid)
+        if job.paused:
+            process.pause()
+
+    def detach_process(self, job, process):
+        """Forget an ffmpeg child once it has exited"""
+        with self._lock:
+            job.processes.discard(process)
+
+    def run_process(self, job, cmd, duration=0, on_progress=None, on_line=None, keep=20):
+        """
+        Run an ffmpeg command for job and return its process_runner.ProcessResult.
+        on_progress(event) and on_line(line) are called on this thread. Raises
+        CancelledError if the job was cancelled meanwhile, and RetryableError
+        if the child was killed for making no progress.
+        """
+        process = self.runner.spawn(cmd)
+        try:
+            self.attach_process(job, process)
+            result = self.runner.communicate(process, duration, on_progress, on_line, keep)
+        except CancelledError:
+            # Cancelled as it started; attach_process stopped it, this reaps it
+            self.runner.communicate(process)
+            raise
+        finally:
+            self.detach_process(job, process)
+        job.exit_code = result.returncode
+        if self.is_cancelled(job):
+            raise CancelledError()
+        if result.stalled:
+            raise RetryableError(f"FFmpeg made no progress for {self.runner.stall_seconds:g}s, stopped it")
+        return result
+
+    def overall_progress(self):
+        """Batch progress, weighting every job equally"""
+        with self._lock:
+            jobs = list(self.jobs)
+        if not jobs:
+            return 0.0
+        total = sum(1.0 if job.is_finished else job.progress for job in jobs)
+        return total / len(jobs)
+
+    def active_jobs(self):
+        with self._lock:
+            return [job for job in self.jobs if job.state in (PROBING, ENCODING)]
+
+    def counts(self):
+        """Number of jobs in each state"""
+        with self._lock:
+            jobs = list(self.jobs)
+        counts = {}
+        for job in jobs:
+            counts[job.state] = counts.get(job.state, 0) + 1
+        return counts
+
+    # Cancellation -----------------------------------------------------
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def is_cancelled(self, job):
+        """True once the batch or this job alone has been cancelled"""
+        return self._cancelled.is_set() or job.cancel_requested
+
+    def cancel_all(self):
+        """Drop pending jobs and terminate every running ffmpeg child"""
+        self._cancelled.set()
+        with self._queue_cond:
+            dropped = [job for _, _, job in self._ready] + [job for _, _, job in self._delayed]
+            self._ready = []
+            self._delayed = []
+            self._queue_cond.notify_all()
+        for job in dropped:
+            self._finish(job, CANCELLED)
+        processes = []
+        with self._lock:
+            for job in self.jobs:
+                processes.extend(job.processes)
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+        for process in processes:
+            terminate_process(process)
+        self.close()
+
+    def cancel_job(self, job):
+        """Cancel one job: drop it from the queue, or stop its ffmpeg children"""
+        job.cancel_requested = True
+        with self._queue_cond:
+            queued = [entry for entry in self._ready + self._delayed if entry[2] is job]
+            if queued:
+                self._ready = [entry for entry in self._ready if entry[2] is not job]
+                self._delayed = [entry for entry in self._delayed if entry[2] is not job]
+                heapq.heapify(self._ready)
+                heapq.heapify(self._delayed)
+        if queued:
+            self._finish(job, CANCELLED)
+            return
+        self.stop_processes(job)
+
+    def stop_processes(self, job):
+        """Terminate a job's running ffmpeg children without cancelling the job"""
+        with self._lock:
+            processes = list(job.processes)
+        for process in processes:
+            terminate_process(process)
+
+    # Pausing ----------------------------------------------------------
+
+    @property
+    def paused(self):
+        return self._paused
+
+    def pause_job(self, job):
+        """Suspend a running job's ffmpeg children where they are"""
+        job.paused = True
+        with self._lock:
+            processes = list(job.processes)
+        for process in processes:
+            process.pause()
+        self._notify(job)
+
+    def resume_job(self, job):
+        job.paused = False
+        with self._lock:
+            processes = list(job.processes)
+        for process in processes:
+            process.resume()
+        self._notify(job)
+
+    def pause_all(self):
+        """Suspend every running job and start no new ones until resume_all()"""
+        with self._queue_cond:
+            self._paused = True
+        for job in self.active_jobs():
+            self.pause_job(job)
+
+    def resume_all(self):
+        with self._queue_cond:
+            self._paused = False
+            self._queue_cond.notify_all()
+        with self._lock:
+            paused = [job for job in self.jobs if job.paused]
+        for job in paused:
+            self.resume_job(job)
+
+    # Internals --------------------------------------------------------
+
+    def _notify(self, job):
+        if self.on_update:
+            self.on_update(job)
+
+    def _finish(self, job, state):
+        job.state = state
+        if self.store is not None:
+            self.store.mark_finished(job)
+        self._notify(job)
+
+    def _next_job(self):
+        """Block until a job is ready to run; None once closed and drained"""
+        with self._queue_cond:
+            while True:
+                now = time.time()
+                while self._delayed and self._delayed[0][0] <= now:
+                    _, _, job = heapq.heappop(self._delayed)
+                    heapq.heappush(self._ready, (-job.priority, next(self._sequence), job))
+                timeout = self._delayed[0][0] - now if self._delayed else None
+                if self._cancelled.is_set() or self._draining:
+                    return None
+                if self._ready and not self._paused:
+                    if self.admission is None or self.admission.admit(self._running):
+                        self._running += 1
+                        return heapq.heappop(self._ready)[2]
+                    # No headroom yet: check again once the load has been re-measured
+                    timeout = min(timeout, self.admission.interval) if timeout else self.admission.interval
+                elif self._closed and not self._ready and not self._delayed:
+                    return None
+                self._queue_cond.wait(timeout)
+
+    def _retry_later(self, job, error):
+        """Put a transiently failed job back in the queue after a backoff delay"""
+        job.error = str(error)
+        job.state = QUEUED
+        job.progress = 0.0
+        job.stats = None
+        job.retry_at = time.time() + retry_delay(job.attempts, self.retry_base)
+        if self.store is not None:
+            self.store.mark_retry(job)
+        with self._queue_cond:
+            heapq.heappush(self._delayed, (job.retry_at, next(self._sequence), job))
+            self._queue_cond.notify()
+        self._notify(job)
+
+    def _slot_loop(self, slot):
+        try:
+            self._serve(slot)
+        finally:
+            with self._queue_cond:
+                self._live_slots -= 1
+                if self._live_slots == 0:
+                    self._slots_exited.set()
+
+    def _serve(self, slot):
+        while True:
+            job = self._next_job()
+            if job is None:
+                # Wake the other slots so they notice too
+                with self._queue_cond:
+                    self._queue_cond.notify_all()
+                return
+            try:
+                self._run(job, slot)
+            finally:
+                with self._queue_cond:
+                    self._running -= 1
+                    # A finished job may make room for one held back by admission
+                    self._queue_cond.notify_all()
+
+    def _run(self, job, slot):
+        """Run one job on a slot thread, through retries and failures"""
+        if self.is_cancelled(job):
+            self._finish(job, CANCELLED)
+            return
+
+        job.slot = slot
+        job.attempts += 1
+        job.retry_at = None
+        job.started_at = time.time()
+        job.encode_started_at = None
+        if job.queue_wait is None:
+            job.queue_wait = job.started_at - job.submitted_at
+        if self.store is not None:
+            self.store.mark_started(job)
+        try:
+            self.run_job(job, self)
+            if job.state not in (SKIPPED, FAILED):
+                job.state = DONE
+            job.progress = 1.0
+        except CancelledError:
+            job.state = CANCELLED
+        except RetryableError as e:
+            job.processes.clear()
+            cancelled = self.is_cancelled(job)
+            if not cancelled and job.attempts < self.max_attempts:
+                self._retry_later(job, e)
+                return
+            job.error = str(e)
+            job.state = CANCELLED if cancelled else FAILED
+        except Exception as e:
+            job.error = str(e)
+            job.state = CANCELLED if self.is_cancelled(job) else FAILED
+        finally:
+            job.processes.clear()
+            job.paused = False
+            # A job waiting out a retry delay hasn't finished yet
+            if job.state in FINISHED_STATES:
+                job.finished_at = time.time()
+        self._finish(job, job.state)
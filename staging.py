@@ -0,0 +1,299 @@
+"""
+Local staging for network-share libraries.
+While one file encodes, the next few queued inputs are copied to local
+scratch (within a disk budget) so ffmpeg reads them from fast local disk.
+Outputs are written to scratch too and moved to their Converted/ folder
+on a background thread, so network transfers overlap with encoding
+instead of running between encodes.
+"""
+
+import collections
+import ctypes
+import hashlib
+import os
+import threading
+from pathlib import Path
+
+from app_paths import app_data_dir
+from output_files import commit_output, sweep_orphans, temp_output_path
+
+
+COPY_BUFFER = 8 * 1024 * 1024
+
+DEFAULT_BUDGET_BYTES = 50 * 1024 ** 3
+DEFAULT_PREFETCH = 2
+
+# Linux filesystem types that live on another machine
+NETWORK_FS_TYPES = {"cifs", "smb3", "smbfs", "nfs", "nfs4", "fuse.sshfs", "9p", "afs", "ceph", "glusterfs"}
+
+
+def _linux_mount_types():
+    mounts = []
+    try:
+        with open("/proc/mounts", encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 3:
+                    # Mount points escape spaces as \040
+                    mounts.append((parts[1].replace("\\040", " "), parts[2]))
+    except OSError:
+        pass
+    # Longest mount point first so the most specific one wins
+    return sorted(mounts, key=lambda mount: len(mount[0]), reverse=True)
+
+
+def is_network_path(path):
+    """True if path is on an SMB/NFS (or similar) share"""
+    path = os.path.abspath(path)
+    if os.name == "nt":
+        if path.startswith("\\\\"):
+            return True
+        drive = os.path.splitdrive(path)[0] + "\\"
+        DRIVE_REMOTE = 4
+        return ctypes.windll.kernel32.GetDriveTypeW(drive) == DRIVE_REMOTE
+    for mount_point, fs_type in _linux_mount_types():
+        if path == mount_point or path.startswith(mount_point.rstrip("/") + "/"):
+            return fs_type in NETWORK_FS_TYPES
+    return False
+
+
+class _StagedInput:
+    def __init__(self, local_path, size):
+        self.local_path = local_path
+        self.size = size
+        self.ready = False
+        self.failed = False
+
+
+class StagingArea:
+    """
+    Prefetches inputs into scratch_dir/in and stages outputs in scratch_dir/out.
+
+    Only files on network shares are staged unless always=True. Input copies
+    never exceed budget_bytes in total; a job whose input isn't staged yet
+    simply reads it from the share, so a full budget never blocks encoding.
+    """
+
+    def __init__(self, scratch_dir=None, budget_bytes=DEFAULT_BUDGET_BYTES, prefetch=DEFAULT_PREFETCH,
+                 always=False, log=None):
+        self.scratch_dir = Path(scratch_dir) if scratch_dir else app_data_dir() / "scratch"
+        self.input_dir = self.scratch_dir / "in"
+        self.output_dir = self.scratch_dir / "out"
+        self.input_dir.mkdir(parents=True, exist_ok=True)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        for directory in self.output_dir.iterdir():
+            if directory.is_dir():
+                sweep_orphans(directory, log)
+        self.budget_bytes = budget_bytes
+        self.prefetch_count = prefetch
+        self.always = always
+        self.log = log or (lambda message: None)
+
+        self._cond = threading.Condition()
+        self._requests = collections.deque()
+        self._inputs = {}       # path -> _StagedInput
+        self._in_use = set()    # inputs whose job has started
+        self._staged_bytes = 0
+        self._moves = collections.deque()
+        self._moving = 0
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._prefetch_loop, daemon=True),
+            threading.Thread(target=self._move_loop, daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def should_stage(self, path):
+        return self.always or is_network_path(path)
+
+    # Inputs -------------------------------------------------------------
+
+    def prefetch(self, paths):
+        """Ask for these inputs (in order) to be copied to scratch ahead of time"""
+        with self._cond:
+            for path in paths:
+                if path in self._inputs or path in self._in_use or path in self._requests:
+                    continue
+                if self.should_stage(path):
+                    self._requests.append(path)
+            self._cond.notify_all()
+
+    def acquire(self, path):
+        """
+        Return the path ffmpeg should read: the local copy if it is staged (or
+        being copied, in which case wait for it), otherwise the original.
+        """
+        with self._cond:
+            self._in_use.add(path)
+            entry = self._inputs.get(path)
+            while entry is not None and not entry.ready and not entry.failed and not self._closed:
+                self._cond.wait()
+            if entry is not None and entry.ready:
+                return str(entry.local_path)
+        return path
+
+    def release(self, path):
+        """The job is finished with its input; free the local copy"""
+        with self._cond:
+            self._in_use.discard(path)
+            entry = self._inputs.pop(path, None)
+            if entry is not None:
+                self._staged_bytes -= entry.size
+                self._cond.notify_all()
+        if entry is not None:
+            self._remove(entry.local_path)
+
+    def _local_input_path(self, path):
+        digest = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:12]
+        return self.input_dir / f"{digest}_{os.path.basename(path)}"
+
+    def _prefetch_loop(self):
+        while True:
+            with self._cond:
+                while not self._requests and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                path = self._requests[0]
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    size = None
+                if size is None or size > self.budget_bytes or path in self._in_use:
+                    self._requests.popleft()
+                    continue
+                # Wait for space; jobs releasing their inputs wake us up
+                if self._staged_bytes + size > self.budget_bytes:
+                    self._cond.wait(timeout=1)
+                    continue
+                self._requests.popleft()
+                entry = _StagedInput(self._local_input_path(path), size)
+                self._inputs[path] = entry
+                self._staged_bytes += size
+
+            try:
+                self._copy(path, entry.local_path)
+                entry.ready = True
+            except Exception as e:
+                entry.failed = True
+                self.log(f"Could not prefetch {os.path.basename(path)}, reading it from the share: {e}")
+            with self._cond:
+                if entry.failed or self._inputs.get(path) is not entry:
+                    # Failed, or the job already finished with it
+                    if self._inputs.get(path) is entry:
+                        del self._inputs[path]
+                        self._staged_bytes -= entry.size
+                    self._remove(entry.local_path)
+                self._cond.notify_all()
+
+    # Outputs ------------------------------------------------------------
+
+    def local_output_path(self, output_path):
+        """Where to write output_path while encoding (stable, so chunked encodes can resume)"""
+        output_path = Path(output_path)
+        if not self.should_stage(output_path.parent):
+            return output_path
+        digest = hashlib.sha1(str(output_path.parent.resolve()).encode("utf-8")).hexdigest()[:12]
+        local_dir = self.output_dir / digest
+        local_dir.mkdir(parents=True, exist_ok=True)
+        return local_dir / output_path.name
+
+    def publish(self, local_path, output_path, on_done=None, on_error=None):
+        """Move a finished output to its destination in the background"""
+        local_path, output_path = Path(local_path), Path(output_path)
+        if local_path == output_path:
+            if on_done:
+                on_done()
+            return
+        with self._cond:
+            self._moves.append((local_path, output_path, on_done, on_error))
+            self._cond.notify_all()
+
+    def _move_loop(self):
+        while True:
+            with self._cond:
+                while not self._moves and not self._closed:
+                    self._cond.wait()
+                if not self._moves:
+                    return
+                local_path, output_path, on_done, on_error = self._moves.popleft()
+                self._moving += 1
+            try:
+                self._move(local_path, output_path)
+                self.log(f"Moved {output_path.name} to {output_path.parent}")
+                if on_done:
+                    on_done()
+            except Exception as e:
+                self.log(f"ERROR: could not move {local_path} to {output_path}: {e}")
+                if on_error:
+                    on_error(e)
+            finally:
+                with self._cond:
+                    self._moving -= 1
+                    self._cond.notify_all()
+
+    def _move(self, local_path, output_path):
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.replace(local_path, output_path)
+            return
+        except OSError:
+            pass  # different filesystem: copy, then swap in atomically
+        # The same temp naming as encodes, so an interrupted move is swept up too
+        temp = temp_output_path(output_path)
+        try:
+            self._copy(local_path, temp, partial=temp)
+            commit_output(temp, output_path)
+        except BaseException:
+            self._remove(temp)
+            raise
+        self._remove(local_path)
+
+    # Shared -------------------------------------------------------------
+
+    def _copy(self, source, destination, partial=None):
+        """Chunked copy + fsync via a .partial name, abandoned if the area is closed"""
+        destination = Path(destination)
+        partial = Path(partial) if partial else destination.with_name(destination.name + ".partial")
+        with open(source, "rb") as src, open(partial, "wb") as dst:
+            while True:
+                if self._closed and partial.parent == self.input_dir:
+                    raise Exception("staging closed")
+                block = src.read(COPY_BUFFER)
+                if not block:
+                    break
+                dst.write(block)
+            dst.flush()
+            os.fsync(dst.fileno())
+        if partial != destination:
+            os.replace(partial, destination)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def wait_for_moves(self):
+        """Block until every published output has reached its destination"""
+        with self._cond:
+            while self._moves or self._moving:
+                self._cond.wait()
+
+    def close(self):
+        """Finish pending moves, stop prefetching and delete leftover input copies"""
+        self.wait_for_moves()
+        with self._cond:
+            self._closed = True
+            self._requests.clear()
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=10)
+        with self._cond:
+            leftovers = [entry.local_path for entry in self._inputs.values()]
+            self._inputs.clear()
+            self._staged_bytes = 0
+        for path in leftovers:
+            self._remove(path)
@@ -0,0 +1,143 @@
+"""
+Per-file stream selection.
+Decides from probe data which source streams go into the output: audio
+tracks filtered by language and with commentary dropped, embedded subtitle
+tracks and attachments (fonts for styled subtitles) kept. The result is
+turned into explicit `-map` arguments instead of mapping `0:v`/`0:a`
+wholesale.
+"""
+
+import re
+
+from languages import LANGUAGE_CODES
+
+
+# Embedded subtitle codecs MKV can't store as-is, and what to convert them to
+SUBTITLE_CONVERSIONS = {"mov_text": "srt"}
+
+_COMMENTARY_RE = re.compile(r'\bcommentary\b|\bkommentar\b|\bcommentaire\b', re.IGNORECASE)
+
+
+def normalize_language(code):
+    """ISO 639-1/2 code or alias -> 639-2/B code (as MKV uses), or None"""
+    if not code:
+        return None
+    return LANGUAGE_CODES.get(code.strip().lower())
+
+
+def parse_languages(text):
+    """'eng, ja' -> ('eng', 'jpn'); raises ValueError for unknown codes"""
+    codes = []
+    for part in re.split(r'[\s,;+]+', text or ""):
+        if not part:
+            continue
+        code = normalize_language(part)
+        if code is None:
+            raise ValueError(f"Unknown language code: {part}")
+        if code not in codes:
+            codes.append(code)
+    return tuple(codes)
+
+
+def is_commentary(stream):
+    if stream.disposition.get("comment"):
+        return True
+    return bool(stream.title and _COMMENTARY_RE.search(stream.title))
+
+
+def describe_stream(stream):
+    """'#2 eng "Director's Commentary"' for log lines"""
+    parts = [f"#{stream.index}", stream.language or "und"]
+    if stream.title:
+        parts.append(f'"{stream.title}"')
+    return " ".join(parts)
+
+
+class StreamSelection:
+    """The source streams an output keeps, as StreamInfo lists"""
+
+    def __init__(self, video, audio, subtitles, attachments, dropped):
+        self.video = video
+        self.audio = audio
+        self.subtitles = subtitles
+        self.attachments = attachments
+        self.dropped = dropped    # [(StreamInfo, reason)]
+
+    def map_args(self, input_index=0, video=True):
+        """-map arguments for the selected streams of input input_index"""
+        streams = (self.video if video else []) + self.audio + self.subtitles + self.attachments
+        args = []
+        for stream in streams:
+            args.extend(['-map', f'{input_index}:{stream.index}'])
+        return args
+
+    def audio_disposition_args(self):
+        """Make the first kept audio track the default if the default one was dropped"""
+        if not self.audio or any(stream.disposition.get("default") for stream in self.audio):
+            return []
+        if not any(stream.disposition.get("default") for stream, _ in self.dropped):
+            return []
+        return ['-disposition:a:0', 'default']
+
+    def subtitle_codec_args(self):
+        """Per-stream codec overrides for embedded subtitles (output indexes 0..n-1)"""
+        args = []
+        for idx, stream in enumerate(self.subtitles):
+            if stream.codec_name in SUBTITLE_CONVERSIONS:
+                args.extend([f'-c:s:{idx}', SUBTITLE_CONVERSIONS[stream.codec_name]])
+        return args
+
+    def attachment_args(self):
+        return ['-c:t', 'copy'] if self.attachments else []
+
+    def summary(self):
+        parts = [f"{len(self.audio)} audio"]
+        if self.subtitles:
+            parts.append(f"{len(self.subtitles)} embedded subtitle(s)")
+        if self.attachments:
+            parts.append(f"{len(self.attachments)} attachment(s)")
+        text = "keeping " + ", ".join(parts)
+        if self.dropped:
+            text += "; dropping " + ", ".join(
+                f"{describe_stream(stream)} ({reason})" for stream, reason in self.dropped
+            )
+        return text
+
+
+def select_streams(info, settings):
+    """StreamSelection for a probed input (media_probe.MediaInfo) under settings"""
+    dropped = []
+
+    audio = []
+    wanted = set(settings.audio_languages)
+    for stream in info.audio_streams:
+        if settings.drop_commentary and is_commentary(stream):
+            dropped.append((stream, "commentary"))
+            continue
+        language = normalize_language(stream.language)
+        # Untagged tracks are kept: there is no telling what they contain
+        if wanted and language is not None and language not in wanted:
+            dropped.append((stream, "language"))
+            continue
+        audio.append(stream)
+    if info.audio_streams and not audio:
+        # Never produce a silent file; fall back to the first track
+        first = info.audio_streams[0]
+        dropped = [(stream, reason) for stream, reason in dropped if stream is not first]
+        audio = [first]
+
+    subtitles = []
+    for stream in info.subtitle_streams:
+        if settings.keep_embedded_subtitles:
+            subtitles.append(stream)
+        else:
+            dropped.append((stream, "embedded subtitles off"))
+
+    attachments = []
+    for stream in info.streams_of("attachment"):
+        if settings.keep_attachments:
+            attachments.append(stream)
+        else:
+            dropped.append((stream, "attachments off"))
+
+    return StreamSelection(info.video_streams, audio, subtitles, attachments, dropped)
@@ -0,0 +1,287 @@
+"""
+Subtitle discovery: finds sidecar subtitle files for a video and
+detects their language from the filename
+"""
+
+import os
+import re
+import threading
+from collections import namedtuple
+from pathlib import Path
+
+from languages import AMBIGUOUS_CODES, LANGUAGE_CODES, LANGUAGE_NAMES, LANGUAGE_TITLES
+
+
+# Video container extensions recognised when scanning folders
+VIDEO_EXTENSIONS = {'.mp4', '.mkv', '.avi', '.mov', '.flv', '.wmv', '.webm'}
+
+# Sidecar subtitle formats that can be muxed into MKV
+SUBTITLE_EXTENSIONS = {'.srt', '.ass', '.ssa', '.vtt'}
+
+# A sidecar subtitle matched to a video; tags is a SubtitleTags
+SubtitleTrack = namedtuple(
+    'SubtitleTrack', ['path', 'language_code', 'language_title', 'tags']
+)
+
+# Separators used between a video name and its subtitle tags
+_SEPARATOR_RE = re.compile(r'[.\s_\-\[\]()]+')
+
+
+# Filename tags that mark subtitle dispositions rather than languages
+FORCED_TAGS = {'forced', 'foreign'}
+SDH_TAGS = {'sdh', 'cc'}
+# 'hi' (hearing impaired) is also Hindi: SDH only next to another language tag
+AMBIGUOUS_SDH_TAGS = {'hi'}
+DEFAULT_TAGS = {'default'}
+
+# Tags that carry no information but may sit between language tags
+NEUTRAL_TAGS = {'sub', 'subs', 'subtitle', 'subtitles', 'full', 'track'}
+
+_TOKEN_RE = re.compile(r'[\s._\[\](){},+]+')
+_REGION_RE = re.compile(r'^([a-z]{2,3})-[a-z0-9]{2,4}$')
+
+
+class SubtitleTags:
+    """Languages and disposition flags parsed from a subtitle filename"""
+
+    def __init__(self):
+        self.languages = []  # [(language_code, language_title), ...]
+        self.forced = False
+        self.sdh = False
+        self.default = False
+
+    @property
+    def language(self):
+        """First detected (language_code, language_title), or None"""
+        return self.languages[0] if self.languages else None
+
+    def add_language(self, code, prepend=False):
+        entry = (code, LANGUAGE_TITLES.get(code, code))
+        if entry in self.languages:
+            return
+        if prepend:
+            self.languages.insert(0, entry)
+        else:
+            self.languages.append(entry)
+
+    def __repr__(self):
+        flags = [name for name in ('forced', 'sdh', 'default') if getattr(self, name)]
+        return f"SubtitleTags({self.languages}, {flags})"
+
+
+def _tokenize(stem):
+    """Split a lowercase filename stem into tags, keeping region codes like pt-br whole"""
+    tokens = []
+    for token in _TOKEN_RE.split(stem):
+        if not token:
+            continue
+        if '-' in token:
+            region = _REGION_RE.match(token)
+            if region and region.group(1) in LANGUAGE_CODES:
+                tokens.append(region.group(1))
+                continue
+            tokens.extend(part for part in token.split('-') if part)
+        else:
+            tokens.append(token)
+    return tokens
+
+
+def _lookup(token, previous=None, trust_codes=True):
+    """
+    Return (639-2/B code, tokens consumed) for a tag, or (None, 0).
+    Two-word names ('norwegian bokmål') consume the previous token too.
+    """
+    if previous is not None:
+        code = LANGUAGE_NAMES.get(f"{previous} {token}")
+        if code:
+            return code, 2
+    code = LANGUAGE_NAMES.get(token)
+    if code:
+        return code, 1
+    code = LANGUAGE_CODES.get(token)
+    if code and (trust_codes or (len(token) == 3 and token not in AMBIGUOUS_CODES)):
+        return code, 1
+    return None, 0
+
+
+def detect_subtitle_tags(filename):
+    """
+    Parse languages and forced/SDH/default flags from a subtitle filename.
+    The filename is tokenized once and each token is a dict lookup.
+
+    Tags are read right-to-left from the end of the name (Show.S01E01.eng.forced.srt)
+    where even two-letter codes are trusted. If none are found there, the rest
+    of the name is searched for language names and unambiguous 3-letter codes.
+    """
+    tags = SubtitleTags()
+    stem, ext = os.path.splitext(filename.lower())
+    if ext not in SUBTITLE_EXTENSIONS:
+        stem = filename.lower()
+    tokens = _tokenize(stem)
+
+    for token in tokens:
+        if token in FORCED_TAGS:
+            tags.forced = True
+        elif token in SDH_TAGS:
+            tags.sdh = True
+        elif token in DEFAULT_TAGS:
+            tags.default = True
+
+    # Trailing tag section
+    position = len(tokens) - 1
+    hearing_impaired = False
+    while position >= 0:
+        token = tokens[position]
+        if token in AMBIGUOUS_SDH_TAGS:
+            hearing_impaired = True
+            position -= 1
+            continue
+        if token in FORCED_TAGS or token in SDH_TAGS or token in DEFAULT_TAGS:
+            position -= 1
+            continue
+        if token in NEUTRAL_TAGS or token.isdigit():
+            position -= 1
+            continue
+        previous = tokens[position - 1] if position > 0 else None
+        code, consumed = _lookup(token, previous)
+        if code is None:
+            break
+        tags.add_language(code, prepend=True)
+        position -= consumed
+    if hearing_impaired:
+        if tags.languages:
+            tags.sdh = True
+        else:
+            tags.add_language(LANGUAGE_CODES['hi'])
+
+    # Anywhere else in the name
+    if not tags.languages:
+        previous = None
+        for token in tokens[:position + 1]:
+            code, _ = _lookup(token, previous, trust_codes=False)
+            if code:
+                tags.add_language(code)
+            previous = token
+
+    return tags
+
+
+def detect_subtitle_language(filename):
+    """
+    Detect language code from subtitle filename.
+    Returns tuple: (language_code, language_title), ('und', 'Undetermined')
+    if no language tag is present.
+    """
+    return detect_subtitle_tags(filename).language or ('und', 'Undetermined')
+
+
+def _contains_name(haystack, name):
+    """True if name occurs in haystack and is not just the start of a longer word"""
+    start = haystack.find(name)
+    while start != -1:
+        end = start + len(name)
+        if end == len(haystack) or not haystack[end].isalnum():
+            return True
+        start = haystack.find(name, start + 1)
+    return False
+
+
+class DirectoryIndex:
+    """
+    One scan of a directory: its videos and its subtitle sidecars with
+    their languages detected up front.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.mtime_ns = os.stat(self.directory).st_mtime_ns
+        self.video_stems = set()
+        self.subtitles = []
+
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                stem, ext = os.path.splitext(entry.name)
+                ext = ext.lower()
+                if ext in VIDEO_EXTENSIONS:
+                    self.video_stems.add(stem.lower())
+                elif ext in SUBTITLE_EXTENSIONS:
+                    tags = detect_subtitle_tags(entry.name)
+                    lang_code, lang_title = tags.language or ('und', 'Undetermined')
+                    self.subtitles.append(SubtitleTrack(Path(entry.path), lang_code, lang_title, tags))
+        self.subtitles.sort(key=lambda sub: sub.path.name.lower())
+
+        self._by_video = self._assign_subtitles()
+
+    def _assign_subtitles(self):
+        """Map each video stem to the subtitles whose names belong to it"""
+        by_video = {stem: [] for stem in self.video_stems}
+        for subtitle in self.subtitles:
+            sub_stem = subtitle.path.stem.lower()
+
+            # Fast path: the video name followed by tags (Show.S01E01.eng.srt).
+            # Try the longest prefix ending at a separator first.
+            owner = None
+            cut_points = [m.start() for m in _SEPARATOR_RE.finditer(sub_stem)]
+            for cut in [len(sub_stem)] + cut_points[::-1]:
+                if sub_stem[:cut] in by_video:
+                    owner = sub_stem[:cut]
+                    break
+            if owner is not None:
+                by_video[owner].append(subtitle)
+                continue
+
+            # Slow path: the video name appears elsewhere in the subtitle name
+            for stem in self.video_stems:
+                if _contains_name(sub_stem, stem):
+                    by_video[stem].append(subtitle)
+        return by_video
+
+    def matches(self, video_path):
+        """Subtitles for one video in this directory"""
+        # Only one video in folder - grab all subtitles
+        if len(self.video_stems) == 1:
+            return list(self.subtitles)
+        return list(self._by_video.get(Path(video_path).stem.lower(), []))
+
+
+class SubtitleIndex:
+    """
+    Per-directory subtitle index, built once per batch and shared by every
+    video in the same folder. A directory is rescanned only when its mtime
+    changes (files added, removed or renamed).
+    """
+
+    def __init__(self):
+        self._directories = {}
+        self._lock = threading.Lock()
+
+    def directory(self, directory):
+        """Return an up-to-date DirectoryIndex for directory"""
+        key = os.path.abspath(directory)
+        mtime_ns = os.stat(key).st_mtime_ns
+        with self._lock:
+            index = self._directories.get(key)
+            if index is None or index.mtime_ns != mtime_ns:
+                index = DirectoryIndex(key)
+                self._directories[key] = index
+            return index
+
+    def find(self, video_path):
+        return self.directory(Path(video_path).parent).matches(video_path)
+
+    def clear(self):
+        with self._lock:
+            self._directories.clear()
+
+
+def find_matching_subtitles(video_path, index=None):
+    """
+    Find all subtitle sidecars (.srt/.ass/.ssa/.vtt) in the video's directory
+    that match the current video.
+    Returns a list of SubtitleTrack(path, language_code, language_title, tags)
+    """
+    if index is None:
+        index = SubtitleIndex()
+    return index.find(video_path)
@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark import generate_clip  # noqa: E402
+from ffmpeg_utils import find_ffmpeg  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def app_home(tmp_path, monkeypatch):
+    """Keep caches, ledgers and queues out of the real per-user directory"""
+    home = tmp_path / "home"
+    monkeypatch.setenv("AV1CONVERTER_HOME", str(home))
+    return home
+
+
+@pytest.fixture(scope="session")
+def ffmpeg_path():
+    path = find_ffmpeg()
+    if not path:
+        pytest.skip("ffmpeg not found")
+    return path
+
+
+@pytest.fixture
+def clip(ffmpeg_path, tmp_path):
+    """A short generated clip with video and audio"""
+    return generate_clip(ffmpeg_path, str(tmp_path / "testsrc2.mkv"), "320x180", 1)
@@ -0,0 +1,30 @@
+"""
+End-to-end encodes of a generated clip through ConversionEngine.run_job
+with each CPU backend. Cases skip when ffmpeg or the encoder is missing.
+"""
+
+import pytest
+
+from conversion_engine import ConversionEngine, ConversionSettings, JobSpec
+from encoders import get_backend, list_ffmpeg_encoders
+from media_probe import probe_media
+from scheduler import DONE, EncodeScheduler
+
+
+@pytest.mark.parametrize("key", ["svtav1", "aom", "rav1e"])
+def test_run_job_encodes_av1(key, ffmpeg_path, clip, tmp_path):
+    backend = get_backend(key)
+    if backend.encoder not in list_ffmpeg_encoders(ffmpeg_path):
+        pytest.skip(f"{backend.encoder} is not in this ffmpeg build")
+
+    settings = ConversionSettings(encoder=key, preset="fast", quality=40)
+    output = str(tmp_path / f"out_{key}.mkv")
+    engine = ConversionEngine(settings, ffmpeg_path=ffmpeg_path, skip_completed=False)
+    scheduler = EncodeScheduler(engine.run_job, slots=1, max_attempts=1)
+    job = scheduler.submit(clip, spec=JobSpec(clip, settings, output))
+    scheduler.start()
+    scheduler.close()
+    scheduler.wait()
+
+    assert job.state == DONE, job.error
+    assert probe_media(output, use_cache=False).video_codec == "av1"
@@ -0,0 +1,91 @@
+"""
+Coordinator plus two real `av1convert --worker` processes: a worker killed
+mid-job loses its lease, and the job is requeued and finished by the other.
+"""
+
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import pytest
+
+from benchmark import generate_clip
+from conversion_engine import ConversionSettings, JobSpec
+from distributed import Coordinator, CoordinatorServer
+from encoders import get_backend, list_ffmpeg_encoders
+from scheduler import DONE, ENCODING
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LEASE_SECONDS = 2
+
+
+def wait_for(condition, timeout, message):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            pytest.fail(message)
+        time.sleep(0.1)
+
+
+def start_worker(url, name, home):
+    env = dict(os.environ, AV1CONVERTER_HOME=str(home))
+    return subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "av1convert.py"), "--worker", url, "--worker-name", name,
+         "-j", "1", "--encoder", "svtav1", "--preset", "quality"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        env=env,
+        # Own process group, so killing it takes its ffmpeg children along
+        start_new_session=True,
+    )
+
+
+def kill_worker(process):
+    if hasattr(os, "killpg"):
+        os.killpg(process.pid, signal.SIGKILL)
+    else:
+        process.kill()
+    process.wait()
+
+
+def test_killed_worker_job_is_requeued(ffmpeg_path, tmp_path):
+    if get_backend("svtav1").encoder not in list_ffmpeg_encoders(ffmpeg_path):
+        pytest.skip("libsvtav1 is not in this ffmpeg build")
+
+    # Long enough that the first worker is still encoding when it is killed
+    clip = generate_clip(ffmpeg_path, str(tmp_path / "testsrc2.mkv"), "640x360", 20)
+    output = tmp_path / "out" / "testsrc2.mkv"
+    settings = ConversionSettings(encoder="svtav1", preset="quality")
+
+    coordinator = Coordinator(lease_seconds=LEASE_SECONDS)
+    item = coordinator.submit(JobSpec(clip, settings, output))
+    coordinator.close()
+    coordinator.start()
+    server = CoordinatorServer(coordinator, 0, "127.0.0.1").start()
+    workers = []
+    try:
+        first = start_worker(server.address, "first", tmp_path / "first")
+        workers.append(first)
+        wait_for(lambda: item.worker == "first" and item.state == ENCODING, 60,
+                 "the first worker never started encoding")
+
+        second = start_worker(server.address, "second", tmp_path / "second")
+        workers.append(second)
+        kill_worker(first)
+
+        wait_for(lambda: item.worker == "second", 60, "the job was never requeued to the second worker")
+        wait_for(lambda: item.is_finished, 300, "the second worker never finished the job")
+        assert item.state == DONE, item.error
+        assert item.expiries == 1
+        assert item.leases == 2
+        assert output.exists()
+        # Told there is nothing left, the second worker exits on its own
+        assert second.wait(timeout=60) == 0
+    finally:
+        for worker in workers:
+            if worker.poll() is None:
+                kill_worker(worker)
+        server.stop()
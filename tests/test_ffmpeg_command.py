@@ -0,0 +1,134 @@
+"""
+argv checks for build_ffmpeg_command/video_encode_args across resolutions,
+decode paths and copy-video/remux. Pure: nothing here needs ffmpeg.
+"""
+
+import pytest
+
+import hwaccel
+from conversion_engine import (
+    RESOLUTION_MAP, ConversionSettings, build_ffmpeg_command, first_pass_command, video_encode_args,
+)
+from encoders import get_backend
+from hwaccel import CudaDecode, select_decode
+
+
+HWACCEL_ARGS = ['-hwaccel', 'cuda', '-hwaccel_output_format', 'cuda']
+QUIET_ARGS = ['-hide_banner', '-loglevel', 'warning']
+
+DECODES = {
+    "software": None,
+    "scale_cuda": CudaDecode("scale_cuda"),
+    "scale_npp": CudaDecode("scale_npp"),
+}
+
+
+def contains(args, part):
+    """True if part appears in args as a contiguous run"""
+    return any(args[i:i + len(part)] == part for i in range(len(args) - len(part) + 1))
+
+
+def vf_values(args):
+    return [args[i + 1] for i, arg in enumerate(args) if arg == '-vf']
+
+
+def expected_filter(resolution, decode):
+    scale = RESOLUTION_MAP[resolution]
+    if scale is None:
+        return []
+    scaler = "scale" if decode is None else decode.scaler
+    return [f"{scaler}={scale}:force_original_aspect_ratio=decrease"]
+
+
+@pytest.mark.parametrize("copy_video", [False, True], ids=["encode", "copy"])
+@pytest.mark.parametrize("decode_name", list(DECODES))
+@pytest.mark.parametrize("resolution", list(RESOLUTION_MAP))
+def test_build_ffmpeg_command(resolution, decode_name, copy_video):
+    decode = DECODES[decode_name]
+    settings = ConversionSettings(resolution=resolution, encoder="nvenc")
+    cmd = build_ffmpeg_command("ffmpeg", "in.mkv", "out.mkv", [], settings,
+                               copy_video=copy_video, hw_decode=decode)
+
+    assert cmd[0] == "ffmpeg"
+    assert contains(cmd, QUIET_ARGS)
+    assert cmd[-2:] == ['-y', 'out.mkv']
+    before_input = cmd[:cmd.index('-i')]
+    if decode is not None and not copy_video:
+        assert contains(before_input, HWACCEL_ARGS)
+    else:
+        assert '-hwaccel' not in cmd
+    if copy_video:
+        assert contains(cmd, ['-c:v', 'copy'])
+        assert vf_values(cmd) == []
+    else:
+        assert contains(cmd, ['-c:v', get_backend("nvenc").encoder])
+        assert vf_values(cmd) == expected_filter(resolution, decode)
+
+
+@pytest.mark.parametrize("decode_name", list(DECODES))
+def test_first_pass_command(decode_name):
+    decode = DECODES[decode_name]
+    settings = ConversionSettings(resolution="720p", encoder="aom")
+    cmd = first_pass_command("ffmpeg", "in.mkv", settings, "passlog", hw_decode=decode)
+
+    assert contains(cmd, QUIET_ARGS)
+    assert contains(cmd, ['-pass', '1'])
+    assert ('-hwaccel' in cmd) is (decode is not None)
+    assert cmd[-4:] == ['-f', 'null', '-y', '-']
+
+
+@pytest.mark.parametrize("decode_name", list(DECODES))
+@pytest.mark.parametrize("resolution", list(RESOLUTION_MAP))
+def test_remux_only_copies_video_and_audio(resolution, decode_name):
+    settings = ConversionSettings(resolution=resolution, remux_only=True)
+    cmd = build_ffmpeg_command("ffmpeg", "in.mkv", "out.mkv", [], settings,
+                               copy_video=True, hw_decode=DECODES[decode_name])
+
+    assert contains(cmd, ['-c:v', 'copy'])
+    assert contains(cmd, ['-c:a', 'copy'])
+    assert '-hwaccel' not in cmd
+    assert vf_values(cmd) == []
+
+
+@pytest.mark.parametrize("decode_name", list(DECODES))
+@pytest.mark.parametrize("resolution", list(RESOLUTION_MAP))
+def test_video_encode_args_filter(resolution, decode_name):
+    decode = DECODES[decode_name]
+    settings = ConversionSettings(resolution=resolution, encoder="nvenc")
+    assert vf_values(video_encode_args(settings, hw_decode=decode)) == expected_filter(resolution, decode)
+
+
+@pytest.mark.parametrize("mode, encoder, hwaccels", [
+    ("software", "nvenc", {"cuda"}),
+    ("auto", "svtav1", {"cuda"}),
+    ("cuda", "svtav1", {"cuda"}),
+    ("auto", "nvenc", set()),
+    ("cuda", "nvenc", set()),
+])
+def test_software_scale_without_cuda_decode(monkeypatch, mode, encoder, hwaccels):
+    monkeypatch.setattr(hwaccel, "list_hwaccels", lambda ffmpeg_path: hwaccels)
+    monkeypatch.setattr(hwaccel, "_filter_names", lambda ffmpeg_path: set(hwaccel.CUDA_SCALERS))
+    monkeypatch.setattr(hwaccel, "test_gpu_scaler", lambda ffmpeg_path, scaler: True)
+    monkeypatch.setattr(hwaccel, "_detected", {})
+
+    decode = select_decode(mode, get_backend(encoder), "ffmpeg")
+    assert decode is None
+
+    settings = ConversionSettings(resolution="720p", encoder=encoder)
+    cmd = build_ffmpeg_command("ffmpeg", "in.mkv", "out.mkv", [], settings, hw_decode=decode)
+    assert '-hwaccel' not in cmd
+    assert vf_values(cmd) == ['scale=1280:720:force_original_aspect_ratio=decrease']
+
+
+def test_cuda_decode_selected_when_available(monkeypatch):
+    monkeypatch.setattr(hwaccel, "list_hwaccels", lambda ffmpeg_path: {"cuda"})
+    monkeypatch.setattr(hwaccel, "_filter_names", lambda ffmpeg_path: {"scale_npp"})
+    monkeypatch.setattr(hwaccel, "test_gpu_scaler", lambda ffmpeg_path, scaler: True)
+    monkeypatch.setattr(hwaccel, "_detected", {})
+
+    decode = select_decode("auto", get_backend("nvenc"), "ffmpeg")
+    assert decode.scaler == "scale_npp"
+    settings = ConversionSettings(resolution="1080p", encoder="nvenc")
+    cmd = build_ffmpeg_command("ffmpeg", "in.mkv", "out.mkv", [], settings, hw_decode=decode)
+    assert contains(cmd[:cmd.index('-i')], HWACCEL_ARGS)
+    assert vf_values(cmd) == ['scale_npp=1920:1080:force_original_aspect_ratio=decrease']
@@ -0,0 +1,136 @@
+import pytest
+
+import ffmpeg_progress
+from ffmpeg_progress import ProgressParser, Throttle
+
+
+# Blocks as written by `ffmpeg -progress pipe:1`, before the first frame,
+# mid-encode and at the end; OLD_BLOCK is from builds without out_time_us
+START_BLOCK = """\
+frame=0
+fps=0.00
+stream_0_0_q=0.0
+bitrate=N/A
+total_size=N/A
+out_time_us=N/A
+out_time_ms=N/A
+out_time=N/A
+dup_frames=0
+drop_frames=0
+speed=N/A
+progress=continue
+"""
+
+MID_BLOCK = """\
+frame=240
+fps=48.00
+stream_0_0_q=31.0
+bitrate=1234.5kbits/s
+total_size=1543210
+out_time_us=10000000
+out_time_ms=10000000
+out_time=00:00:10.000000
+dup_frames=2
+drop_frames=1
+speed=2.00x
+progress=continue
+"""
+
+OLD_BLOCK = """\
+frame=1440
+fps=24.5
+bitrate=900.0kbits/s
+total_size=4000000
+out_time=00:00:30.500000
+speed=0.5x
+progress=continue
+"""
+
+END_BLOCK = """\
+frame=1440
+fps=47.90
+bitrate=1100.0kbits/s
+total_size=8250000
+out_time_us=60000000
+out_time_ms=60000000
+out_time=00:01:00.000000
+dup_frames=2
+drop_frames=3
+speed=2.01x
+progress=end
+"""
+
+
+def feed(parser, block):
+    events = [parser.feed(line) for line in block.splitlines()]
+    # Only the closing progress= line produces an event
+    assert events[:-1] == [None] * (len(events) - 1)
+    return events[-1]
+
+
+@pytest.mark.parametrize("block, expected", [
+    (START_BLOCK, dict(out_time=None, frame=0, fps=0.0, bitrate=None, total_size=None, speed=None,
+                       dup_frames=0, drop_frames=0, finished=False, fraction=0.0, eta=None)),
+    (MID_BLOCK, dict(out_time=10.0, frame=240, fps=48.0, bitrate=1234.5, total_size=1543210, speed=2.0,
+                     dup_frames=2, drop_frames=1, finished=False, fraction=10 / 60, eta=25.0)),
+    (OLD_BLOCK, dict(out_time=30.5, frame=1440, fps=24.5, bitrate=900.0, total_size=4000000, speed=0.5,
+                     dup_frames=None, drop_frames=None, finished=False, fraction=30.5 / 60, eta=59.0)),
+    (END_BLOCK, dict(out_time=60.0, frame=1440, fps=47.9, bitrate=1100.0, total_size=8250000, speed=2.01,
+                     dup_frames=2, drop_frames=3, finished=True, fraction=1.0, eta=0.0)),
+])
+def test_progress_block(block, expected):
+    event = feed(ProgressParser(duration=60), block)
+    for name, value in expected.items():
+        assert getattr(event, name) == pytest.approx(value), name
+
+
+def test_blocks_do_not_leak_fields():
+    parser = ProgressParser(duration=60)
+    feed(parser, MID_BLOCK)
+    event = feed(parser, "out_time=00:00:20.000000\nprogress=continue\n")
+    assert event.out_time == 20.0
+    assert event.frame is None
+    assert event.speed is None
+
+
+def test_unknown_duration():
+    event = feed(ProgressParser(), MID_BLOCK)
+    assert event.fraction == 0.0
+    assert event.eta is None
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def test_throttle_rate(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ffmpeg_progress, "time", clock)
+    throttle = Throttle(0.25)
+
+    passed = []
+    # 100 events a second for two seconds
+    for i in range(200):
+        clock.now = 1000.0 + i * 0.01
+        if throttle.ready():
+            passed.append(clock.now)
+    assert len(passed) == 8
+    assert all(b - a >= 0.25 - 1e-9 for a, b in zip(passed, passed[1:]))
+
+
+def test_throttle_force(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ffmpeg_progress, "time", clock)
+    throttle = Throttle(1)
+    assert throttle.ready()
+    assert not throttle.ready()
+    assert throttle.ready(force=True)
+    clock.now += 0.5
+    # force restarts the interval
+    assert not throttle.ready()
+    clock.now += 0.5
+    assert throttle.ready()
@@ -0,0 +1,89 @@
+"""
+JobStore persistence: a queued job and its settings snapshot survive
+reopening the database, and a job left running by a dead process resumes.
+"""
+
+import pytest
+
+from conversion_engine import ConversionSettings, JobSpec
+from job_queue import JobStore, job_settings
+from output_files import host_tag
+from scheduler import DONE, EncodeScheduler
+
+
+QUEUED_SETTINGS = ConversionSettings(resolution="720p", quality=28, preset="fast", audio_languages=["en"])
+DEFAULT_SETTINGS = ConversionSettings(encoder="svtav1")
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return tmp_path / "queue.sqlite3"
+
+
+def reopen(db_path):
+    store = JobStore(db_path)
+    jobs = store.load_pending()
+    return store, jobs
+
+
+def test_settings_survive_reopen(db_path):
+    store = JobStore(db_path)
+    queued = store.add(["/videos/a.mkv"], priority=2, settings=QUEUED_SETTINGS.to_dict())[0]
+    store.close()
+
+    store, jobs = reopen(db_path)
+    store.close()
+    assert [(job.id, job.input_path, job.priority) for job in jobs] == [(queued.id, "/videos/a.mkv", 2)]
+    settings = job_settings(jobs[0], DEFAULT_SETTINGS)
+    expected = dict(QUEUED_SETTINGS.to_dict(), encoder="svtav1")
+    assert settings.to_dict() == expected
+
+
+def test_job_of_dead_process_is_resumed(db_path):
+    store = JobStore(db_path)
+    queued = store.add(["/videos/a.mkv"], settings=QUEUED_SETTINGS.to_dict())[0]
+    # As if the process that was encoding it had crashed
+    store._conn.execute(
+        "UPDATE jobs SET status = 'running', owner = ? WHERE id = ?", (f"{host_tag()}-999999999", queued.id)
+    )
+    store._conn.commit()
+    store.close()
+
+    store, jobs = reopen(db_path)
+    assert [(job.id, job.status, job.owner) for job in jobs] == [(queued.id, "queued", store.owner)]
+
+    ran = []
+
+    def run_job(job, scheduler):
+        ran.append(job.spec)
+
+    scheduler = EncodeScheduler(run_job, slots=1, store=store)
+    for job in jobs:
+        spec = JobSpec(job.input_path, job_settings(job, DEFAULT_SETTINGS), "/out/a.mkv")
+        scheduler.submit(job.input_path, job.priority, spec, job.id)
+    scheduler.start()
+    scheduler.close()
+    scheduler.wait()
+    store.close()
+
+    assert [(spec.input_path, spec.settings.quality) for spec in ran] == [("/videos/a.mkv", 28)]
+    store, jobs = reopen(db_path)
+    status = store._conn.execute("SELECT status FROM jobs WHERE id = ?", (queued.id,)).fetchone()[0]
+    store.close()
+    assert jobs == []
+    assert status == DONE
+
+
+def test_invalid_saved_settings_are_logged(db_path):
+    store = JobStore(db_path)
+    saved = dict(QUEUED_SETTINGS.to_dict(), resolution="8k")
+    queued = store.add(["/videos/a.mkv"], settings=saved)[0]
+    store.close()
+
+    store, jobs = reopen(db_path)
+    store.close()
+    messages = []
+    assert job_settings(jobs[0], DEFAULT_SETTINGS, messages.append) is DEFAULT_SETTINGS
+    assert len(messages) == 1
+    assert f"job {queued.id} (a.mkv)" in messages[0]
+    assert "8k" in messages[0]
@@ -0,0 +1,19 @@
+import os
+
+from load_control import ProcessLimits, threads_per_job
+
+
+def test_shared_threads_follow_running_jobs(monkeypatch):
+    monkeypatch.setattr(os, "cpu_count", lambda: 16)
+    limits = ProcessLimits(share_threads=True)
+    # A job running alone is not capped; later ones split the CPU
+    assert limits.threads_for(1) is None
+    assert limits.threads_for(2) == 8
+    assert limits.threads_for(4) == 4
+
+
+def test_fixed_thread_cap_wins(monkeypatch):
+    monkeypatch.setattr(os, "cpu_count", lambda: 16)
+    assert ProcessLimits(threads=3, share_threads=True).threads_for(1) == 3
+    assert ProcessLimits(threads=threads_per_job(4)).threads_for(1) == 4
+    assert ProcessLimits().threads_for(4) is None
@@ -0,0 +1,225 @@
+"""
+ProcessRunner and the scheduler's process control, driven by a small Python
+child that writes ffmpeg-style -progress blocks.
+"""
+
+import os
+import signal
+import sys
+import threading
+import time
+
+import pytest
+
+from process_runner import ProcessRunner
+from scheduler import CANCELLED, DONE, EncodeScheduler, RetryableError, terminate_process
+
+
+# argv: -progress STEPS INTERVAL HANG [ignore-term]; writes STEPS progress
+# blocks INTERVAL seconds apart, then sleeps HANG seconds before ending
+CHILD = """\
+import signal, sys, time
+steps, interval, hang = int(sys.argv[2]), float(sys.argv[3]), float(sys.argv[4])
+if "ignore-term" in sys.argv:
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+for i in range(steps):
+    print(f"frame={i}\\nout_time_us={i * 100000}\\nprogress=continue", flush=True)
+    sys.stderr.write(f"step {i}\\n")
+    sys.stderr.flush()
+    time.sleep(interval)
+time.sleep(hang)
+print("progress=end", flush=True)
+"""
+
+
+def child(steps, interval=0.0, hang=0.0, progress=True, ignore_term=False):
+    cmd = [sys.executable, "-c", CHILD, "-progress" if progress else "-quiet", str(steps), str(interval), str(hang)]
+    if ignore_term:
+        cmd.append("ignore-term")
+    return cmd
+
+
+@pytest.fixture
+def runner():
+    runners = []
+
+    def make(stall_seconds=0):
+        runner = ProcessRunner(stall_seconds)
+        runner.start()
+        runners.append(runner)
+        return runner
+
+    yield make
+    for runner in runners:
+        runner.stop()
+
+
+def communicate_in_thread(runner, handle, **kwargs):
+    """Run communicate() on another thread; returns (thread, result holder)"""
+    holder = {}
+
+    def target():
+        holder["result"] = runner.communicate(handle, **kwargs)
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread, holder
+
+
+def test_progress_and_stderr(runner):
+    runner = runner()
+    events, lines = [], []
+    handle = runner.spawn(child(5))
+    result = runner.communicate(handle, duration=0.5, on_progress=events.append, on_line=lines.append, keep=3)
+
+    assert result.returncode == 0
+    assert not result.stalled
+    assert [event.frame for event in events[:-1]] == [0, 1, 2, 3, 4]
+    assert events[-1].finished
+    assert lines == [f"step {i}" for i in range(5)]
+    assert result.lines == ["step 2", "step 3", "step 4"]
+
+
+def test_pause_and_resume(runner):
+    # The watchdog would kill the child after 0.3s without progress unless paused
+    runner = runner(stall_seconds=0.3)
+    events = []
+    handle = runner.spawn(child(20, interval=0.05))
+    thread, holder = communicate_in_thread(runner, handle, on_progress=events.append)
+
+    deadline = time.monotonic() + 10
+    while not events and time.monotonic() < deadline:
+        time.sleep(0.01)
+    handle.pause()
+    assert handle.paused
+    time.sleep(0.3)
+    seen = len(events)
+    time.sleep(1.0)
+    assert len(events) == seen, "a paused child kept writing progress"
+
+    handle.resume()
+    thread.join(10)
+    assert not thread.is_alive()
+    result = holder["result"]
+    assert result.returncode == 0
+    assert not result.stalled
+    assert events[-1].finished
+
+
+def test_stalled_child_is_killed(runner):
+    runner = runner(stall_seconds=0.5)
+    start = time.monotonic()
+    handle = runner.spawn(child(1, hang=30))
+    result = runner.communicate(handle)
+
+    assert result.stalled
+    assert result.returncode != 0
+    assert time.monotonic() - start < 10
+
+
+def test_no_stall_watchdog_without_progress_channel(runner):
+    runner = runner(stall_seconds=0.3)
+    handle = runner.spawn(child(1, hang=1.0, progress=False))
+    result = runner.communicate(handle)
+
+    assert result.returncode == 0
+    assert not result.stalled
+
+
+def test_terminate_stops_child(runner):
+    runner = runner()
+    handle = runner.spawn(child(1, hang=30))
+    thread, holder = communicate_in_thread(runner, handle)
+    terminate_process(handle)
+    thread.join(10)
+
+    assert not thread.is_alive()
+    assert holder["result"].returncode != 0
+    if os.name != "nt":
+        assert handle.returncode == -signal.SIGTERM
+
+
+@pytest.mark.skipif(os.name == "nt", reason="SIGTERM can't be ignored on Windows")
+def test_terminate_escalates_to_kill(runner):
+    runner = runner()
+    events = []
+    handle = runner.spawn(child(1, hang=30, ignore_term=True))
+    thread, holder = communicate_in_thread(runner, handle, on_progress=events.append)
+    # The handler is installed before the first progress block
+    deadline = time.monotonic() + 10
+    while not events and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    start = time.monotonic()
+    terminate_process(handle, timeout=0.5)
+    thread.join(10)
+
+    assert not thread.is_alive()
+    assert handle.returncode == -signal.SIGKILL
+    assert time.monotonic() - start < 5
+
+
+def test_scheduler_pause_and_cancel(tmp_path):
+    started = threading.Event()
+
+    def run_job(job, scheduler):
+        started.set()
+        scheduler.run_process(job, child(1, hang=30))
+
+    scheduler = EncodeScheduler(run_job, slots=1, max_attempts=1)
+    job = scheduler.submit(str(tmp_path / "input.mkv"))
+    scheduler.start()
+    scheduler.close()
+    assert started.wait(10)
+    deadline = time.monotonic() + 10
+    while not job.processes and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    scheduler.pause_job(job)
+    assert job.paused
+    assert all(process.paused for process in job.processes)
+    scheduler.resume_job(job)
+    assert not any(process.paused for process in job.processes)
+
+    scheduler.cancel_job(job)
+    scheduler.wait()
+    assert job.state == CANCELLED
+    assert not job.processes
+
+
+def test_scheduler_runs_child_to_completion(tmp_path):
+    results = []
+
+    def run_job(job, scheduler):
+        results.append(scheduler.run_process(job, child(3)))
+
+    scheduler = EncodeScheduler(run_job, slots=1, max_attempts=1)
+    job = scheduler.submit(str(tmp_path / "input.mkv"))
+    scheduler.start()
+    scheduler.close()
+    scheduler.wait()
+
+    assert job.state == DONE
+    assert job.exit_code == 0
+    assert results[0].lines == ["step 0", "step 1", "step 2"]
+
+
+def test_retried_job_is_not_finished_while_waiting(tmp_path):
+    seen = []
+
+    def run_job(job, scheduler):
+        seen.append(job.finished_at)
+        if job.attempts == 1:
+            raise RetryableError("transient")
+
+    scheduler = EncodeScheduler(run_job, slots=1, max_attempts=2, retry_base=0.2)
+    job = scheduler.submit(str(tmp_path / "input.mkv"))
+    scheduler.start()
+    scheduler.close()
+    scheduler.wait()
+
+    # Still unset when the retry starts
+    assert seen == [None, None]
+    assert job.state == DONE
+    assert job.attempts == 2
+    assert job.finished_at >= job.started_at
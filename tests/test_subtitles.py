@@ -0,0 +1,17 @@
+import pytest
+
+from subtitles import detect_subtitle_tags
+
+
+@pytest.mark.parametrize("filename, languages, sdh", [
+    ("Movie.hi.srt", ["hin"], False),
+    ("Movie.en.hi.srt", ["eng"], True),
+    ("Movie.hi.forced.srt", ["hin"], False),
+    ("Movie.eng.sdh.srt", ["eng"], True),
+    ("Movie.en.cc.srt", ["eng"], True),
+    ("Hi.Mom.en.srt", ["eng"], False),
+])
+def test_hi_is_hindi_unless_next_to_another_language(filename, languages, sdh):
+    tags = detect_subtitle_tags(filename)
+    assert [code for code, _ in tags.languages] == languages
+    assert tags.sdh is sdh
@@ -3,126 +3,105 @@ Modern Video Converter - AV1 Hardware Encoding with CustomTkinter GUI
 Requires: customtkinter, ffmpeg.exe in the same directory
 """
 
+import heapq
 import os
-import subprocess
+import queue
 import threading
-import re
-from pathlib import Path
+import time
 from tkinter import filedialog, messagebox
 import customtkinter as ctk
 
-# Set appearance mode and color theme
-ctk.set_appearance_mode("System")
-ctk.set_default_color_theme("blue")
+from chunked_encode import ChunkedEncoder
+from conversion_engine import (
+    AUDIO_CODEC_MAP,
+    DEFAULT_AUDIO,
+    DEFAULT_QUALITY,
+    DEFAULT_RESOLUTION,
+    RESOLUTION_MAP,
+    ConversionEngine,
+    ConversionSettings,
+    OutputPlanner,
+)
+from encode_profiles import DEFAULT_PROFILE, PROFILES
+from encoders import BACKENDS, DEFAULT_ENCODER, DEFAULT_PRESET, PRESETS, detect_backends, select_backend
+from ffmpeg_utils import find_ffmpeg
+from hwaccel import select_decode
+from analysis import Analyzer
+from app_paths import app_data_dir
+from job_ledger import JobLedger
+from job_queue import JobStore, job_settings
+from library_scan import LibraryScanner, ScanFilter
+from load_control import ProcessLimits, auto_concurrency, threads_per_job
+from log_buffer import MAX_LOG_LINES, LogBuffer
+from metrics import RunReport
+from quality_search import QualitySearch, QualitySearchCache
+from scheduler import EncodeScheduler, DONE, ENCODING, SKIPPED, FAILED, CANCELLED
+from staging import StagingArea
+from stream_selection import parse_languages
 
 
-def detect_subtitle_language(filename):
-    """
-    Detect language code from subtitle filename.
-    Returns tuple: (language_code, language_title)
-    """
-    filename_lower = filename.lower()
-    
-    # Language patterns: (pattern, code, title)
-    language_patterns = [
-        # English variants
-        (r'\beng\b', 'eng', 'English'),
-        (r'\ben\b', 'eng', 'English'),
-        (r'\benglish\b', 'eng', 'English'),
-        
-        # Spanish variants
-        (r'\bspa\b', 'spa', 'Spanish'),
-        (r'\bes\b', 'spa', 'Spanish'),
-        (r'\bspanish\b', 'spa', 'Spanish'),
-        (r'\bespañol\b', 'spa', 'Spanish'),
-        
-        # French variants
-        (r'\bfre\b', 'fre', 'French'),
-        (r'\bfra\b', 'fre', 'French'),
-        (r'\bfr\b', 'fre', 'French'),
-        (r'\bfrench\b', 'fre', 'French'),
-        
-        # German variants
-        (r'\bger\b', 'ger', 'German'),
-        (r'\bdeu\b', 'ger', 'German'),
-        (r'\bde\b', 'ger', 'German'),
-        (r'\bgerman\b', 'ger', 'German'),
-        
-        # Italian variants
-        (r'\bita\b', 'ita', 'Italian'),
-        (r'\bit\b', 'ita', 'Italian'),
-        (r'\bitalian\b', 'ita', 'Italian'),
-        
-        # Portuguese variants
-        (r'\bpor\b', 'por', 'Portuguese'),
-        (r'\bpt\b', 'por', 'Portuguese'),
-        (r'\bportuguese\b', 'por', 'Portuguese'),
-        
-        # Japanese variants
-        (r'\bjpn\b', 'jpn', 'Japanese'),
-        (r'\bja\b', 'jpn', 'Japanese'),
-        (r'\bjapanese\b', 'jpn', 'Japanese'),
-        
-        # Chinese variants
-        (r'\bchi\b', 'chi', 'Chinese'),
-        (r'\bzh\b', 'chi', 'Chinese'),
-        (r'\bchinese\b', 'chi', 'Chinese'),
-        
-        # Korean variants
-        (r'\bkor\b', 'kor', 'Korean'),
-        (r'\bko\b', 'kor', 'Korean'),
-        (r'\bkorean\b', 'kor', 'Korean'),
-        
-        # Russian variants
-        (r'\brus\b', 'rus', 'Russian'),
-        (r'\bru\b', 'rus', 'Russian'),
-        (r'\brussian\b', 'rus', 'Russian'),
-        
-        # Arabic variants
-        (r'\bara\b', 'ara', 'Arabic'),
-        (r'\bar\b', 'ara', 'Arabic'),
-        (r'\barabic\b', 'ara', 'Arabic'),
-    ]
-    
-    for pattern, code, title in language_patterns:
-        if re.search(pattern, filename_lower):
-            return (code, title)
-    
-    # Default to English if no language detected
-    return ('eng', 'English')
+# How often queued log lines and progress are pushed to the widgets (ms)
+UI_REFRESH_MS = 100
+# Rows rendered in the queue view; the rest are summarised in one line
+MAX_QUEUE_ROWS = 500
+# Folder scan results are handed to the UI in batches of this many files
+SCAN_BATCH_SIZE = 200
+
+# Per-title CQ search choices: label -> (metric, target score)
+QUALITY_TARGETS = {
+    "Off (use CQ slider)": (None, None),
+    "VMAF 95 (transparent)": ("vmaf", 95.0),
+    "VMAF 93 (high)": ("vmaf", 93.0),
+    "VMAF 90 (good)": ("vmaf", 90.0),
+    "SSIM 0.98": ("ssim", 0.98),
+}
 
 
 class VideoConverterApp(ctk.CTk):
     def __init__(self):
+        # Set appearance mode and color theme
+        ctk.set_appearance_mode("System")
+        ctk.set_default_color_theme("blue")
+        
         super().__init__()
         
         # Configure window
         self.title("AV1 Video Converter")
-        self.geometry("900x750")
+        self.geometry("900x800")
         self.minsize(800, 650)
         
         # Variables
-        self.queue = []
+        self.queue = {}  # input path -> job_queue.QueuedJob
         self.is_converting = False
-        self.current_process = None
-        
-        # Resolution mapping
-        self.resolution_map = {
-            "Original": None,
-            "1080p": "1920:1080",
-            "720p": "1280:720"
-        }
-        
-        # Audio codec mapping
-        self.audio_codec_map = {
-            "Copy Original (Recommended)": {"codec": "copy", "bitrate": None},
-            "AAC 128k": {"codec": "aac", "bitrate": "128k"},
-            "AAC 192k": {"codec": "aac", "bitrate": "192k"},
-            "Opus 128k": {"codec": "libopus", "bitrate": "128k"}
-        }
+        self.scheduler = None
+        self.staging = None
+        self.run_report = None
+        self.ledger = JobLedger()
+        # The queue is persisted so closing the window or a crash doesn't lose it
+        self.job_store = JobStore()
+        # Settings of the running batch, for queued files saved without any
+        self.batch_settings = None
+        self.output_planner = None
+        
+        # Worker threads never touch widgets: they post here and the Tk
+        # thread applies everything in one batch per UI_REFRESH_MS
+        self.log_buffer = LogBuffer()
+        self.finished_paths = queue.SimpleQueue()
+        self.ui_calls = queue.SimpleQueue()
+        self.pending_progress = None
+        self.queue_dirty = False
+        self.active_scans = 0
         
         # Setup UI
         self.setup_ui()
+        self.restore_queue()
+        self.after(UI_REFRESH_MS, self.refresh_ui)
+        
+        # Probing encoders runs a short test encode; keep it off the UI thread
+        threading.Thread(target=self.detect_encoders, daemon=True).start()
+        
+        # Make sure no ffmpeg children outlive the window
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
         
     def setup_ui(self):
         # Configure grid
@@ -188,10 +167,10 @@ class VideoConverterApp(ctk.CTk):
         )
         resolution_label.grid(row=0, column=0, padx=(20, 10), pady=10, sticky="w")
         
-        self.resolution_var = ctk.StringVar(value="Original")
+        self.resolution_var = ctk.StringVar(value=DEFAULT_RESOLUTION)
         self.resolution_dropdown = ctk.CTkOptionMenu(
             settings_frame,
-            values=["Original", "1080p", "720p"],
+            values=list(RESOLUTION_MAP),
             variable=self.resolution_var,
             font=ctk.CTkFont(size=13),
             width=150
@@ -206,10 +185,10 @@ class VideoConverterApp(ctk.CTk):
         )
         audio_label.grid(row=1, column=0, padx=(20, 10), pady=10, sticky="w")
         
-        self.audio_var = ctk.StringVar(value="Copy Original (Recommended)")
+        self.audio_var = ctk.StringVar(value=DEFAULT_AUDIO)
         self.audio_dropdown = ctk.CTkOptionMenu(
             settings_frame,
-            values=["Copy Original (Recommended)", "AAC 128k", "AAC 192k", "Opus 128k"],
+            values=list(AUDIO_CODEC_MAP),
             variable=self.audio_var,
             font=ctk.CTkFont(size=13),
             width=200
@@ -228,7 +207,7 @@ class VideoConverterApp(ctk.CTk):
         slider_frame.grid(row=2, column=1, padx=10, pady=10, sticky="ew")
         slider_frame.grid_columnconfigure(0, weight=1)
         
-        self.quality_var = ctk.IntVar(value=40)
+        self.quality_var = ctk.IntVar(value=DEFAULT_QUALITY)
         self.quality_slider = ctk.CTkSlider(
             slider_frame,
             from_=35,
@@ -241,7 +220,7 @@ class VideoConverterApp(ctk.CTk):
         
         self.quality_value_label = ctk.CTkLabel(
             slider_frame,
-            text="40",
+            text=str(DEFAULT_QUALITY),
             font=ctk.CTkFont(size=14, weight="bold"),
             width=40
         )
@@ -263,10 +242,63 @@ class VideoConverterApp(ctk.CTk):
         )
         self.output_name_entry.grid(row=3, column=1, padx=10, pady=10, sticky="ew")
         
+        # Encoder backend ("Auto" picks the best one this machine supports) and
+        # speed preset share a row; everything else is under Advanced
+        encoder_label = ctk.CTkLabel(
+            settings_frame,
+            text="Encoder:",
+            font=ctk.CTkFont(size=14, weight="bold")
+        )
+        encoder_label.grid(row=4, column=0, padx=(20, 10), pady=10, sticky="w")
+        
+        encoder_frame = ctk.CTkFrame(settings_frame, fg_color="transparent")
+        encoder_frame.grid(row=4, column=1, padx=10, pady=10, sticky="ew")
+        encoder_frame.grid_columnconfigure(3, weight=1)
+        
+        self.encoder_names = {backend.name: backend.key for backend in BACKENDS}
+        self.encoder_var = ctk.StringVar(value="Auto")
+        self.encoder_dropdown = ctk.CTkOptionMenu(
+            encoder_frame,
+            values=["Auto"] + list(self.encoder_names),
+            variable=self.encoder_var,
+            font=ctk.CTkFont(size=13),
+            width=180
+        )
+        self.encoder_dropdown.grid(row=0, column=0, padx=(0, 10), sticky="w")
+        
+        ctk.CTkLabel(
+            encoder_frame,
+            text="Preset:",
+            font=ctk.CTkFont(size=14, weight="bold")
+        ).grid(row=0, column=1, padx=(0, 10), sticky="w")
+        
+        self.preset_var = ctk.StringVar(value=DEFAULT_PRESET)
+        self.preset_dropdown = ctk.CTkOptionMenu(
+            encoder_frame,
+            values=PRESETS,
+            variable=self.preset_var,
+            font=ctk.CTkFont(size=13),
+            width=120
+        )
+        self.preset_dropdown.grid(row=0, column=2, sticky="w")
+        
+        self.advanced_btn = ctk.CTkButton(
+            encoder_frame,
+            text="Advanced...",
+            command=self.show_advanced,
+            font=ctk.CTkFont(size=13),
+            width=110
+        )
+        self.advanced_btn.grid(row=0, column=3, sticky="e")
+        
+        self.setup_advanced_dialog()
+        
         # Start conversion button and progress
         conversion_frame = ctk.CTkFrame(self)
         conversion_frame.grid(row=4, column=0, padx=20, pady=10, sticky="ew")
         conversion_frame.grid_columnconfigure(0, weight=1)
+        conversion_frame.grid_columnconfigure(1, weight=0)
+        conversion_frame.grid_columnconfigure(2, weight=0)
         
         self.start_btn = ctk.CTkButton(
             conversion_frame,
@@ -277,11 +309,35 @@ class VideoConverterApp(ctk.CTk):
             fg_color="#1f6aa5",
             hover_color="#144870"
         )
-        self.start_btn.grid(row=0, column=0, padx=20, pady=(20, 10), sticky="ew")
+        self.start_btn.grid(row=0, column=0, padx=(20, 5), pady=(20, 10), sticky="ew")
+        
+        self.pause_btn = ctk.CTkButton(
+            conversion_frame,
+            text="Pause",
+            command=self.toggle_pause,
+            height=50,
+            width=120,
+            font=ctk.CTkFont(size=16, weight="bold"),
+            state="disabled"
+        )
+        self.pause_btn.grid(row=0, column=1, padx=5, pady=(20, 10), sticky="ew")
+        
+        self.cancel_btn = ctk.CTkButton(
+            conversion_frame,
+            text="Cancel",
+            command=self.cancel_conversion,
+            height=50,
+            width=120,
+            font=ctk.CTkFont(size=16, weight="bold"),
+            fg_color="#a51f1f",
+            hover_color="#701414",
+            state="disabled"
+        )
+        self.cancel_btn.grid(row=0, column=2, padx=(5, 20), pady=(20, 10), sticky="ew")
         
         # Progress bar
         progress_frame = ctk.CTkFrame(conversion_frame)
-        progress_frame.grid(row=1, column=0, padx=20, pady=(0, 10), sticky="ew")
+        progress_frame.grid(row=1, column=0, columnspan=3, padx=20, pady=(0, 10), sticky="ew")
         progress_frame.grid_columnconfigure(0, weight=1)
         
         self.progress_bar = ctk.CTkProgressBar(progress_frame)
@@ -296,20 +352,219 @@ class VideoConverterApp(ctk.CTk):
         )
         self.progress_label.grid(row=0, column=1)
         
+        # Speed/ETA of the most recently updated job
+        self.status_label = ctk.CTkLabel(
+            progress_frame,
+            text="",
+            font=ctk.CTkFont(size=12),
+            anchor="w"
+        )
+        self.status_label.grid(row=1, column=0, columnspan=2, sticky="ew")
+        
         # Log window
         log_label = ctk.CTkLabel(
             conversion_frame,
             text="Log Output",
             font=ctk.CTkFont(size=14, weight="bold")
         )
-        log_label.grid(row=2, column=0, padx=20, pady=(10, 5), sticky="w")
+        log_label.grid(row=2, column=0, columnspan=3, padx=20, pady=(10, 5), sticky="w")
         
         self.log_textbox = ctk.CTkTextbox(
             conversion_frame,
             font=ctk.CTkFont(size=11),
             height=150
         )
-        self.log_textbox.grid(row=3, column=0, padx=20, pady=(0, 20), sticky="ew")
+        self.log_textbox.grid(row=3, column=0, columnspan=3, padx=20, pady=(0, 20), sticky="ew")
+        
+    def setup_advanced_dialog(self):
+        """
+        Build the Advanced window. It is created hidden and only ever hidden
+        again, so its variables can be read when a batch starts.
+        """
+        self.advanced_dialog = ctk.CTkToplevel(self)
+        self.advanced_dialog.title("Advanced Settings")
+        self.advanced_dialog.geometry("680x560")
+        self.advanced_dialog.withdraw()
+        self.advanced_dialog.protocol("WM_DELETE_WINDOW", self.advanced_dialog.withdraw)
+        self.advanced_dialog.grid_columnconfigure(0, weight=1)
+        self.advanced_dialog.grid_rowconfigure(0, weight=1)
+        
+        advanced_frame = ctk.CTkScrollableFrame(self.advanced_dialog)
+        advanced_frame.grid(row=0, column=0, padx=20, pady=(20, 10), sticky="nsew")
+        advanced_frame.grid_columnconfigure(1, weight=1)
+        
+        close_btn = ctk.CTkButton(
+            self.advanced_dialog,
+            text="Close",
+            command=self.advanced_dialog.withdraw,
+            font=ctk.CTkFont(size=13),
+            width=110
+        )
+        close_btn.grid(row=1, column=0, padx=20, pady=(0, 20), sticky="e")
+        
+        def section(row, text):
+            ctk.CTkLabel(
+                advanced_frame,
+                text=text,
+                font=ctk.CTkFont(size=15, weight="bold")
+            ).grid(row=row, column=0, columnspan=2, padx=10, pady=(15, 5), sticky="w")
+        
+        def option_label(row, text):
+            ctk.CTkLabel(
+                advanced_frame,
+                text=text,
+                font=ctk.CTkFont(size=14, weight="bold")
+            ).grid(row=row, column=0, padx=(20, 10), pady=10, sticky="w")
+        
+        def checkbox(row, text, variable):
+            box = ctk.CTkCheckBox(
+                advanced_frame,
+                text=text,
+                variable=variable,
+                font=ctk.CTkFont(size=13)
+            )
+            box.grid(row=row, column=0, columnspan=2, padx=20, pady=10, sticky="w")
+            return box
+        
+        section(0, "Encoding")
+        
+        # Encode profile: keyframe interval, lookahead, AQ, film grain, two-pass
+        option_label(1, "Encode Profile:")
+        self.profile_var = ctk.StringVar(value=DEFAULT_PROFILE)
+        self.profile_dropdown = ctk.CTkOptionMenu(
+            advanced_frame,
+            values=list(PROFILES),
+            variable=self.profile_var,
+            font=ctk.CTkFont(size=13),
+            width=150
+        )
+        self.profile_dropdown.grid(row=1, column=1, padx=10, pady=10, sticky="w")
+        
+        # Per-title CQ search
+        option_label(2, "Auto CQ Target:")
+        self.quality_target_var = ctk.StringVar(value=next(iter(QUALITY_TARGETS)))
+        self.quality_target_dropdown = ctk.CTkOptionMenu(
+            advanced_frame,
+            values=list(QUALITY_TARGETS),
+            variable=self.quality_target_var,
+            font=ctk.CTkFont(size=13),
+            width=200
+        )
+        self.quality_target_dropdown.grid(row=2, column=1, padx=10, pady=10, sticky="w")
+        
+        # CUDA decode + GPU scaling for NVENC; falls back to the CPU automatically
+        self.gpu_decode_var = ctk.BooleanVar(value=True)
+        self.gpu_decode_checkbox = checkbox(
+            3, "Decode and scale on the GPU when possible (NVENC)", self.gpu_decode_var
+        )
+        
+        section(4, "Streams")
+        
+        # Copy video and audio, only adding subtitle sidecars
+        self.remux_only_var = ctk.BooleanVar(value=False)
+        self.remux_only_checkbox = checkbox(
+            5, "Remux only: add subtitles without re-encoding", self.remux_only_var
+        )
+        
+        self.drop_commentary_var = ctk.BooleanVar(value=False)
+        self.drop_commentary_checkbox = checkbox(6, "Leave out commentary audio tracks", self.drop_commentary_var)
+        
+        # Audio languages to keep, e.g. "eng, jpn"; blank keeps every track
+        option_label(7, "Audio Languages:")
+        self.audio_lang_entry = ctk.CTkEntry(
+            advanced_frame,
+            placeholder_text="All (or e.g. eng, jpn)",
+            font=ctk.CTkFont(size=13),
+            width=300
+        )
+        self.audio_lang_entry.grid(row=7, column=1, padx=10, pady=10, sticky="ew")
+        
+        section(8, "Batch")
+        
+        # Auto starts further jobs only while CPU, memory, disk and NVENC have headroom
+        option_label(9, "Parallel Jobs:")
+        self.slots_var = ctk.StringVar(value="Auto")
+        self.slots_dropdown = ctk.CTkOptionMenu(
+            advanced_frame,
+            values=["Auto", "1", "2", "3", "4", "6", "8"],
+            variable=self.slots_var,
+            font=ctk.CTkFont(size=13),
+            width=150
+        )
+        self.slots_dropdown.grid(row=9, column=1, padx=10, pady=10, sticky="w")
+        
+        # Incremental mode: skip inputs already converted with the same settings
+        self.skip_completed_var = ctk.BooleanVar(value=True)
+        self.skip_completed_checkbox = checkbox(
+            10, "Skip files already converted with these settings", self.skip_completed_var
+        )
+        
+        # Pre-encode analysis: remux or skip files that wouldn't shrink
+        self.analyze_var = ctk.BooleanVar(value=False)
+        self.analyze_checkbox = checkbox(
+            11, "Analyze first: skip or remux files an AV1 encode wouldn't shrink", self.analyze_var
+        )
+        
+        # Chunked mode: long files are split at keyframes and can resume after a crash
+        self.chunked_var = ctk.BooleanVar(value=False)
+        self.chunked_checkbox = checkbox(12, "Resumable chunked encoding for long files", self.chunked_var)
+        
+        # Copy network-share files to local disk ahead of the encoder
+        self.staging_var = ctk.BooleanVar(value=False)
+        self.staging_checkbox = checkbox(
+            13, "Stage network-share files through local scratch (prefetch next files)", self.staging_var
+        )
+        
+        # Queue priority for files added from now on
+        self.priority_var = ctk.BooleanVar(value=False)
+        self.priority_checkbox = checkbox(
+            14, "Put newly added files at the front of the queue", self.priority_var
+        )
+        
+        # Folder scanning options used by Select Folder
+        section(15, "Folder Scan")
+        
+        scan_frame = ctk.CTkFrame(advanced_frame, fg_color="transparent")
+        scan_frame.grid(row=16, column=0, columnspan=2, padx=20, pady=10, sticky="ew")
+        scan_frame.grid_columnconfigure(2, weight=1)
+        
+        self.recursive_var = ctk.BooleanVar(value=True)
+        ctk.CTkCheckBox(
+            scan_frame,
+            text="Include subfolders",
+            variable=self.recursive_var,
+            font=ctk.CTkFont(size=13)
+        ).grid(row=0, column=0, padx=(0, 10), sticky="w")
+        
+        self.skip_av1_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(
+            scan_frame,
+            text="Skip files already in AV1",
+            variable=self.skip_av1_var,
+            font=ctk.CTkFont(size=13)
+        ).grid(row=0, column=1, padx=(0, 10), sticky="w")
+        
+        self.exclude_entry = ctk.CTkEntry(
+            scan_frame,
+            placeholder_text="Exclude, e.g. *sample*, Extras/*",
+            font=ctk.CTkFont(size=13)
+        )
+        self.exclude_entry.grid(row=0, column=2, sticky="ew")
+        
+    def show_advanced(self):
+        self.advanced_dialog.deiconify()
+        self.advanced_dialog.lift()
+        self.advanced_dialog.focus()
+        
+    def detect_encoders(self):
+        """Background thread: limit the encoder dropdown to what actually works"""
+        usable = detect_backends()
+        if not usable:
+            self.log("WARNING: no AV1 encoder found in this ffmpeg build")
+            return
+        names = ["Auto"] + [backend.name for backend in usable]
+        self.log(f"Available encoders: {', '.join(names[1:])}")
+        self.call_on_ui(lambda: self.encoder_dropdown.configure(values=names))
         
     def update_quality_label(self, value):
         """Update quality value label when slider moves"""
@@ -326,86 +581,173 @@ class VideoConverterApp(ctk.CTk):
             filetypes=filetypes
         )
         if filename:
-            self.add_to_queue(filename)
+            self.add_to_queue([filename])
             
     def select_folder(self):
         """Select a folder and add all video files"""
         folder = filedialog.askdirectory(title="Select folder with videos")
         if folder:
-            video_extensions = {'.mp4', '.mkv', '.avi', '.mov', '.flv', '.wmv', '.webm'}
-            folder_path = Path(folder)
-            video_files = [
-                str(f) for f in folder_path.iterdir()
-                if f.is_file() and f.suffix.lower() in video_extensions
-            ]
-            if video_files:
-                for video_file in video_files:
-                    self.add_to_queue(video_file)
-                self.log(f"Added {len(video_files)} video(s) from folder")
-            else:
-                messagebox.showinfo("No Videos", "No video files found in selected folder")
+            exclude = [pattern.strip() for pattern in self.exclude_entry.get().split(",") if pattern.strip()]
+            scanner = LibraryScanner(
+                ScanFilter(exclude=exclude, skip_av1=self.skip_av1_var.get()),
+                recursive=self.recursive_var.get()
+            )
+            self.active_scans += 1
+            self.log(f"Scanning {folder}...")
+            threading.Thread(target=self.scan_worker, args=(scanner, folder), daemon=True).start()
+            
+    def scan_worker(self, scanner, folder):
+        """Background thread: stream scan results to the queue in batches"""
+        batch = []
+        count = 0
+        for path in scanner.scan([folder]):
+            batch.append(path)
+            count += 1
+            if len(batch) >= SCAN_BATCH_SIZE:
+                self.call_on_ui(self.add_to_queue, batch)
+                batch = []
+        if batch:
+            self.call_on_ui(self.add_to_queue, batch)
+        for path, error in scanner.errors:
+            self.log(f"WARNING: could not scan {path}: {error}")
+        self.call_on_ui(self.scan_finished, folder, count)
+        
+    def scan_finished(self, folder, count):
+        """A folder scan is done; lets a streaming conversion know no more files are coming"""
+        self.active_scans -= 1
+        if count:
+            self.log(f"Found {count} video(s) in {folder}")
+        else:
+            messagebox.showinfo("No Videos", "No video files found in selected folder")
+        if self.active_scans == 0 and self.is_converting and self.scheduler and not self.scheduler.closed:
+            self.scheduler.close()
                 
-    def add_to_queue(self, filepath):
-        """Add a file to the conversion queue"""
-        if filepath not in self.queue:
-            self.queue.append(filepath)
+    def restore_queue(self):
+        """Reload jobs left unfinished when the app was last closed (or crashed)"""
+        for job in self.job_store.load_pending():
+            self.queue.setdefault(job.input_path, job)
+        if self.queue:
+            self.log(f"Restored {len(self.queue)} queued video(s) from the last session")
             self.update_queue_display()
-            self.log(f"Added to queue: {os.path.basename(filepath)}")
-        else:
-            self.log(f"Already in queue: {os.path.basename(filepath)}")
+            
+    def form_settings(self):
+        """
+        Snapshot of the settings form (Tk thread only). Files keep the settings
+        they were queued with; the encoder is resolved when the batch starts.
+        """
+        metric, score = QUALITY_TARGETS[self.quality_target_var.get()]
+        return ConversionSettings(
+            resolution=self.resolution_var.get(),
+            audio=self.audio_var.get(),
+            quality=self.quality_var.get(),
+            output_name=self.output_name_entry.get(),
+            encoder=self.encoder_names.get(self.encoder_var.get(), DEFAULT_ENCODER),
+            preset=self.preset_var.get(),
+            target_metric=metric,
+            target_score=score,
+            audio_languages=self.form_audio_languages(),
+            drop_commentary=self.drop_commentary_var.get(),
+            remux_only=self.remux_only_var.get(),
+            profile=self.profile_var.get()
+        )
+        
+    def form_audio_languages(self):
+        """Language codes from the Audio Languages field; unknown codes are reported and ignored"""
+        try:
+            return parse_languages(self.audio_lang_entry.get())
+        except ValueError as e:
+            self.log(f"WARNING: {e}; keeping all audio tracks")
+            return ()
+        
+    def add_to_queue(self, filepaths):
+        """Add files to the conversion queue with a single redraw"""
+        added = list(dict.fromkeys(path for path in filepaths if path not in self.queue))
+        settings = self.form_settings()
+        jobs = self.job_store.add(
+            added, priority=1 if self.priority_var.get() else 0, settings=settings.to_dict()
+        )
+        for job in jobs:
+            self.queue[job.input_path] = job
+        duplicates = len(filepaths) - len(added)
+        
+        if len(added) == 1:
+            self.log(f"Added to queue: {os.path.basename(added[0])} ({settings.describe()})")
+        elif added:
+            self.log(f"Added {len(added)} video(s) to queue ({settings.describe()})")
+        if duplicates:
+            self.log(f"Already in queue: {duplicates} file(s)")
+        if added:
+            self.update_queue_display()
+            # A conversion started mid-scan picks up newly found files too
+            if self.is_converting and self.scheduler and not self.scheduler.closed:
+                self.submit_jobs(self.scheduler, jobs)
             
     def update_queue_display(self):
-        """Update the queue display"""
+        """Redraw the queue in run order; only the first MAX_QUEUE_ROWS entries are rendered"""
+        jobs = heapq.nsmallest(MAX_QUEUE_ROWS, self.queue.values(), key=lambda job: (-job.priority, job.id))
+        lines = []
+        for i, job in enumerate(jobs, 1):
+            line = f"{i}. {job.input_path}"
+            if job.priority:
+                line += "  [priority]"
+            if job.status in (FAILED, CANCELLED):
+                line += f"  ({job.status} last time)"
+            lines.append(line)
+        if len(self.queue) > MAX_QUEUE_ROWS:
+            lines.append(f"... and {len(self.queue) - MAX_QUEUE_ROWS} more")
         self.queue_textbox.delete("1.0", "end")
-        for i, filepath in enumerate(self.queue, 1):
-            self.queue_textbox.insert("end", f"{i}. {filepath}\n")
+        if lines:
+            self.queue_textbox.insert("end", "\n".join(lines) + "\n")
+        self.queue_dirty = False
             
     def log(self, message):
-        """Add message to log window"""
-        self.log_textbox.insert("end", f"{message}\n")
-        self.log_textbox.see("end")
-    
-    def find_matching_subtitles(self, video_path):
-        """
-        Find all SRT files in the video's directory that match the current video.
-        Returns list of tuples: [(srt_path, language_code, language_title), ...]
-        """
-        video_path = Path(video_path)
-        video_dir = video_path.parent
-        video_stem = video_path.stem.lower()
-        
-        # Find all SRT files in the directory
-        all_srt_files = list(video_dir.glob("*.srt"))
-        
-        if not all_srt_files:
-            return []
-        
-        # Find all video files in the directory
-        video_extensions = {'.mp4', '.mkv', '.avi', '.mov', '.flv', '.wmv', '.webm'}
-        all_video_files = [
-            f for f in video_dir.iterdir()
-            if f.is_file() and f.suffix.lower() in video_extensions
-        ]
-        
-        matching_subtitles = []
-        
-        # Safeguard logic for batch processing
-        if len(all_video_files) == 1:
-            # Only one video in folder - grab all SRTs
-            for srt_file in all_srt_files:
-                lang_code, lang_title = detect_subtitle_language(srt_file.name)
-                matching_subtitles.append((srt_file, lang_code, lang_title))
-        else:
-            # Multiple videos - only grab SRTs that match this video's filename
-            for srt_file in all_srt_files:
-                srt_stem = srt_file.stem.lower()
-                # Check if SRT filename contains the video filename
-                if video_stem in srt_stem:
-                    lang_code, lang_title = detect_subtitle_language(srt_file.name)
-                    matching_subtitles.append((srt_file, lang_code, lang_title))
+        """Queue a message for the log window; safe to call from any thread"""
+        self.log_buffer.write(message)
+        
+    def call_on_ui(self, func, *args):
+        """Run func(*args) on the Tk thread at the next refresh; safe from any thread"""
+        self.ui_calls.put((func, args))
+        
+    def refresh_ui(self):
+        """Tk timer: apply log lines, finished jobs and progress posted by workers"""
+        while True:
+            try:
+                func, args = self.ui_calls.get_nowait()
+            except queue.Empty:
+                break
+            func(*args)
         
-        return matching_subtitles
+        self.flush_log()
         
+        while True:
+            try:
+                path = self.finished_paths.get_nowait()
+            except queue.Empty:
+                break
+            if self.queue.pop(path, None) is not None:
+                self.queue_dirty = True
+        if self.queue_dirty:
+            self.update_queue_display()
+            
+        progress, self.pending_progress = self.pending_progress, None
+        if progress is not None:
+            self.update_progress(*progress)
+            
+        self.after(UI_REFRESH_MS, self.refresh_ui)
+        
+    def flush_log(self):
+        """Append pending log lines in one insert and trim the widget to MAX_LOG_LINES"""
+        lines, dropped = self.log_buffer.drain()
+        if not lines:
+            return
+        if dropped:
+            lines.insert(0, f"... {dropped} line(s) omitted, see {self.log_buffer.log_path}")
+        self.log_textbox.insert("end", "\n".join(lines) + "\n")
+        line_count = int(self.log_textbox.index("end-1c").split(".")[0])
+        if line_count > MAX_LOG_LINES:
+            self.log_textbox.delete("1.0", f"{line_count - MAX_LOG_LINES}.0")
+        self.log_textbox.see("end")
+    
     def start_conversion(self):
         """Start the conversion process in a separate thread"""
         if self.is_converting:
@@ -417,8 +759,7 @@ class VideoConverterApp(ctk.CTk):
             return
             
         # Check if ffmpeg exists
-        ffmpeg_path = os.path.join(os.getcwd(), 'ffmpeg.exe')
-        if not os.path.exists(ffmpeg_path):
+        if not find_ffmpeg():
             messagebox.showerror(
                 "FFmpeg Not Found",
                 f"ffmpeg.exe not found in:\n{os.getcwd()}\n\nPlease place ffmpeg.exe in the same directory as this script."
@@ -427,199 +768,272 @@ class VideoConverterApp(ctk.CTk):
             
         self.is_converting = True
         self.start_btn.configure(state="disabled", text="Converting...")
+        self.cancel_btn.configure(state="normal")
+        self.pause_btn.configure(state="normal", text="Pause")
         self.select_file_btn.configure(state="disabled")
         self.select_folder_btn.configure(state="disabled")
         
-        # Start conversion in separate thread
-        conversion_thread = threading.Thread(target=self.conversion_worker, daemon=True)
-        conversion_thread.start()
+        # Snapshot the form on the main thread; the worker never touches widgets
+        options = {
+            "encoder": self.encoder_names.get(self.encoder_var.get(), "auto"),
+            "preset": self.preset_var.get(),
+            "resolution": self.resolution_var.get(),
+            "audio": self.audio_var.get(),
+            "quality": self.quality_var.get(),
+            "output_name": self.output_name_entry.get(),
+            "skip_completed": self.skip_completed_var.get(),
+            "chunked": self.chunked_var.get(),
+            "analyze": self.analyze_var.get(),
+            "staging": self.staging_var.get(),
+            "decode": "auto" if self.gpu_decode_var.get() else "software",
+            "quality_target": QUALITY_TARGETS[self.quality_target_var.get()],
+            "audio_languages": self.form_audio_languages(),
+            "drop_commentary": self.drop_commentary_var.get(),
+            "remux_only": self.remux_only_var.get(),
+            "profile": self.profile_var.get(),
+            "slots": None if self.slots_var.get() == "Auto" else int(self.slots_var.get()),
+            "files": list(self.queue),
+            "jobs": list(self.queue.values()),
+        }
+        self.scheduler = None
         
-    def conversion_worker(self):
-        """Worker thread for conversion process"""
-        total_files = len(self.queue)
+        conversion_thread = threading.Thread(target=self.conversion_worker, args=(options,), daemon=True)
+        conversion_thread.start()
         
-        for index, filepath in enumerate(self.queue.copy(), 1):
-            self.log(f"\n{'='*60}")
-            self.log(f"Converting {index}/{total_files}: {os.path.basename(filepath)}")
-            self.log(f"{'='*60}")
-            
-            try:
-                self.convert_video(filepath)
-                self.queue.remove(filepath)
-                self.after(0, self.update_queue_display)
-            except Exception as e:
-                self.log(f"ERROR: {str(e)}")
-                
-        self.is_converting = False
-        self.after(0, self.conversion_complete)
-        
-    def convert_video(self, input_file):
-        """Convert a single video file"""
-        input_path = Path(input_file)
-        
-        # Create output directory
-        output_dir = input_path.parent / "Converted"
-        output_dir.mkdir(exist_ok=True)
-        
-        # Determine output filename (UPDATED: custom or default)
-        custom_name = self.output_name_entry.get().strip()
-        if custom_name:
-            # Use custom name, ensure .mkv extension
-            if not custom_name.endswith('.mkv'):
-                output_filename = f"{custom_name}.mkv"
-            else:
-                output_filename = custom_name
+    def build_scheduler(self, options):
+        """Resolve the encoder and queue the snapshotted files on a new scheduler"""
+        ffmpeg_path = find_ffmpeg()
+        backend = select_backend(options["encoder"], ffmpeg_path, log=self.log)
+        self.log(f"Encoder: {backend.name} ({options['preset']})")
+        settings = ConversionSettings(
+            resolution=options["resolution"],
+            audio=options["audio"],
+            quality=options["quality"],
+            output_name=options["output_name"],
+            encoder=backend.key,
+            preset=options["preset"],
+            target_metric=options["quality_target"][0],
+            target_score=options["quality_target"][1],
+            audio_languages=options["audio_languages"],
+            drop_commentary=options["drop_commentary"],
+            remux_only=options["remux_only"],
+            profile=options["profile"]
+        )
+        self.staging = StagingArea(log=self.log) if options["staging"] else None
+        if options["slots"] is None:
+            admission, limits = auto_concurrency(backend, log=self.log)
+            slots = admission.max_jobs
         else:
-            # Use default naming
-            output_filename = f"{input_path.stem}_AV1.mkv"
-        
-        output_path = output_dir / output_filename
-        
-        # Smart Subtitle Scanner - Find all matching SRT files
-        matching_subtitles = self.find_matching_subtitles(input_file)
+            admission = None
+            limits = ProcessLimits(threads=threads_per_job(options["slots"]))
+            slots = options["slots"]
+        chunked_encoder = None
+        if options["chunked"]:
+            chunked_encoder = ChunkedEncoder(ffmpeg_path, settings, self.log)
+        engine = ConversionEngine(
+            settings,
+            ffmpeg_path=ffmpeg_path,
+            log=self.log,
+            ledger=self.ledger,
+            skip_completed=options["skip_completed"],
+            chunked_encoder=chunked_encoder,
+            analyzer=Analyzer(settings, ffmpeg_path, log=self.log) if options["analyze"] else None,
+            quality_search=QualitySearch(
+                ffmpeg_path, settings, log=self.log, cache=QualitySearchCache()
+            ) if settings.target_metric else None,
+            staging=self.staging,
+            hw_decode=select_decode(options["decode"], backend, ffmpeg_path, log=self.log),
+            limits=limits
+        )
+        if engine.analyzer is not None:
+            self.log(f"Analyzing {len(options['files'])} file(s)...")
+            settings_by_path = {job.input_path: job_settings(job, settings) for job in options["jobs"]}
+            analyses = engine.analyze_batch(options["files"], workers=slots, settings_by_path=settings_by_path)
+            for analysis in analyses:
+                self.log(analysis.summary())
+            actions = [analysis.action for analysis in analyses]
+            self.log(
+                f"Analysis: {actions.count('encode')} to encode, "
+                f"{actions.count('remux')} to remux, {actions.count('skip')} to skip"
+            )
+        scheduler = EncodeScheduler(
+            engine.run_job, slots=slots, store=self.job_store, admission=admission, limits=limits
+        )
+        scheduler.on_update = lambda job: self.on_job_update(job, scheduler)
+        report_dir = app_data_dir() / "reports"
+        self.run_report = RunReport(str(report_dir / time.strftime("run-%Y%m%d-%H%M%S.jsonl")))
+        self.batch_settings = settings
+        self.output_planner = OutputPlanner()
+        self.submit_jobs(scheduler, options["jobs"])
+        return scheduler
+        
+    def submit_jobs(self, scheduler, jobs):
+        """
+        Hand queued jobs to the scheduler, each with an immutable JobSpec
+        built from the settings it was queued with and a unique output path
+        """
+        self.job_store.assign_settings(jobs, self.batch_settings.to_dict())
+        for job in jobs:
+            spec = self.output_planner.plan(job.input_path, job_settings(job, self.batch_settings, self.log))
+            scheduler.submit(job.input_path, job.priority, spec, job.id)
         
-        if matching_subtitles:
-            subtitle_names = [f"{srt.name} ({lang_title})" for srt, _, lang_title in matching_subtitles]
-            self.log(f"Found {len(matching_subtitles)} subtitle file(s): {', '.join(subtitle_names)}")
+    def attach_scheduler(self, scheduler, snapshot):
+        """
+        Tk thread: publish the running scheduler, hand it files queued since the
+        snapshot, and close it unless a folder scan is still streaming files in
+        """
+        self.scheduler = scheduler
+        snapshot = set(snapshot)
+        self.submit_jobs(scheduler, [job for path, job in self.queue.items() if path not in snapshot])
+        if self.active_scans == 0:
+            scheduler.close()
+        if scheduler.admission is not None:
+            self.log(f"Starting {len(scheduler.jobs)} job(s), up to {scheduler.slots} at once as load allows")
         else:
-            self.log("No subtitle files found")
-        
-        # Build ffmpeg command
-        ffmpeg_path = os.path.join(os.getcwd(), 'ffmpeg.exe')
-        
-        cmd = [ffmpeg_path, '-i', str(input_path)]
-        
-        # Add all subtitle files as inputs
-        for srt_file, _, _ in matching_subtitles:
-            cmd.extend(['-i', str(srt_file)])
-        
-        # Video encoding settings
-        cmd.extend([
-            '-c:v', 'av1_nvenc',
-            '-preset', 'p7',
-            '-cq', str(self.quality_var.get())
-        ])
-        
-        # Resolution scaling if not original
-        resolution = self.resolution_var.get()
-        if resolution != "Original":
-            scale = self.resolution_map[resolution]
-            cmd.extend(['-vf', f'scale={scale}:force_original_aspect_ratio=decrease'])
-        
-        # Audio encoding (UPDATED: Copy or re-encode based on selection)
-        audio_selection = self.audio_var.get()
-        audio_settings = self.audio_codec_map[audio_selection]
-        cmd.extend(['-c:a', audio_settings['codec']])
-        
-        # Only add bitrate if not copying
-        if audio_settings['bitrate'] is not None:
-            cmd.extend(['-b:a', audio_settings['bitrate']])
-        
-        # Subtitle handling
-        cmd.extend(['-c:s', 'copy'])
-        
-        # Map streams (CRITICAL: proper mapping for video, audio, and all subtitles)
-        cmd.extend(['-map', '0:v'])  # Map video from first input
-        cmd.extend(['-map', '0:a'])  # Map audio from first input
-        
-        # Map each subtitle file and set metadata
-        for idx, (srt_file, lang_code, lang_title) in enumerate(matching_subtitles):
-            input_index = idx + 1  # Subtitle inputs start at index 1
-            subtitle_stream_index = idx  # Subtitle stream index in output
+            self.log(f"Starting {len(scheduler.jobs)} job(s) on {scheduler.slots} slot(s)")
+        
+    def cancel_conversion(self):
+        """Cancel pending jobs and stop every running ffmpeg process"""
+        if self.scheduler and self.is_converting:
+            self.log("Cancelling conversion...")
+            self.cancel_btn.configure(state="disabled")
+            self.pause_btn.configure(state="disabled")
+            # Terminating children can block briefly; keep the UI responsive
+            threading.Thread(target=self.scheduler.cancel_all, daemon=True).start()
             
-            cmd.extend(['-map', f'{input_index}:0'])  # Map subtitle from input
-            cmd.extend(['-metadata:s:s:{}'.format(subtitle_stream_index), f'language={lang_code}'])
-            cmd.extend(['-metadata:s:s:{}'.format(subtitle_stream_index), f'title={lang_title}'])
-        
-        # Output file
-        cmd.extend(['-y', str(output_path)])
-        
-        self.log(f"Command: {' '.join(cmd)}")
-        
-        # Get video duration for progress calculation
-        duration = self.get_video_duration(input_file)
-        
-        # Run ffmpeg
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            universal_newlines=True,
-            creationflags=subprocess.CREATE_NO_WINDOW
-        )
-        
-        self.current_process = process
-        
-        # Parse output for progress
-        for line in process.stdout:
-            line = line.strip()
-            if line:
-                # Look for time progress
-                time_match = re.search(r'time=(\d+):(\d+):(\d+\.\d+)', line)
-                if time_match and duration > 0:
-                    hours, minutes, seconds = time_match.groups()
-                    current_time = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
-                    progress = min(current_time / duration, 1.0)
-                    percentage = int(progress * 100)
-                    
-                    self.after(0, lambda p=progress, pct=percentage: self.update_progress(p, pct))
-                
-                # Log important lines
-                if any(keyword in line.lower() for keyword in ['error', 'warning', 'frame=', 'speed=']):
-                    self.log(line)
-        
-        process.wait()
-        
-        if process.returncode == 0:
-            self.log(f"✓ Successfully converted: {output_filename}")
-            self.after(0, lambda: self.update_progress(1.0, 100))
+    def toggle_pause(self):
+        """Suspend every running ffmpeg process (and start no new files), or resume them"""
+        if not (self.scheduler and self.is_converting):
+            return
+        if self.scheduler.paused:
+            self.scheduler.resume_all()
+            self.pause_btn.configure(text="Pause")
+            self.log("Resumed")
         else:
-            raise Exception(f"FFmpeg exited with code {process.returncode}")
+            self.scheduler.pause_all()
+            self.pause_btn.configure(text="Resume")
+            self.log("Paused; running encodes are suspended until Resume")
             
-    def get_video_duration(self, input_file):
-        """Get video duration in seconds using ffmpeg"""
+    def on_close(self):
+        """Stop running conversions before closing the window"""
+        if self.scheduler and self.is_converting:
+            self.scheduler.cancel_all()
+        self.log_buffer.close()
+        self.destroy()
+        
+    def conversion_worker(self, options):
+        """Worker thread that runs the scheduler until it drains"""
+        self.run_report = None
         try:
-            ffmpeg_path = os.path.join(os.getcwd(), 'ffmpeg.exe')
-            cmd = [
-                ffmpeg_path,
-                '-i', input_file,
-                '-f', 'null',
-                '-'
-            ]
-            
-            result = subprocess.run(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                universal_newlines=True,
-                creationflags=subprocess.CREATE_NO_WINDOW
+            scheduler = self.build_scheduler(options)
+        except RuntimeError as e:
+            # No usable encoder; conversion_complete() explains with scheduler unset
+            self.log(f"ERROR: {e}")
+            self.finish_worker()
+            return
+        except Exception as e:
+            self.log(f"ERROR: could not start the conversion: {e}")
+            self.finish_worker(error=str(e))
+            return
+        error = None
+        try:
+            scheduler.start()
+            self.call_on_ui(self.attach_scheduler, scheduler, options["files"])
+            scheduler.wait()
+            # A staged output that fails to move marks its job failed, so
+            # let the moves finish before counting
+            self.close_staging()
+            counts = scheduler.counts()
+            self.log(
+                f"Finished: {counts.get(DONE, 0)} done, {counts.get(SKIPPED, 0)} skipped, "
+                f"{counts.get(FAILED, 0)} failed, {counts.get(CANCELLED, 0)} cancelled"
             )
-            
-            # Parse duration from output
-            duration_match = re.search(r'Duration: (\d+):(\d+):(\d+\.\d+)', result.stdout)
-            if duration_match:
-                hours, minutes, seconds = duration_match.groups()
-                return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
-        except:
-            pass
-        return 0
-        
-    def update_progress(self, progress, percentage):
-        """Update progress bar and label"""
+        except Exception as e:
+            self.log(f"ERROR: {e}")
+            error = str(e)
+        finally:
+            self.finish_worker(error)
+        
+    def finish_worker(self, error=None):
+        """
+        Worker thread: release what the batch set up (staging moves are
+        waited for) and hand back to the Tk thread, whatever happened
+        """
+        try:
+            self.close_staging()
+            if self.run_report is not None:
+                self.run_report.close()
+                self.log(f"Run report: {self.run_report.path}")
+        except Exception as e:
+            self.log(f"ERROR: {e}")
+        finally:
+            self.call_on_ui(self.conversion_complete, error)
+        
+    def close_staging(self):
+        """Worker thread: wait for outputs still being moved, then drop the staging area"""
+        if self.staging is not None:
+            self.staging.close()
+            self.staging = None
+        
+    def on_job_update(self, job, scheduler):
+        """
+        Called from slot threads on every state change and, coalesced by the
+        scheduler, a few times a second per encoding job.
+        Only posts data; refresh_ui() applies it on the Tk thread.
+        """
+        self.run_report.add(job)
+        if job.state in (DONE, SKIPPED):
+            self.finished_paths.put(job.input_path)
+        elif job.state == FAILED:
+            self.log(f"ERROR ({os.path.basename(job.input_path)}): {job.error}")
+        
+        status = ""
+        if job.paused:
+            status = f"{os.path.basename(job.input_path)}: paused"
+        elif job.state == ENCODING and job.stats is not None:
+            status = f"{os.path.basename(job.input_path)}: {job.stats.summary()}"
+        progress = scheduler.overall_progress()
+        self.pending_progress = (progress, int(progress * 100), status)
+        
+    def update_progress(self, progress, percentage, status=""):
+        """Update progress bar and labels"""
         self.progress_bar.set(progress)
         self.progress_label.configure(text=f"{percentage}%")
+        if status:
+            self.status_label.configure(text=status)
         
-    def conversion_complete(self):
-        """Called when all conversions are complete"""
+    def conversion_complete(self, error=None):
+        """Tk thread: called when all conversions are complete, or could not start"""
+        self.is_converting = False
         self.start_btn.configure(state="normal", text="Start Conversion")
         self.select_file_btn.configure(state="normal")
         self.select_folder_btn.configure(state="normal")
+        self.cancel_btn.configure(state="disabled")
+        self.pause_btn.configure(state="disabled", text="Pause")
+        self.pending_progress = None
         self.progress_bar.set(0)
         self.progress_label.configure(text="0%")
+        self.status_label.configure(text="")
         self.log("\n" + "="*60)
         self.log("All conversions complete!")
         self.log("="*60)
-        messagebox.showinfo("Complete", "All video conversions completed successfully!")
+        self.flush_log()  # show the summary before the dialog blocks the timer
+        if error is not None:
+            messagebox.showerror("Conversion Failed", f"{error}\n\nSee the log for details.")
+            return
+        if self.scheduler is None:
+            messagebox.showerror("No Encoder", "No usable AV1 encoder was found. See the log for details.")
+            return
+        counts = self.scheduler.counts()
+        if counts.get(FAILED) or counts.get(CANCELLED):
+            messagebox.showwarning(
+                "Complete",
+                f"{counts.get(DONE, 0)} converted, {counts.get(SKIPPED, 0)} skipped, "
+                f"{counts.get(FAILED, 0)} failed, {counts.get(CANCELLED, 0)} cancelled. "
+                "See the log for details."
+            )
+        else:
+            messagebox.showinfo("Complete", "All video conversions completed successfully!")
 
 
 if __name__ == "__main__":